@@ -0,0 +1,31 @@
+"""
+Backfill BM25 postings for chunks indexed before the lexical index existed.
+
+Usage:
+    python backfill_lexical.py [--persist-dir ./chroma_db] [--course COURSE_ID ...]
+
+Pages through every collection (or only the given courses) and adds the
+chunks that have no postings yet; nothing is re-embedded and it is safe to
+re-run. The worker also backfills a course lazily the first time it is
+retrieved, so this is only needed to do it all up front.
+"""
+
+import argparse
+import os
+
+from document_processor import DocumentProcessor
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--persist-dir", default="./chroma_db")
+    parser.add_argument("--course", action="append", dest="courses")
+    args = parser.parse_args()
+
+    processor = DocumentProcessor(api_key=os.getenv("GEMINI_API_KEY"), persist_directory=args.persist_dir)
+    report = processor.backfill_lexical(args.courses)
+    print(f"🔤 Scanned {report['scanned']} chunks, added BM25 postings for {report['added']}")
+
+
+if __name__ == "__main__":
+    main()
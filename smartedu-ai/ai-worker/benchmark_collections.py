@@ -0,0 +1,91 @@
+"""
+Benchmark course-scoped query latency: one shared collection vs one collection per course.
+
+Usage:
+    python benchmark_collections.py [--sizes 10000,50000,200000] [--courses 50] [--dims 768] [--queries 200]
+
+Builds both layouts from the same random unit vectors in a throwaway Chroma
+directory, then times top-4 queries for random courses: the shared layout
+filters on course_id metadata, the sharded layout searches only that course's
+collection. Reports p50/p95 latency in milliseconds for each corpus size.
+"""
+
+import argparse
+import shutil
+import tempfile
+import time
+
+import chromadb
+import numpy as np
+
+from collection_router import CollectionRouter
+
+_ADD_BATCH = 5000
+
+
+def percentile(samples, q: float) -> float:
+    return float(np.percentile(samples, q)) if samples else 0.0
+
+
+def build(router: CollectionRouter, vectors: np.ndarray, courses: np.ndarray):
+    ids = [f"chunk_{i}" for i in range(len(vectors))]
+    metadatas = [{"course_id": str(c)} for c in courses]
+    for i in range(0, len(vectors), _ADD_BATCH):
+        batch = slice(i, i + _ADD_BATCH)
+        if router.sharded:
+            for course_id in np.unique(courses[batch]):
+                rows = i + np.nonzero(courses[batch] == course_id)[0]
+                router.for_course(str(course_id)).add(
+                    ids=[ids[j] for j in rows],
+                    embeddings=vectors[rows].tolist(),
+                    metadatas=[metadatas[j] for j in rows],
+                )
+        else:
+            router.for_course("").add(ids=ids[batch], embeddings=vectors[batch].tolist(), metadatas=metadatas[batch])
+
+
+def time_queries(router: CollectionRouter, queries: np.ndarray, query_courses: np.ndarray):
+    latencies = []
+    for vector, course_id in zip(queries, query_courses):
+        where = None if router.sharded else {"course_id": str(course_id)}
+        started = time.perf_counter()
+        router.for_course(str(course_id)).query(query_embeddings=[vector.tolist()], n_results=4, where=where)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="10000,50000,200000")
+    parser.add_argument("--courses", type=int, default=50)
+    parser.add_argument("--dims", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'chunks':>8}  {'courses':>7}  {'layout':>8}  {'build s':>8}  {'p50 ms':>8}  {'p95 ms':>8}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        vectors = rng.standard_normal((size, args.dims), dtype=np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        courses = rng.integers(0, args.courses, size)
+        queries = vectors[rng.integers(0, size, args.queries)]
+        query_courses = rng.integers(0, args.courses, args.queries)
+
+        for mode, label in (("none", "shared"), ("course", "sharded")):
+            directory = tempfile.mkdtemp(prefix="bench_collections_")
+            try:
+                client = chromadb.PersistentClient(path=directory)
+                router = CollectionRouter(client, "course_materials", mode=mode, cache_size=args.courses)
+                started = time.perf_counter()
+                build(router, vectors, courses)
+                build_seconds = time.perf_counter() - started
+                time_queries(router, queries[:10], query_courses[:10])  # warm up
+                latencies = time_queries(router, queries, query_courses)
+                print(f"{size:>8}  {args.courses:>7}  {label:>8}  {build_seconds:>8.1f}  "
+                      f"{percentile(latencies, 50):>8.2f}  {percentile(latencies, 95):>8.2f}")
+            finally:
+                shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
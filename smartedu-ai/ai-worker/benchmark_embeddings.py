@@ -0,0 +1,64 @@
+"""
+Benchmark embedding backends in documents/second.
+
+Usage:
+    python benchmark_embeddings.py [path/to/file.pdf] [--docs 2000] [--batch 100] [--backends local,gemini]
+
+Documents are the chunks of the given PDF (repeated up to --docs), or synthetic
+~1500-character passages when no PDF is given. The gemini backend is skipped
+unless GEMINI_API_KEY is set.
+"""
+
+import argparse
+import os
+import random
+import time
+
+from chunking import get_chunker
+from embedding_backends import get_embedding_backend
+from pdf_extraction import PDFExtractor
+
+_WORDS = (
+    "cell membrane transport energy protein enzyme reaction equilibrium gradient diffusion osmosis "
+    "algorithm recursion complexity graph vector matrix derivative integral theorem proof history "
+    "revolution economy market supply demand language grammar sentence literature poem"
+).split()
+
+
+def load_documents(pdf: str, count: int):
+    if pdf:
+        pages = ((n, f"{t}\n") for n, t in PDFExtractor().iter_pages(pdf))
+        chunks = [c.text for c in get_chunker().chunk(pages)]
+    else:
+        random.seed(0)
+        chunks = [" ".join(random.choice(_WORDS) for _ in range(220)) for _ in range(200)]
+    return [chunks[i % len(chunks)] for i in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("pdf", nargs="?")
+    parser.add_argument("--docs", type=int, default=2000)
+    parser.add_argument("--batch", type=int, default=100)
+    parser.add_argument("--backends", default="local,gemini")
+    args = parser.parse_args()
+
+    documents = load_documents(args.pdf, args.docs)
+    avg_chars = sum(len(d) for d in documents) / len(documents)
+    print(f"📄 {len(documents)} documents, {avg_chars:.0f} characters on average, batch size {args.batch}")
+    print(f"{'backend':>8}  {'model':>22}  {'dims':>5}  {'seconds':>8}  {'docs/s':>8}")
+    for name in args.backends.split(","):
+        if name == "gemini" and not os.getenv("GEMINI_API_KEY"):
+            print(f"{name:>8}  skipped (GEMINI_API_KEY not set)")
+            continue
+        backend = get_embedding_backend(os.getenv("GEMINI_API_KEY"), name=name)
+        started = time.perf_counter()
+        for i in range(0, len(documents), args.batch):
+            backend.embed(documents[i:i + args.batch], "RETRIEVAL_DOCUMENT")
+        elapsed = time.perf_counter() - started
+        print(f"{name:>8}  {backend.model:>22}  {backend.dimensions:>5}  {elapsed:>8.2f}  "
+              f"{len(documents) / elapsed:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Benchmark exact (memory-mapped NumPy) search against Chroma's HNSW index per course.
+
+Usage:
+    python benchmark_exact_search.py [--sizes 1000,5000,20000,50000] [--dims 768] [--queries 200] [--batch 16]
+
+For each course size, random unit vectors are indexed both in a Chroma
+collection and in an ExactIndex, then the same queries are timed one at a time
+on each engine and in batches of --batch on the exact engine. Reports p50/p99
+milliseconds per query and recall@4 of HNSW against the exact top 4.
+"""
+
+import argparse
+import shutil
+import tempfile
+import time
+
+import chromadb
+import numpy as np
+
+from exact_index import ExactIndex
+
+_ADD_BATCH = 5000
+_K = 4
+
+
+def summarize(latencies):
+    return float(np.percentile(latencies, 50)), float(np.percentile(latencies, 99))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="1000,5000,20000,50000")
+    parser.add_argument("--dims", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--batch", type=int, default=16)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'chunks':>8}  {'engine':>12}  {'p50 ms':>8}  {'p99 ms':>8}  {'recall@4':>8}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        vectors = rng.standard_normal((size, args.dims), dtype=np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        ids = [f"chunk_{i}" for i in range(size)]
+        # Perturbed copies of stored vectors, so each query has clear nearest neighbours
+        queries = vectors[rng.integers(0, size, args.queries)] + rng.normal(0, 0.05, (args.queries, args.dims))
+        queries = queries.astype(np.float32)
+
+        directory = tempfile.mkdtemp(prefix="bench_exact_")
+        try:
+            exact = ExactIndex(f"{directory}/exact", loader=lambda _c, _l: (ids, vectors), max_chunks=size)
+            exact.warm(["course"])
+            collection = chromadb.PersistentClient(path=f"{directory}/chroma").create_collection(
+                name="course", metadata={"hnsw:space": "cosine"}
+            )
+            for i in range(0, size, _ADD_BATCH):
+                collection.add(ids=ids[i:i + _ADD_BATCH], embeddings=vectors[i:i + _ADD_BATCH].tolist())
+
+            exact_latencies, exact_top = [], []
+            for query in queries:
+                started = time.perf_counter()
+                hits = exact.search("course", [query], _K)[0]
+                exact_latencies.append((time.perf_counter() - started) * 1000)
+                exact_top.append({chunk_id for chunk_id, _ in hits})
+
+            batched_latencies = []
+            for i in range(0, len(queries), args.batch):
+                batch = queries[i:i + args.batch]
+                started = time.perf_counter()
+                exact.search("course", batch, _K)
+                batched_latencies.extend([(time.perf_counter() - started) * 1000 / len(batch)] * len(batch))
+
+            hnsw_latencies, overlap = [], 0
+            for query, truth in zip(queries, exact_top):
+                started = time.perf_counter()
+                result = collection.query(query_embeddings=[query.tolist()], n_results=_K, include=[])
+                hnsw_latencies.append((time.perf_counter() - started) * 1000)
+                overlap += len(truth & set(result["ids"][0]))
+
+            for engine, latencies, recall in (
+                ("exact", exact_latencies, "1.000"),
+                (f"exact x{args.batch}", batched_latencies, "1.000"),
+                ("chroma hnsw", hnsw_latencies, f"{overlap / (_K * len(queries)):.3f}"),
+            ):
+                p50, p99 = summarize(latencies)
+                print(f"{size:>8}  {engine:>12}  {p50:>8.3f}  {p99:>8.3f}  {recall:>8}")
+            exact.close()
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
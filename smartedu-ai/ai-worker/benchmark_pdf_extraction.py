@@ -0,0 +1,70 @@
+"""
+Benchmark PDF text extraction throughput (pages/second) against process count.
+
+Usage:
+    python benchmark_pdf_extraction.py path/to/file.pdf [--pages 600] [--processes 1,2,4,8]
+
+--pages repeats the source PDF's pages until the document has that many, so a
+short sample PDF can stand in for a large upload.
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from pypdf import PdfReader, PdfWriter
+
+from pdf_extraction import PDFExtractor
+
+
+def build_sample(source: str, pages: int) -> str:
+    reader = PdfReader(source)
+    writer = PdfWriter()
+    for i in range(pages):
+        writer.add_page(reader.pages[i % len(reader.pages)])
+    fd, path = tempfile.mkstemp(suffix=".pdf")
+    with os.fdopen(fd, "wb") as f:
+        writer.write(f)
+    return path
+
+
+def run(path: str, processes: int) -> tuple:
+    # min_pages=1 forces the pool path for every count above one process
+    extractor = PDFExtractor(processes=processes, min_pages=1)
+    try:
+        # Warm the pool so process start-up is not counted against throughput
+        if processes > 1:
+            extractor._get_pool().submit(os.getpid).result()
+        started = time.perf_counter()
+        chars = sum(len(text) for _, text in extractor.iter_pages(path))
+        elapsed = time.perf_counter() - started
+    finally:
+        extractor.shutdown()
+    return elapsed, chars
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("pdf")
+    parser.add_argument("--pages", type=int, default=0)
+    parser.add_argument("--processes", default=",".join(str(n) for n in (1, 2, 4, 8) if n <= (os.cpu_count() or 1)) or "1")
+    args = parser.parse_args()
+
+    path = build_sample(args.pdf, args.pages) if args.pages else args.pdf
+    try:
+        total = len(PdfReader(path).pages)
+        print(f"📄 {path}: {total} pages, {os.cpu_count()} CPUs available")
+        print(f"{'processes':>9}  {'seconds':>8}  {'pages/s':>8}  {'speedup':>7}")
+        baseline = None
+        for processes in (int(n) for n in args.processes.split(",")):
+            elapsed, chars = run(path, processes)
+            baseline = baseline or elapsed
+            print(f"{processes:>9}  {elapsed:>8.2f}  {total / elapsed:>8.1f}  {baseline / elapsed:>6.2f}x")
+    finally:
+        if args.pages:
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
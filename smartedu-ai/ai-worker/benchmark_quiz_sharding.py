@@ -0,0 +1,54 @@
+"""
+Benchmark sharded quiz generation against a single generation call.
+
+Usage:
+    python benchmark_quiz_sharding.py [--topic "Photosynthesis"] [--questions 30] [--shard-size 10] [--runs 3]
+
+Needs GEMINI_API_KEY (or OPENAI_API_KEY). Each run generates the same quiz
+once as a single call and once in shards, reporting wall-clock seconds, the
+number of questions that parsed, failed shards and duplicates dropped.
+"""
+
+import argparse
+import asyncio
+import os
+import time
+
+from quiz_sharding import QuizSharder
+from worker import AIWorker, QuizGenerationRequest
+
+
+async def run(args):
+    worker = AIWorker(openai_api_key=os.getenv("OPENAI_API_KEY"))
+    await worker.initialize()
+    sharder = QuizSharder(shard_size=args.shard_size, threshold=1)
+    req = QuizGenerationRequest(topic=args.topic, num_questions=args.questions, difficulty=args.difficulty)
+
+    print(f"{'run':>4}  {'single s':>9}  {'single n':>8}  {'sharded s':>9}  {'sharded n':>9}  {'failed':>6}  {'dupes':>5}  {'speedup':>7}")
+    for i in range(args.runs):
+        started = time.perf_counter()
+        single = await worker._generate_quiz_batch(req, args.questions)
+        single_seconds = time.perf_counter() - started
+
+        questions, report = await sharder.generate(
+            args.questions, lambda count, focus: worker._generate_quiz_batch(req, count, focus)
+        )
+        print(
+            f"{i + 1:>4}  {single_seconds:>9.2f}  {len(single or []):>8}  {report.wall_seconds:>9.2f}  "
+            f"{len(questions or []):>9}  {report.failed:>6}  {report.duplicates:>5}  "
+            f"{single_seconds / report.wall_seconds:>6.2f}x"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--topic", default="Photosynthesis")
+    parser.add_argument("--questions", type=int, default=30)
+    parser.add_argument("--shard-size", type=int, default=10)
+    parser.add_argument("--difficulty", default="medium")
+    parser.add_argument("--runs", type=int, default=3)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
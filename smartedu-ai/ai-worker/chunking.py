@@ -0,0 +1,330 @@
+"""
+SmartEdu AI – Document Chunking
+Chunking strategies over a stream of ``(page_number, text)`` pages. Every chunk
+carries its page span and character offsets into the concatenated page text.
+"""
+
+import bisect
+import logging
+import os
+import re
+from collections import deque
+from typing import Callable, Deque, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+Pages = Iterable[Tuple[int, str]]
+
+
+class Chunk(NamedTuple):
+    text: str
+    page_start: int
+    page_end: int
+    char_start: int
+    char_end: int
+
+
+class TokenCounter:
+    """Counts tokens with tiktoken, or estimates ~4 characters per token when
+    the encoding is unavailable (tiktoken missing or no network to fetch it)."""
+
+    def __init__(self, encoding: Optional[str] = None):
+        self.encoding_name = encoding or os.getenv("CHUNK_TOKENIZER", "cl100k_base")
+        self._encoding = None
+        try:
+            import tiktoken
+            self._encoding = tiktoken.get_encoding(self.encoding_name)
+        except Exception as e:
+            logger.warning(f"⚠️ tiktoken encoding {self.encoding_name} unavailable, estimating tokens: {e}")
+
+    @property
+    def exact(self) -> bool:
+        return self._encoding is not None
+
+    def count(self, text: str) -> int:
+        if self._encoding is not None:
+            return len(self._encoding.encode(text, disallowed_special=()))
+        return (len(text) + 3) // 4
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """The longest prefix of ``text`` that fits in ``max_tokens``."""
+        if max_tokens <= 0:
+            return ""
+        if self._encoding is not None:
+            tokens = self._encoding.encode(text, disallowed_special=())
+            return text if len(tokens) <= max_tokens else self._encoding.decode(tokens[:max_tokens])
+        return text[:max_tokens * 4]
+
+
+_default_counter: Optional[TokenCounter] = None
+
+
+def default_counter() -> TokenCounter:
+    """Process-wide TokenCounter, so the encoding is loaded once."""
+    global _default_counter
+    if _default_counter is None:
+        _default_counter = TokenCounter()
+    return _default_counter
+
+
+class WindowChunker:
+    """Legacy strategy: fixed character windows with a character overlap."""
+
+    name = "window"
+
+    def __init__(self, chunk_size: int = 1500, overlap: int = 300):
+        self.chunk_size = chunk_size
+        self.overlap = overlap
+
+    def chunk(self, pages: Pages) -> Iterator[Chunk]:
+        """Same windows as slicing the concatenated text, buffering only one
+        window plus the current page."""
+        chunk_size = self.chunk_size
+        step = chunk_size - self.overlap
+        buffer = ""
+        buffer_start = 0  # absolute offset of buffer[0]
+        page_starts: Deque[Tuple[int, int]] = deque()  # (absolute offset, page number)
+
+        def page_at(offset: int) -> int:
+            page = page_starts[0][1]
+            for start, number in page_starts:
+                if start > offset:
+                    break
+                page = number
+            return page
+
+        def emit() -> Chunk:
+            window = buffer[:chunk_size]
+            end = buffer_start + len(window)
+            return Chunk(window, page_at(buffer_start), page_at(end - 1), buffer_start, end)
+
+        def advance():
+            nonlocal buffer, buffer_start
+            buffer = buffer[step:]
+            buffer_start += step
+            while len(page_starts) > 1 and page_starts[1][0] <= buffer_start:
+                page_starts.popleft()
+
+        for number, text in pages:
+            page_starts.append((buffer_start + len(buffer), number))
+            buffer += text
+            while len(buffer) >= chunk_size:
+                yield emit()
+                advance()
+
+        while buffer:
+            yield emit()
+            advance()
+
+
+# ── Structure-aware chunking ──
+
+_HEADING_RE = re.compile(
+    r"^(#{1,6}\s+\S.*"
+    r"|(?i:chapter|section|part|unit|lesson|module)\s+[\dIVXLC]+\b.*"
+    r"|\d+(\.\d+)*\.?\s+[A-Z][^.!?]*)$"
+)
+_SENTENCE_RE = re.compile(r"\S.*?(?:[.!?][\"')\]]*(?=\s)|$)", re.S)
+_TERMINAL = (".", "!", "?", ":", ";", '"', "'", ")", "]")
+
+
+def _is_heading(line: str) -> bool:
+    if len(line) > 90 or line.endswith((".", ",", ";")):
+        return False
+    if _HEADING_RE.match(line):
+        return True
+    letters = [c for c in line if c.isalpha()]
+    return len(letters) >= 3 and all(c.isupper() for c in letters)
+
+
+class _Unit:
+    """A heading or sentence span in absolute character offsets."""
+
+    __slots__ = ("start", "end", "tokens", "heading", "paragraph_end")
+
+    def __init__(self, start, end, heading=False, paragraph_end=False):
+        self.start = start
+        self.end = end
+        self.tokens = 0
+        self.heading = heading
+        self.paragraph_end = paragraph_end
+
+
+def _units(text: str, offset: int) -> Iterator[_Unit]:
+    """Split one page into heading and sentence units; blank lines end paragraphs."""
+    block_start = None
+    block_end = 0
+
+    def sentences(paragraph_end: bool):
+        found = list(_SENTENCE_RE.finditer(text, block_start, block_end))
+        for i, m in enumerate(found):
+            start, end = m.start(), m.start() + len(m.group().rstrip())
+            yield _Unit(offset + start, offset + end,
+                        paragraph_end=paragraph_end and i == len(found) - 1)
+
+    pos = 0
+    for line in text.splitlines(True):
+        line_start = pos
+        pos += len(line)
+        content = line.strip()
+        if not content or _is_heading(content):
+            if block_start is not None:
+                yield from sentences(paragraph_end=True)
+                block_start = None
+            if content:
+                start = line_start + len(line) - len(line.lstrip())
+                yield _Unit(offset + start, offset + start + len(content),
+                            heading=True, paragraph_end=True)
+            continue
+        if block_start is None:
+            block_start = line_start
+        block_end = pos
+    if block_start is not None:
+        yield from sentences(paragraph_end=False)
+
+
+class StructuredChunker:
+    """Packs whole sentences into chunks of at most ``max_tokens`` tokens.
+
+    Chunks prefer to end at paragraph breaks, start a new chunk at headings,
+    and repeat up to ``overlap_tokens`` of trailing sentences at the start of
+    the next chunk. Sentences cut by a page break are rejoined; a single
+    sentence longer than the budget is split on word boundaries.
+    """
+
+    name = "structured"
+
+    def __init__(
+        self,
+        max_tokens: Optional[int] = None,
+        overlap_tokens: Optional[int] = None,
+        counter: Optional[TokenCounter] = None,
+    ):
+        self.max_tokens = max_tokens or int(os.getenv("CHUNK_MAX_TOKENS", "350"))
+        self.overlap_tokens = overlap_tokens if overlap_tokens is not None else int(
+            os.getenv("CHUNK_OVERLAP_TOKENS", "40")
+        )
+        self.counter = counter or default_counter()
+
+    def _split_long(self, unit: _Unit, text_at: Callable[[int, int], str]) -> Iterator[_Unit]:
+        """Break an over-budget sentence into word-aligned pieces."""
+        text = text_at(unit.start, unit.end)
+        piece_start = None
+        piece_tokens = 0
+        last_end = 0
+        for m in re.finditer(r"\S+", text):
+            word_tokens = self.counter.count(" " + m.group())
+            if piece_start is not None and piece_tokens + word_tokens > self.max_tokens:
+                piece = _Unit(unit.start + piece_start, unit.start + last_end)
+                piece.tokens = piece_tokens
+                yield piece
+                piece_start, piece_tokens = None, 0
+            if piece_start is None:
+                piece_start = m.start()
+            piece_tokens += word_tokens
+            last_end = m.end()
+        if piece_start is not None:
+            piece = _Unit(unit.start + piece_start, unit.start + last_end, paragraph_end=unit.paragraph_end)
+            piece.tokens = piece_tokens
+            yield piece
+
+    def chunk(self, pages: Pages) -> Iterator[Chunk]:
+        buffer = ""
+        buffer_start = 0
+        current: List[_Unit] = []
+        current_tokens = 0
+        fresh = 0  # units in ``current`` not yet emitted in an earlier chunk
+        pending: Optional[_Unit] = None  # trailing sentence that may continue on the next page
+        page_offsets: List[int] = []  # absolute offset where each page starts
+        page_numbers: List[int] = []
+
+        def page_at(offset: int) -> int:
+            return page_numbers[bisect.bisect_right(page_offsets, offset) - 1]
+
+        def text_at(start: int, end: int) -> str:
+            return buffer[start - buffer_start:end - buffer_start]
+
+        def flush(carry: bool) -> Chunk:
+            nonlocal current, current_tokens, fresh
+            first, last = current[0], current[-1]
+            chunk = Chunk(text_at(first.start, last.end), page_at(first.start), page_at(last.end - 1),
+                          first.start, last.end)
+            kept: List[_Unit] = []
+            kept_tokens = 0
+            if carry and self.overlap_tokens:
+                for unit in reversed(current[1:]):
+                    if unit.heading or kept_tokens + unit.tokens > self.overlap_tokens:
+                        break
+                    kept.insert(0, unit)
+                    kept_tokens += unit.tokens
+            current, current_tokens, fresh = kept, kept_tokens, 0
+            return chunk
+
+        def add(unit: _Unit) -> Iterator[Chunk]:
+            if not unit.tokens:
+                # Include the separator before the unit so the parts add up to the whole
+                unit.tokens = self.counter.count(text_at(max(unit.start - 1, buffer_start), unit.end))
+            if unit.tokens > self.max_tokens:
+                for piece in self._split_long(unit, text_at):
+                    yield from place(piece)
+            else:
+                yield from place(unit)
+
+        def place(unit: _Unit) -> Iterator[Chunk]:
+            nonlocal current, current_tokens, fresh
+            if unit.heading and fresh and current_tokens >= self.max_tokens // 4:
+                yield flush(carry=False)
+            if fresh and current_tokens + unit.tokens > self.max_tokens:
+                yield flush(carry=True)
+            if current_tokens + unit.tokens > self.max_tokens:
+                current, current_tokens = [], 0  # overlap would not leave room
+            current.append(unit)
+            current_tokens += unit.tokens
+            fresh += 1
+            if unit.paragraph_end and current_tokens >= self.max_tokens * 3 // 4:
+                yield flush(carry=True)
+
+        for number, text in pages:
+            # Drop text no chunk can still reference
+            keep_from = min(
+                [u.start for u in current] + ([pending.start] if pending else []),
+                default=buffer_start + len(buffer),
+            )
+            buffer = buffer[keep_from - buffer_start:]
+            buffer_start = keep_from
+            offset = buffer_start + len(buffer)
+            buffer += text
+            page_offsets.append(offset)
+            page_numbers.append(number)
+
+            for unit in _units(text, offset):
+                if pending is not None:
+                    if not unit.heading:
+                        unit.start, unit.tokens = pending.start, 0
+                    else:
+                        yield from add(pending)
+                    pending = None
+                if not unit.heading and not unit.paragraph_end and not text_at(unit.start, unit.end).endswith(_TERMINAL):
+                    # Possibly the last sentence of the page, cut by the page break
+                    pending = unit
+                    continue
+                yield from add(unit)
+
+        if pending is not None:
+            yield from add(pending)
+        if fresh:
+            yield flush(carry=False)
+
+
+CHUNKING_STRATEGIES = {
+    WindowChunker.name: WindowChunker,
+    StructuredChunker.name: StructuredChunker,
+}
+
+
+def get_chunker(name: Optional[str] = None):
+    """Build the strategy named by ``name`` or CHUNK_STRATEGY (default: structured)."""
+    name = (name or os.getenv("CHUNK_STRATEGY", StructuredChunker.name)).lower()
+    if name not in CHUNKING_STRATEGIES:
+        raise ValueError(f"Unknown chunking strategy {name!r}; expected one of {sorted(CHUNKING_STRATEGIES)}")
+    return CHUNKING_STRATEGIES[name]()
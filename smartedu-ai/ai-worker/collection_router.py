@@ -0,0 +1,99 @@
+"""
+SmartEdu AI – Vector Collection Router
+Maps each course to its own Chroma collection (or everything to one shared
+collection), creating collections lazily and caching their handles.
+"""
+
+import hashlib
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+SHARDING_MODES = ("none", "course")
+
+
+class CollectionRouter:
+    """Routes course ids to Chroma collections.
+
+    With ``mode="course"`` every course gets a collection named
+    ``c_<course>_<tag>``, where the tag is derived from ``base_name`` so
+    different embedding backends never share a shard. Queries then search only
+    that course's HNSW graph and courses (and therefore tenants) are physically
+    separated. With ``mode="none"`` every course maps to ``base_name`` and
+    callers filter on ``course_id`` metadata, the original layout.
+    """
+
+    def __init__(self, chroma_client, base_name: str, mode: Optional[str] = None, cache_size: Optional[int] = None):
+        self.client = chroma_client
+        self.base_name = base_name
+        self.mode = (mode or os.getenv("VECTOR_SHARDING", "none")).lower()
+        if self.mode not in SHARDING_MODES:
+            raise ValueError(f"Unknown VECTOR_SHARDING {self.mode!r}; expected one of {list(SHARDING_MODES)}")
+        self.cache_size = cache_size or int(os.getenv("VECTOR_SHARD_CACHE_SIZE", "256"))
+        self.tag = hashlib.sha1(base_name.encode("utf-8")).hexdigest()[:8]
+        self._cache: "OrderedDict[str, object]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.opened = 0
+
+    @property
+    def sharded(self) -> bool:
+        return self.mode == "course"
+
+    def collection_name(self, course_id: str) -> str:
+        if not self.sharded:
+            return self.base_name
+        key = re.sub(r"[^a-zA-Z0-9]", "", str(course_id))
+        if not key or len(key) > 40:
+            key = hashlib.sha1(str(course_id).encode("utf-8")).hexdigest()[:32]
+        return f"c_{key}_{self.tag}"
+
+    def for_course(self, course_id: str, create: bool = True):
+        """Collection holding ``course_id``'s chunks; None if it does not exist and ``create`` is False."""
+        name = self.collection_name(course_id)
+        with self._lock:
+            collection = self._cache.get(name)
+            if collection is not None:
+                self._cache.move_to_end(name)
+                self.hits += 1
+                return collection
+            self.misses += 1
+            if create:
+                collection = self.client.get_or_create_collection(name=name, metadata={"course_id": str(course_id)})
+                self.opened += 1
+            else:
+                try:
+                    collection = self.client.get_collection(name=name)
+                except ValueError:
+                    return None
+            self._cache[name] = collection
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+            return collection
+
+    def all_collections(self) -> List:
+        """Every collection this router writes to (for per-document and global maintenance)."""
+        if not self.sharded:
+            return [self.for_course("")]
+        suffix = f"_{self.tag}"
+        return [
+            c for c in self.client.list_collections()
+            if c.name.startswith("c_") and c.name.endswith(suffix)
+        ]
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "base_name": self.base_name,
+            "cached_handles": len(self._cache),
+            "hits": self.hits,
+            "misses": self.misses,
+            "opened": self.opened,
+        }
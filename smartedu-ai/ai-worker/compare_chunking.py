@@ -0,0 +1,97 @@
+"""
+Compare chunking strategies on a PDF: chunk count, embedding cost and retrieval hit rate.
+
+Usage:
+    python compare_chunking.py path/to/file.pdf [--queries queries.json] [--top-k 3] [--probes 50]
+
+queries.json is a list of {"question": ..., "answer": ...}; a query is a hit
+when a top-k chunk contains the answer text. Without it, sentences sampled from
+the document serve as probes and a hit needs the whole sentence in one top-k
+chunk, which also penalizes strategies that cut sentences apart.
+
+Embeds with the configured EMBEDDING_BACKEND (Gemini when GEMINI_API_KEY is
+set, otherwise the local hashing backend, so the comparison still runs offline).
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+from typing import List
+
+import numpy as np
+
+from chunking import CHUNKING_STRATEGIES, default_counter
+from embedding_backends import get_embedding_backend
+from pdf_extraction import PDFExtractor
+
+# USD per 1M input tokens, used only for the cost column
+EMBEDDING_PRICE_PER_M = float(os.getenv("EMBEDDING_PRICE_PER_M", "0.15"))
+
+
+def _norm(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+def embed(backend, texts: List[str], task_type: str) -> np.ndarray:
+    vectors = []
+    for i in range(0, len(texts), 100):
+        vectors.extend(backend.embed(texts[i:i + 100], task_type))
+    matrix = np.asarray(vectors, dtype=np.float32)
+    return matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-9)
+
+
+def sample_probes(pages, count: int) -> List[dict]:
+    sentences = [
+        s.strip()
+        for _, text in pages
+        for s in re.split(r"(?<=[.!?])\s+", " ".join(text.split()))
+        if len(s.split()) >= 8
+    ]
+    random.seed(0)
+    picked = random.sample(sentences, min(count, len(sentences)))
+    return [{"question": s, "answer": s} for s in picked]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("pdf")
+    parser.add_argument("--queries")
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--probes", type=int, default=50)
+    args = parser.parse_args()
+
+    pages = [(n, f"{t}\n") for n, t in PDFExtractor().iter_pages(args.pdf)]
+    if args.queries:
+        with open(args.queries) as f:
+            queries = json.load(f)
+    else:
+        queries = sample_probes(pages, args.probes)
+    if not queries:
+        raise SystemExit("No queries to evaluate")
+
+    counter = default_counter()
+    backend = get_embedding_backend(os.getenv("GEMINI_API_KEY"))
+    print(f"📄 {args.pdf}: {len(pages)} pages, {len(queries)} queries, top-{args.top_k}, "
+          f"embeddings: {backend.model}, tokens: {'tiktoken' if counter.exact else 'estimated'}")
+
+    query_vectors = embed(backend, [q["question"] for q in queries], "RETRIEVAL_QUERY")
+    print(f"{'strategy':>10}  {'chunks':>6}  {'avg tok':>7}  {'tokens':>8}  {'cost $':>8}  {'hit rate':>8}")
+    for name, strategy in CHUNKING_STRATEGIES.items():
+        chunks = [c.text for c in strategy().chunk(pages)]
+        tokens = sum(counter.count(c) for c in chunks)
+        chunk_vectors = embed(backend, chunks, "RETRIEVAL_DOCUMENT")
+        scores = query_vectors @ chunk_vectors.T
+        top = np.argsort(-scores, axis=1)[:, :args.top_k]
+        normalized = [_norm(c) for c in chunks]
+        hits = sum(
+            any(_norm(q["answer"]) in normalized[i] for i in row)
+            for q, row in zip(queries, top)
+        )
+        print(f"{name:>10}  {len(chunks):>6}  {tokens / len(chunks):>7.0f}  {tokens:>8}  "
+              f"{tokens / 1e6 * EMBEDDING_PRICE_PER_M:>8.4f}  {hits / len(queries):>8.1%}")
+
+
+if __name__ == "__main__":
+    main()
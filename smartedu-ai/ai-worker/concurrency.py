@@ -0,0 +1,134 @@
+"""
+SmartEdu AI – Model Concurrency Control
+Runs blocking SDK calls off the event loop and caps in-flight requests per model.
+"""
+
+import asyncio
+import contextlib
+import functools
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def parse_model_overrides(raw: str, cast: Callable[[str], Any] = int) -> Dict[str, Any]:
+    """Parse "model=value,model=value" env strings into a dict."""
+    overrides: Dict[str, Any] = {}
+    for item in (raw or "").split(","):
+        if "=" not in item:
+            continue
+        model, value = item.split("=", 1)
+        try:
+            overrides[model.strip()] = cast(value.strip())
+        except ValueError:
+            logger.warning(f"⚠️ Ignoring invalid model override: {item}")
+    return overrides
+
+
+class _ModelSlot:
+    """Semaphore plus counters for a single model."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.semaphore = asyncio.Semaphore(limit)
+        self.queued = 0
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+
+    async def acquire(self):
+        """Take a slot; a waiter cancelled before or just after being granted one hands it back."""
+        grant = asyncio.ensure_future(self.semaphore.acquire())
+        try:
+            await asyncio.shield(grant)
+        except asyncio.CancelledError:
+            # Keep the place in line rather than cancel the acquire, so the
+            # slot is passed on whenever it is granted, even mid-cancellation
+            grant.add_done_callback(lambda g: g.cancelled() or self.semaphore.release())
+            raise
+
+
+class ModelLimiter:
+    """Bounded executor with a per-model concurrency semaphore.
+
+    Blocking calls (the google-genai SDK, ChromaDB) are pushed onto a dedicated
+    thread pool so the uvicorn event loop keeps serving /chat and /health.
+    Async calls (httpx) only go through the semaphore.
+    """
+
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        default_limit: Optional[int] = None,
+        overrides: Optional[Dict[str, int]] = None,
+    ):
+        self.max_workers = max_workers or int(os.getenv("AI_WORKER_THREADS", "8"))
+        self.default_limit = default_limit or int(os.getenv("MODEL_CONCURRENCY", "4"))
+        self.overrides = overrides if overrides is not None else parse_model_overrides(
+            os.getenv("MODEL_CONCURRENCY_OVERRIDES", "")
+        )
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="ai-worker")
+        self._slots: Dict[str, _ModelSlot] = {}
+
+    def _slot(self, model: str) -> _ModelSlot:
+        slot = self._slots.get(model)
+        if slot is None:
+            slot = _ModelSlot(self.overrides.get(model, self.default_limit))
+            self._slots[model] = slot
+        return slot
+
+    async def run(self, model: str, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run a blocking callable in the thread pool under the model's limit."""
+        loop = asyncio.get_running_loop()
+        call = functools.partial(func, *args, **kwargs)
+        return await self.call(model, lambda: loop.run_in_executor(self.executor, call))
+
+    async def call(self, model: str, factory: Callable[[], Any]) -> Any:
+        """Await the coroutine produced by ``factory`` under the model's limit."""
+        async with self.slot(model):
+            return await factory()
+
+    @contextlib.asynccontextmanager
+    async def slot(self, model: str):
+        """Hold one of the model's slots, e.g. for the lifetime of a stream."""
+        slot = self._slot(model)
+        slot.queued += 1
+        try:
+            await slot.acquire()
+        finally:
+            slot.queued -= 1
+        slot.in_flight += 1
+        try:
+            yield
+            slot.completed += 1
+        except BaseException:
+            slot.failed += 1
+            raise
+        finally:
+            slot.in_flight -= 1
+            slot.semaphore.release()
+
+    def stats(self) -> dict:
+        """Queue depth and in-flight counts, for sizing the worker."""
+        return {
+            "max_workers": self.max_workers,
+            "default_limit": self.default_limit,
+            "queued": sum(s.queued for s in self._slots.values()),
+            "in_flight": sum(s.in_flight for s in self._slots.values()),
+            "models": {
+                model: {
+                    "limit": s.limit,
+                    "queued": s.queued,
+                    "in_flight": s.in_flight,
+                    "completed": s.completed,
+                    "failed": s.failed,
+                }
+                for model, s in self._slots.items()
+            },
+        }
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
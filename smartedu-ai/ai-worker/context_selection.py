@@ -0,0 +1,177 @@
+"""
+SmartEdu AI – Context Selection
+Post-retrieval stage: maximal-marginal-relevance diversification, an optional
+lexical rerank, and packing the result into a prompt token budget.
+"""
+
+import logging
+import os
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from chunking import TokenCounter, default_counter
+from lexical_index import tokenize
+
+logger = logging.getLogger(__name__)
+
+SELECTION_MODES = ("mmr", "none")
+RERANKERS = ("lexical", "none")
+
+
+def mmr(relevance: np.ndarray, vectors: np.ndarray, count: int, lambda_: float) -> List[int]:
+    """Indices picked greedily by ``λ·relevance − (1−λ)·max similarity to the picks so far``.
+
+    ``vectors`` must be L2-normalized. The pairwise similarity matrix is
+    computed once; each step is a vector update of the running maximum.
+    """
+    n = len(relevance)
+    count = min(count, n)
+    if count <= 0:
+        return []
+    similarity = vectors @ vectors.T
+    max_similarity = np.full(n, -np.inf, dtype=np.float32)
+    available = np.ones(n, dtype=bool)
+    picked: List[int] = []
+    for _ in range(count):
+        redundancy = np.where(np.isfinite(max_similarity), max_similarity, 0.0)
+        scores = np.where(available, lambda_ * relevance - (1 - lambda_) * redundancy, -np.inf)
+        best = int(np.argmax(scores))
+        picked.append(best)
+        available[best] = False
+        max_similarity = np.maximum(max_similarity, similarity[best])
+    return picked
+
+
+def lexical_coverage(query: str, texts: Sequence[str]) -> np.ndarray:
+    """Fraction of the query's distinct terms that occur in each text."""
+    terms = set(tokenize(query))
+    if not terms:
+        return np.zeros(len(texts), dtype=np.float32)
+    return np.array([len(terms & set(tokenize(t))) / len(terms) for t in texts], dtype=np.float32)
+
+
+class ContextSelector:
+    """Choose which retrieved chunks go into the prompt.
+
+    Retrieval over-fetches ``overfetch`` times the requested count. MMR
+    (``lambda_``, CONTEXT_MMR_LAMBDA) orders the candidates so that ones
+    that mostly repeat an earlier pick, as overlapping chunks do, come last.
+    The optional lexical rerank (CONTEXT_RERANK) adds ``rerank_weight``
+    times query-term coverage to each candidate's relevance first. Chunks
+    are then taken in MMR order while they fit ``token_budget``
+    (CONTEXT_TOKEN_BUDGET), skipping any that do not so a smaller one can
+    still be used, and returned most relevant first.
+    """
+
+    def __init__(
+        self,
+        mode: Optional[str] = None,
+        lambda_: Optional[float] = None,
+        overfetch: Optional[int] = None,
+        rerank: Optional[str] = None,
+        rerank_weight: Optional[float] = None,
+        token_budget: Optional[int] = None,
+        counter: Optional[TokenCounter] = None,
+    ):
+        self.mode = (mode or os.getenv("CONTEXT_SELECTION", "mmr")).lower()
+        if self.mode not in SELECTION_MODES:
+            raise ValueError(f"Unknown CONTEXT_SELECTION {self.mode!r}; expected one of {list(SELECTION_MODES)}")
+        self.lambda_ = lambda_ if lambda_ is not None else float(os.getenv("CONTEXT_MMR_LAMBDA", "0.7"))
+        self.overfetch = overfetch or int(os.getenv("CONTEXT_OVERFETCH", "4"))
+        self.rerank = (rerank or os.getenv("CONTEXT_RERANK", "lexical")).lower()
+        if self.rerank not in RERANKERS:
+            raise ValueError(f"Unknown CONTEXT_RERANK {self.rerank!r}; expected one of {list(RERANKERS)}")
+        self.rerank_weight = rerank_weight if rerank_weight is not None else float(os.getenv("CONTEXT_RERANK_WEIGHT", "0.3"))
+        self.token_budget = token_budget or int(os.getenv("CONTEXT_TOKEN_BUDGET", "2000"))
+        self.counter = counter or default_counter()
+
+        self.selections = 0
+        self.candidates_seen = 0
+        self.selected = 0
+        self.tokens_selected = 0
+        self.over_budget_skips = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "none"
+
+    def candidate_count(self, n_results: int) -> int:
+        return n_results * self.overfetch if self.enabled else n_results
+
+    def select(
+        self,
+        query_text: str,
+        query_vector: Optional[Sequence[float]],
+        chunks: List[dict],
+        vectors: Optional[np.ndarray],
+        n_results: int,
+        token_budget: Optional[int] = None,
+    ) -> Tuple[List[dict], dict]:
+        """Pick up to ``n_results`` of ``chunks`` (best first, each with a ``score``).
+
+        ``vectors`` holds one embedding per chunk; without it (or the query
+        vector) MMR is skipped and the retrieval order is kept. Returns the
+        chosen chunks, each with a ``tokens`` count, and a summary dict.
+        """
+        budget = token_budget or self.token_budget
+        order = list(range(len(chunks)))
+        relevance = None
+        if self.enabled and chunks and vectors is not None and query_vector is not None:
+            matrix = np.asarray(vectors, dtype=np.float32)
+            matrix = matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+            query = np.asarray(query_vector, dtype=np.float32)
+            query = query / max(float(np.linalg.norm(query)), 1e-12)
+            relevance = matrix @ query
+            if self.rerank == "lexical":
+                relevance = relevance + self.rerank_weight * lexical_coverage(query_text, [c["text"] for c in chunks])
+            # Full MMR order, so the budget pass can fall back to later picks
+            order = mmr(relevance, matrix, len(chunks), self.lambda_)
+
+        picked: List[int] = []
+        token_counts = {}
+        used = 0
+        skipped = 0
+        for i in order:
+            if len(picked) >= n_results:
+                break
+            tokens = self.counter.count(chunks[i]["text"])
+            if used + tokens > budget:
+                skipped += 1
+                continue
+            used += tokens
+            token_counts[i] = tokens
+            picked.append(i)
+        if relevance is not None:
+            # Most relevant first in the prompt
+            picked.sort(key=lambda i: -relevance[i])
+        selected = [{**chunks[i], "tokens": token_counts[i]} for i in picked]
+
+        self.selections += 1
+        self.candidates_seen += len(chunks)
+        self.selected += len(selected)
+        self.tokens_selected += used
+        self.over_budget_skips += skipped
+        return selected, {
+            "candidates": len(chunks),
+            "selected": len(selected),
+            "tokens": used,
+            "token_budget": budget,
+            "diversified": relevance is not None,
+            "skipped_over_budget": skipped,
+        }
+
+    def stats(self) -> dict:
+        count = self.selections
+        return {
+            "mode": self.mode,
+            "lambda": self.lambda_,
+            "overfetch": self.overfetch,
+            "rerank": self.rerank,
+            "token_budget": self.token_budget,
+            "selections": count,
+            "avg_candidates": round(self.candidates_seen / count, 2) if count else 0.0,
+            "avg_selected": round(self.selected / count, 2) if count else 0.0,
+            "avg_tokens": round(self.tokens_selected / count, 1) if count else 0.0,
+            "over_budget_skips": self.over_budget_skips,
+        }
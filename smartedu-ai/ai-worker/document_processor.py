@@ -3,104 +3,591 @@ SmartEdu AI – AI Document Processor
 Extracts, chunks, and vectorizes course documents for RAG.
 """
 
+import hashlib
 import os
-from typing import List
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
 import logging
-from pypdf import PdfReader
 import chromadb
 from chromadb.config import Settings
-from google import genai
-from google.genai import types
+import numpy as np
+from collection_router import CollectionRouter
+from context_selection import ContextSelector
+from exact_index import ExactIndex
+from chunking import Chunk, WindowChunker, get_chunker
+from embedding_backends import EmbeddingBackend, get_embedding_backend
+from embedding_cache import EmbeddingCache
+from embedding_pipeline import ChunkItem, EmbeddingPipeline
+from lexical_index import LexicalIndex
+from pdf_extraction import PDFExtractor
+
+# Chunk ids are "{doc_id}_{first N hex chars of the chunk's sha256}"
+CHUNK_ID_HASH_CHARS = 16
+REUSED_UPDATE_BATCH = 500
+DELETE_BATCH = 500
+RECONCILE_PAGE_SIZE = 1000
 
 logger = logging.getLogger(__name__)
 
+
 class DocumentProcessor:
-    def __init__(self, api_key: str, persist_directory: str = "./chroma_db"):
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        persist_directory: str = "./chroma_db",
+        backend: Optional[EmbeddingBackend] = None,
+    ):
         self.api_key = api_key
-        self.client = genai.Client(api_key=api_key)
+        self.backend = backend or get_embedding_backend(api_key)
+        self.persist_directory = persist_directory
         self.chroma_client = chromadb.PersistentClient(path=persist_directory)
-        self.collection = self.chroma_client.get_or_create_collection(name="course_materials")
-        logger.info(f"🚀 DocumentProcessor initialized with ChromaDB at {persist_directory}")
+        # Vectors from different backends are not comparable, so each gets its own
+        # collection (or set of per-course collections when sharding is on)
+        self.collections = CollectionRouter(self.chroma_client, self.backend.collection_name)
+        self.embedding_cache = EmbeddingCache(os.path.join(persist_directory, "embedding_cache.sqlite3"))
+        # BM25 postings for the same chunks, one index per collection
+        self.lexical = LexicalIndex(os.path.join(persist_directory, f"lexical_{self.backend.collection_name}.sqlite3"))
+        # Brute-force search for courses below EXACT_SEARCH_MAX_CHUNKS, rebuilt from Chroma on demand
+        self.exact = ExactIndex(
+            os.path.join(persist_directory, f"exact_{self.backend.collection_name}"), loader=self._load_course_vectors
+        )
+        self.retrieval_mode = os.getenv("RETRIEVAL_MODE", "hybrid").lower()
+        self.retrieval_budget_ms = float(os.getenv("RETRIEVAL_BUDGET_MS", "300"))
+        self.rrf_k = int(os.getenv("RETRIEVAL_RRF_K", "60"))
+        self.candidates = int(os.getenv("RETRIEVAL_CANDIDATES", "20"))
+        # MMR + rerank + token budget over the fused candidates
+        self.selector = ContextSelector()
+        self._retrieval_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="retrieve")
+        # Courses indexed before BM25 existed get their postings filled in on first retrieval
+        self._backfill_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="lexical-backfill")
+        self._backfill_lock = threading.Lock()
+        self._lexical_checked: Set[str] = set()
+        self._lexical_backfilling: Set[str] = set()
+        self._retrieval_totals: Dict[str, float] = {}
+        self._retrievals = 0
+        self._retrievals_over_budget = 0
+        self.pipeline = EmbeddingPipeline(embed=self.embed_documents, sink=self._index_batch)
+        self.extractor = PDFExtractor()
+        self.chunker = get_chunker()
+        logger.info(
+            f"🚀 DocumentProcessor initialized with ChromaDB at {persist_directory} "
+            f"({self.backend.name} embeddings, collection {self.backend.collection_name}, "
+            f"sharding {self.collections.mode})"
+        )
 
-    def extract_text(self, file_path: str) -> str:
-        """Extract text from a PDF file."""
+    def extract_pages(
+        self, file_path: str, on_page: Optional[Callable[[int, int], None]] = None
+    ) -> Iterator[Tuple[int, str]]:
+        """Yield ``(page_number, text)`` for each non-empty page of a PDF, lazily.
+
+        Large PDFs are parsed across the extraction process pool; pages still
+        arrive in order. ``on_page(pages_done, pages_total)`` is called as pages are parsed.
+        """
         if not os.path.exists(file_path):
             raise FileNotFoundError(f"File not found: {file_path}")
-            
+
         try:
-            reader = PdfReader(file_path)
-            text = ""
-            for page in reader.pages:
-                extracted = page.extract_text()
-                if extracted:
-                    text += extracted + "\n"
-            return text
+            yield from self.extractor.iter_pages(file_path, on_page)
         except Exception as e:
             logger.error(f"❌ Failed to extract text from {file_path}: {e}")
             raise
 
+    def extract_text(self, file_path: str) -> str:
+        """Extract text from a PDF file."""
+        return "".join(f"{text}\n" for _, text in self.extract_pages(file_path))
+
     def chunk_text(self, text: str, chunk_size: int = 1500, overlap: int = 300) -> List[str]:
         """Split text into overlapping chunks for better context preservation."""
         if not text:
             return []
-            
-        chunks = []
-        start = 0
-        while start < len(text):
-            end = start + chunk_size
-            chunks.append(text[start:end])
-            start += chunk_size - overlap
-        return chunks
-
-    def process_document(self, doc_id: str, course_id: str, file_path: str):
-        """Full pipeline: extract -> chunk -> embed -> index."""
+        return [c.text for c in WindowChunker(chunk_size, overlap).chunk([(1, text)])]
+
+    def embed_documents(self, chunks: List[str]) -> Tuple[List[List[float]], dict]:
+        """Embed chunks for indexing, sending only embedding-cache misses to the backend."""
+        task_type = "RETRIEVAL_DOCUMENT"
+        if not self.backend.cacheable:
+            return self.backend.embed(chunks, task_type), {"embedded": len(chunks)}
+
+        model = self.backend.model
+        embeddings = self.embedding_cache.get_many(model, task_type, chunks)
+        missing = [i for i, e in enumerate(embeddings) if e is None]
+
+        if missing:
+            # One batch per call; EmbeddingPipeline keeps batches within API limits
+            texts = [chunks[i] for i in missing]
+            fresh = self.backend.embed(texts, task_type)
+            self.embedding_cache.put_many(model, task_type, texts, fresh)
+            for i, vec in zip(missing, fresh):
+                embeddings[i] = vec
+
+        missing_set = set(missing)
+        reused = [c for i, c in enumerate(chunks) if i not in missing_set]
+        return embeddings, {
+            "embedding_calls_saved": len(reused),
+            # Rough token estimate (~4 characters per token), for reporting only
+            "tokens_saved": sum(len(c) // 4 for c in reused),
+            "embedded": len(missing),
+        }
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.backend.embed([text], "RETRIEVAL_QUERY")[0]
+
+    @staticmethod
+    def _existing_chunks(collection, doc_id: str) -> Dict[str, dict]:
+        """Chunk id -> metadata for everything a collection holds for a document."""
+        existing = collection.get(where={"doc_id": str(doc_id)}, include=["metadatas"])
+        return dict(zip(existing["ids"], existing["metadatas"]))
+
+    def process_document(
+        self, doc_id: str, course_id: str, file_path: str, progress: Optional[Callable[..., None]] = None
+    ) -> dict:
+        """Full pipeline: extract -> chunk -> embed -> index, incrementally.
+
+        Chunk ids are derived from the chunk's content hash, so re-processing a
+        new version of a document only embeds chunks that are new or changed.
+        Unchanged chunks keep their vectors (only their position metadata is
+        refreshed) and chunks that disappeared are deleted once the new
+        version is indexed. The report includes ``reused``, ``added``,
+        ``removed`` and the new ``version``.
+
+        ``progress(**fields)`` receives stage, pages_done/pages_total and
+        chunks_indexed updates (used by ingestion jobs).
+        """
         logger.info(f"📄 Processing document {doc_id} for course {course_id}")
-        
-        text = self.extract_text(file_path)
-        chunks = self.chunk_text(text)
-        
-        if not chunks:
+        report_progress = progress or (lambda **fields: None)
+
+        collection = self.collections.for_course(course_id)
+        existing = self._existing_chunks(collection, doc_id)
+        version = max((m.get("doc_version", 0) for m in existing.values()), default=0) + 1
+        indexed_at = time.time()
+        seen: Set[str] = set()
+        reused: List[Tuple[str, dict]] = []
+
+        def flush_reused():
+            if reused:
+                ids = [i for i, _ in reused]
+                collection.update(ids=ids, metadatas=[m for _, m in reused])
+                # Chunks indexed before the lexical index existed
+                missing = self.lexical.missing(ids)
+                if missing:
+                    docs = collection.get(ids=missing, include=["documents"])
+                    self.lexical.add((i, str(course_id), t) for i, t in zip(docs["ids"], docs["documents"]))
+                reused.clear()
+
+        def new_items(chunks: Iterator[Chunk]) -> Iterator[ChunkItem]:
+            for index, chunk in enumerate(chunks):
+                content_hash = hashlib.sha256(chunk.text.encode("utf-8")).hexdigest()
+                chunk_id = f"{doc_id}_{content_hash[:CHUNK_ID_HASH_CHARS]}"
+                if chunk_id in seen:
+                    # Same text twice in one document
+                    chunk_id = f"{chunk_id}_{index}"
+                seen.add(chunk_id)
+                metadata = {
+                    "course_id": str(course_id),
+                    "doc_id": str(doc_id),
+                    "doc_version": version,
+                    "indexed_at": indexed_at,
+                    "content_hash": content_hash,
+                    "chunk_index": index,
+                    "page_start": chunk.page_start,
+                    "page_end": chunk.page_end,
+                    "char_start": chunk.char_start,
+                    "char_end": chunk.char_end,
+                    "chunker": self.chunker.name,
+                }
+                if chunk_id in existing and existing[chunk_id].get("content_hash") == content_hash:
+                    reused.append((chunk_id, metadata))
+                    if len(reused) >= REUSED_UPDATE_BATCH:
+                        flush_reused()
+                    continue
+                yield chunk_id, chunk.text, metadata
+
+        # Pages stream through chunking and embedding; the first batches are
+        # indexed while later pages are still being parsed.
+        report_progress(stage="indexing")
+        pages = self.extract_pages(
+            file_path, on_page=lambda done, total: report_progress(pages_done=done, pages_total=total)
+        )
+        page_lines = ((number, f"{text}\n") for number, text in pages)
+        try:
+            report = self.pipeline.run(
+                new_items(self.chunker.chunk(page_lines)),
+                on_progress=lambda n: report_progress(chunks_indexed=n),
+            )
+        except Exception:
+            # Some batches may already be in the collection
+            self.exact.invalidate([course_id])
+            raise
+        flush_reused()
+
+        # Only drop the previous version's vectors once the new one is in place
+        stale = [chunk_id for chunk_id in existing if chunk_id not in seen]
+        self._delete_ids(collection, stale)
+        # Once per document rather than per batch, so queries during a long
+        # ingestion keep the current matrix instead of rebuilding it every batch
+        if stale or report["chunks"]:
+            self.exact.invalidate([course_id])
+
+        report.update(
+            version=version,
+            added=report["chunks"],
+            reused=len(seen) - report["chunks"],
+            removed=len(stale),
+            chunks=len(seen),
+        )
+        if not seen:
             logger.warning(f"⚠️ No text extracted from {file_path}")
-            return 0
-            
-        # Prepare metadata for each chunk
-        ids = [f"{doc_id}_{i}" for i in range(len(chunks))]
-        metadatas = [{"course_id": str(course_id), "doc_id": str(doc_id), "chunk_index": i} for i in range(len(chunks))]
-        
-        # Batch embedding (Gemini supports multiple contents)
-        embeddings_resp = self.client.models.embed_content(
-            model="text-embedding-004",
-            contents=chunks,
-            config=types.EmbedContentConfig(task_type="RETRIEVAL_DOCUMENT")
+            return report
+
+        logger.info(
+            f"✅ Indexed version {version} of document {doc_id}: {report['added']} added, "
+            f"{report['reused']} reused, {report['removed']} removed in {report['batches']} batches "
+            f"({report['chunks_per_second']} chunks/s, reused {report.get('embedding_calls_saved', 0)} cached "
+            f"embeddings, ~{report.get('tokens_saved', 0)} tokens saved)"
         )
-        
-        embeddings = [e.values for e in embeddings_resp.embeddings]
-
-        self.collection.add(
-            ids=ids,
-            embeddings=embeddings,
-            metadatas=metadatas,
-            documents=chunks
+        return report
+
+    def _index_batch(self, ids: List[str], embeddings: List[List[float]], metadatas: List[dict], chunks: List[str]):
+        """Pipeline sink: write one finished batch to Chroma and the lexical index."""
+        by_course: Dict[str, List[int]] = {}
+        for position, metadata in enumerate(metadatas):
+            by_course.setdefault(metadata["course_id"], []).append(position)
+        for course_id, positions in by_course.items():
+            self.collections.for_course(course_id).upsert(
+                ids=[ids[p] for p in positions],
+                embeddings=[embeddings[p] for p in positions],
+                metadatas=[metadatas[p] for p in positions],
+                documents=[chunks[p] for p in positions]
+            )
+        self.lexical.add((i, m["course_id"], t) for i, m, t in zip(ids, metadatas, chunks))
+
+    def backfill_lexical(self, course_ids: Optional[Iterable[str]] = None) -> dict:
+        """Add BM25 postings for stored chunks that have none.
+
+        Chunks indexed before the lexical index existed are only in Chroma.
+        Pages through the given courses (or every collection) and indexes
+        whatever ``LexicalIndex.missing`` reports; safe to re-run.
+        """
+        if course_ids is None:
+            targets = [(collection, None) for collection in self.collections.all_collections()]
+        else:
+            targets = [
+                (self.collections.for_course(c, create=False), None if self.collections.sharded else {"course_id": str(c)})
+                for c in course_ids
+            ]
+        scanned = 0
+        added = 0
+        for collection, where in targets:
+            if collection is None:
+                continue
+            offset = 0
+            while True:
+                page = collection.get(where=where, include=[], limit=RECONCILE_PAGE_SIZE, offset=offset)
+                if not page["ids"]:
+                    break
+                offset += len(page["ids"])
+                scanned += len(page["ids"])
+                missing = self.lexical.missing(page["ids"])
+                if missing:
+                    docs = collection.get(ids=missing, include=["documents", "metadatas"])
+                    self.lexical.add(
+                        (i, str(m["course_id"]), t) for i, m, t in zip(docs["ids"], docs["metadatas"], docs["documents"])
+                    )
+                    added += len(missing)
+        logger.info(f"🔤 Lexical backfill: {added} of {scanned} chunks were missing BM25 postings")
+        return {"scanned": scanned, "added": added}
+
+    def _lexical_backfill_due(self, course_id: str, collection, where: Optional[dict]) -> bool:
+        """Whether a course's BM25 postings are still being backfilled.
+
+        The first retrieval for a course compares its chunk count in Chroma
+        with the lexical index and starts a background backfill on a gap.
+        """
+        course_id = str(course_id)
+        with self._backfill_lock:
+            if course_id in self._lexical_backfilling:
+                return True
+            if course_id in self._lexical_checked:
+                return False
+            self._lexical_checked.add(course_id)
+        stored = collection.count() if where is None else len(collection.get(where=where, include=[])["ids"])
+        if self.lexical.course_size(course_id) >= stored:
+            return False
+        with self._backfill_lock:
+            self._lexical_backfilling.add(course_id)
+        logger.info(f"🔤 Course {course_id} has chunks without BM25 postings, backfilling")
+
+        def finished(future):
+            with self._backfill_lock:
+                self._lexical_backfilling.discard(course_id)
+                if future.exception() is not None:
+                    logger.warning(f"⚠️ Lexical backfill for course {course_id} failed: {future.exception()}")
+                    self._lexical_checked.discard(course_id)
+
+        self._backfill_pool.submit(self.backfill_lexical, [course_id]).add_done_callback(finished)
+        return True
+
+    def _load_course_vectors(self, course_id: str, limit: int) -> Optional[Tuple[List[str], List[List[float]]]]:
+        """ExactIndex loader: every chunk id and embedding of a course, or None past ``limit``."""
+        collection = self.collections.for_course(course_id, create=False)
+        if collection is None:
+            return [], []
+        where = None if self.collections.sharded else {"course_id": str(course_id)}
+        chunk_ids = collection.get(where=where, include=[])["ids"]
+        if len(chunk_ids) > limit:
+            return None
+        ids: List[str] = []
+        embeddings: List[List[float]] = []
+        for i in range(0, len(chunk_ids), RECONCILE_PAGE_SIZE):
+            page = collection.get(ids=chunk_ids[i:i + RECONCILE_PAGE_SIZE], include=["embeddings"])
+            ids.extend(page["ids"])
+            embeddings.extend(page["embeddings"])
+        return ids, embeddings
+
+    def _delete_ids(self, collection, ids: List[str]):
+        for i in range(0, len(ids), DELETE_BATCH):
+            collection.delete(ids=ids[i:i + DELETE_BATCH])
+        self.lexical.delete(ids)
+
+    def delete_document(self, doc_id: str) -> dict:
+        """Remove every chunk of a document; returns the count and affected courses."""
+        existing: Dict[str, dict] = {}
+        for collection in self.collections.all_collections():
+            found = self._existing_chunks(collection, doc_id)
+            self._delete_ids(collection, list(found))
+            existing.update(found)
+        course_ids = sorted({m.get("course_id") for m in existing.values() if m.get("course_id")})
+        self.exact.invalidate(course_ids)
+        logger.info(f"🗑️ Deleted {len(existing)} chunks of document {doc_id}")
+        return {"doc_id": str(doc_id), "removed": len(existing), "course_ids": course_ids}
+
+    def reconcile(self, live_doc_ids: Iterable[str], snapshot_at: float, grace_seconds: float = 0.0) -> dict:
+        """Purge chunks whose document is not in ``live_doc_ids``.
+
+        ``snapshot_at`` is when the caller listed its live documents; chunks
+        indexed after ``snapshot_at - grace_seconds`` are left alone so a
+        document uploaded during reconciliation is never mistaken for an orphan.
+        """
+        live = {str(d) for d in live_doc_ids}
+        cutoff = snapshot_at - grace_seconds
+        orphan_docs: Set[str] = set()
+        course_ids: Set[str] = set()
+        scanned = 0
+        removed = 0
+        for collection in self.collections.all_collections():
+            orphans: List[str] = []
+            offset = 0
+            while True:
+                page = collection.get(include=["metadatas"], limit=RECONCILE_PAGE_SIZE, offset=offset)
+                if not page["ids"]:
+                    break
+                offset += len(page["ids"])
+                scanned += len(page["ids"])
+                for chunk_id, metadata in zip(page["ids"], page["metadatas"]):
+                    metadata = metadata or {}
+                    doc_id = metadata.get("doc_id")
+                    if doc_id in live or metadata.get("indexed_at", 0) > cutoff:
+                        continue
+                    orphans.append(chunk_id)
+                    orphan_docs.add(doc_id or "")
+                    if metadata.get("course_id"):
+                        course_ids.add(metadata["course_id"])
+            self._delete_ids(collection, orphans)
+            removed += len(orphans)
+
+        self.exact.invalidate(course_ids)
+        if removed:
+            logger.info(f"🧹 Reconciliation purged {removed} orphaned chunks from {len(orphan_docs)} documents")
+        return {
+            "scanned": scanned,
+            "orphan_documents": len(orphan_docs),
+            "removed": removed,
+            "course_ids": sorted(course_ids),
+        }
+
+    def compact(self) -> dict:
+        """VACUUM Chroma's SQLite store and report the bytes reclaimed on disk.
+
+        Chroma marks deleted rows free but never shrinks its database file.
+        HNSW segment files are not rewritten here.
+        """
+        db_path = os.path.join(self.persist_directory, "chroma.sqlite3")
+        if not os.path.exists(db_path):
+            return {"bytes_before": 0, "bytes_after": 0, "reclaimed_bytes": 0}
+        before = os.path.getsize(db_path)
+        error = None
+        conn = sqlite3.connect(db_path, timeout=30)
+        try:
+            conn.execute("VACUUM")
+        except sqlite3.Error as e:
+            error = str(e)
+            logger.warning(f"⚠️ Chroma compaction failed: {e}")
+        finally:
+            conn.close()
+        after = os.path.getsize(db_path)
+        report = {"bytes_before": before, "bytes_after": after, "reclaimed_bytes": max(before - after, 0)}
+        if error:
+            report["error"] = error
+        logger.info(f"🗜️ Compacted vector store: reclaimed {report['reclaimed_bytes'] / 1024 / 1024:.1f} MB")
+        return report
+
+    def retrieve(
+        self,
+        course_id: str,
+        query_text: str,
+        n_results: int = 4,
+        query_embedding: Optional[List[float]] = None,
+        budget_ms: Optional[float] = None,
+        token_budget: Optional[int] = None,
+    ) -> dict:
+        """Hybrid retrieval: vector and BM25 candidates fused by reciprocal rank.
+
+        Both searches run in parallel. Once ``budget_ms`` (RETRIEVAL_BUDGET_MS)
+        has elapsed, a stage that is still running is dropped and the other
+        one's ranking is used alone; the vector stage is always awaited if
+        nothing else finished. The fused candidates (over-fetched) then go
+        through the context selector, which diversifies them and keeps what
+        fits ``token_budget``. Returns ``{"chunks", "timings", "degraded",
+        "selection"}`` where each chunk has ``id``, ``text``, ``metadata``,
+        ``score`` and ``tokens``, and timings are per-stage milliseconds.
+        ``degraded`` includes ``lexical_backfill`` while the course's BM25
+        postings are still being backfilled (see ``backfill_lexical``).
+        """
+        started = time.perf_counter()
+        budget = (budget_ms if budget_ms is not None else self.retrieval_budget_ms) / 1000
+        timings: Dict[str, float] = {}
+        degraded: List[str] = []
+        collection = self.collections.for_course(course_id, create=False)
+        # A course's own shard needs no filter
+        where = None if self.collections.sharded else {"course_id": str(course_id)}
+        pool_size = self.selector.candidate_count(n_results)
+        fetch_k = max(pool_size, self.candidates)
+        vector_include = ["documents", "metadatas", "embeddings"] if self.selector.enabled else ["documents", "metadatas"]
+
+        def timed(stage: str, func, *args, **kwargs):
+            stage_started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                timings[stage] = round((time.perf_counter() - stage_started) * 1000, 2)
+
+        def vector_search():
+            """``(embedding, ranked ids, texts, metadatas, vectors)``; the dicts may be partial."""
+            if collection is None:
+                return query_embedding, [], {}, {}, {}
+            embedding = query_embedding
+            if embedding is None:
+                embedding = timed("embed", self.embed_query, query_text)
+            exact_hits = timed("exact", self.exact.search, course_id, [embedding], fetch_k)
+            if exact_hits is not None:
+                # Text and metadata come from the fetch below, like lexical-only hits
+                return embedding, [chunk_id for chunk_id, _ in exact_hits[0]], {}, {}, {}
+            results = timed(
+                "vector", collection.query,
+                query_embeddings=[embedding], where=where, n_results=fetch_k, include=vector_include,
+            )
+            ids = results["ids"][0]
+            vectors = dict(zip(ids, results["embeddings"][0])) if self.selector.enabled else {}
+            return (
+                embedding, ids, dict(zip(ids, results["documents"][0])),
+                dict(zip(ids, results["metadatas"][0])), vectors,
+            )
+
+        vector_future = self._retrieval_pool.submit(vector_search)
+        lexical_future = None
+        if self.retrieval_mode == "hybrid" and collection is not None and self._lexical_backfill_due(course_id, collection, where):
+            # BM25 still runs, but over a partial index until the backfill is done
+            degraded.append("lexical_backfill")
+        if self.retrieval_mode == "hybrid":
+            lexical_future = self._retrieval_pool.submit(timed, "lexical", self.lexical.search, course_id, query_text, fetch_k)
+
+        pending = [f for f in (vector_future, lexical_future) if f is not None]
+        wait(pending, timeout=max(budget - (time.perf_counter() - started), 0))
+        if lexical_future is not None and not lexical_future.done():
+            degraded.append("lexical")
+            lexical_future = None
+        if not vector_future.done():
+            if lexical_future is not None and lexical_future.result():
+                degraded.append("vector")
+                vector_future = None
+            else:
+                wait([vector_future])
+
+        texts: Dict[str, str] = {}
+        metadatas: Dict[str, dict] = {}
+        vectors: Dict[str, List[float]] = {}
+        rankings: List[List[str]] = []
+        embedding = query_embedding
+        if vector_future is not None:
+            embedding, ids, vector_texts, vector_metadatas, vector_vectors = vector_future.result()
+            texts.update(vector_texts)
+            metadatas.update(vector_metadatas)
+            vectors.update(vector_vectors)
+            rankings.append(ids)
+        if lexical_future is not None:
+            rankings.append([chunk_id for chunk_id, _ in lexical_future.result()])
+
+        fuse_started = time.perf_counter()
+        fused: Dict[str, float] = {}
+        for ranking in rankings:
+            for rank, chunk_id in enumerate(ranking):
+                fused[chunk_id] = fused.get(chunk_id, 0.0) + 1.0 / (self.rrf_k + rank + 1)
+        top = sorted(fused, key=fused.get, reverse=True)[:pool_size]
+        timings["fuse"] = round((time.perf_counter() - fuse_started) * 1000, 2)
+
+        # Lexical-only and exact-search hits still need their text and metadata (and vectors for MMR)
+        missing = [c for c in top if c not in texts or (self.selector.enabled and c not in vectors)]
+        if missing and collection is not None:
+            include = ["documents", "metadatas", "embeddings"] if self.selector.enabled else ["documents", "metadatas"]
+            found = timed("fetch", collection.get, ids=missing, include=include)
+            texts.update(zip(found["ids"], found["documents"]))
+            metadatas.update(zip(found["ids"], found["metadatas"]))
+            if self.selector.enabled:
+                vectors.update(zip(found["ids"], found["embeddings"]))
+
+        candidates = [
+            {"id": chunk_id, "text": texts[chunk_id], "metadata": metadatas.get(chunk_id) or {},
+             "score": round(fused[chunk_id], 5)}
+            for chunk_id in top if chunk_id in texts
+        ]
+        candidate_vectors = None
+        if self.selector.enabled and all(c["id"] in vectors for c in candidates):
+            candidate_vectors = np.asarray([vectors[c["id"]] for c in candidates], dtype=np.float32)
+        chunks, selection = timed(
+            "select", self.selector.select,
+            query_text, embedding, candidates, candidate_vectors, n_results, token_budget,
         )
-        
-        logger.info(f"✅ Successfully indexed {len(chunks)} chunks for document {doc_id}")
-        return len(chunks)
+        timings["total"] = round((time.perf_counter() - started) * 1000, 2)
+        # A dropped stage may still finish later and write into ``timings``
+        timings = dict(timings)
+        self._record_retrieval(timings, over_budget=timings["total"] > budget * 1000)
+        return {"chunks": chunks, "timings": timings, "degraded": degraded, "selection": selection}
+
+    def _record_retrieval(self, timings: Dict[str, float], over_budget: bool):
+        self._retrievals += 1
+        self._retrievals_over_budget += int(over_budget)
+        for stage, ms in timings.items():
+            self._retrieval_totals[stage] = self._retrieval_totals.get(stage, 0.0) + ms
+
+    def retrieval_stats(self) -> dict:
+        count = self._retrievals
+        return {
+            "mode": self.retrieval_mode,
+            "budget_ms": self.retrieval_budget_ms,
+            "retrievals": count,
+            "over_budget": self._retrievals_over_budget,
+            "avg_ms": {stage: round(total / count, 2) for stage, total in self._retrieval_totals.items()} if count else {},
+            "lexical_index": self.lexical.stats(),
+            "lexical_backfilling": sorted(self._lexical_backfilling),
+        }
 
     def search(self, course_id: str, query_text: str, n_results: int = 3) -> str:
         """Search relevant chunks for a given query within a course's context."""
-        query_embedding_resp = self.client.models.embed_content(
-            model="text-embedding-004",
-            contents=[query_text],
-            config=types.EmbedContentConfig(task_type="RETRIEVAL_QUERY")
-        )
-        query_embedding = query_embedding_resp.embeddings[0].values
+        results = self.retrieve(course_id, query_text, n_results=n_results)
 
-        results = self.collection.query(
-            query_embeddings=[query_embedding],
-            where={"course_id": str(course_id)},
-            n_results=n_results
-        )
-        
         # Combine retrieved chunks into a context string
-        context = "\n---\n".join(results["documents"][0])
+        context = "\n---\n".join(chunk["text"] for chunk in results["chunks"])
         return context
@@ -0,0 +1,125 @@
+"""
+SmartEdu AI – Embedding Backends
+Gemini embeddings, or a CPU-only hashing vectorizer for offline and dev use.
+"""
+
+import logging
+import math
+import os
+import re
+import zlib
+from typing import List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+class EmbeddingBackend:
+    """Interface shared by every embedding implementation.
+
+    ``model`` namespaces the embedding cache and ``collection_name`` keeps
+    vectors from different backends (and dimensions) in separate Chroma
+    collections. ``cacheable`` is False when recomputing is cheaper than a
+    cache lookup.
+    """
+
+    name = "base"
+    model = ""
+    dimensions = 0
+    cacheable = True
+
+    @property
+    def collection_name(self) -> str:
+        return "course_materials"
+
+    def embed(self, texts: List[str], task_type: str) -> List[List[float]]:
+        raise NotImplementedError
+
+
+class GeminiEmbeddingBackend(EmbeddingBackend):
+    name = "gemini"
+    model = "text-embedding-004"
+    dimensions = 768
+
+    def __init__(self, api_key: str):
+        from google import genai
+        self.client = genai.Client(api_key=api_key)
+
+    def embed(self, texts: List[str], task_type: str) -> List[List[float]]:
+        from google.genai import types
+        resp = self.client.models.embed_content(
+            model=self.model,
+            contents=texts,
+            config=types.EmbedContentConfig(task_type=task_type),
+        )
+        return [e.values for e in resp.embeddings]
+
+
+class HashingEmbeddingBackend(EmbeddingBackend):
+    """Signed feature hashing of word unigrams and bigrams into a fixed space.
+
+    Stateless, so nothing has to be fitted or persisted, and identical text
+    always maps to the same vector. Term frequencies are log-scaled and each
+    vector is L2-normalized, so dot products are cosine similarities. Quality
+    is lexical, not semantic; it is meant for offline development and load
+    tests, not to rival a trained model.
+    """
+
+    name = "local"
+    cacheable = False
+
+    def __init__(self, dimensions: Optional[int] = None):
+        self.dimensions = dimensions or int(os.getenv("EMBEDDING_LOCAL_DIMENSIONS", "768"))
+        self.model = f"hashing-v1-{self.dimensions}"
+
+    @property
+    def collection_name(self) -> str:
+        return f"course_materials_{self.model.replace('-', '_')}"
+
+    def _features(self, text: str):
+        words = _TOKEN_RE.findall(text.lower())
+        counts = {}
+        for i, word in enumerate(words):
+            for feature in (word, f"{words[i - 1]} {word}" if i else None):
+                if feature is None:
+                    continue
+                h = zlib.crc32(feature.encode("utf-8"))
+                counts[h] = counts.get(h, 0) + 1
+        return counts
+
+    def embed(self, texts: List[str], task_type: str = "RETRIEVAL_DOCUMENT") -> List[List[float]]:
+        matrix = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            counts = self._features(text)
+            if not counts:
+                continue
+            hashes = np.fromiter(counts.keys(), dtype=np.uint32, count=len(counts))
+            weights = np.fromiter((1.0 + math.log(c) for c in counts.values()), dtype=np.float32, count=len(counts))
+            # Top bit picks the sign so colliding features tend to cancel rather than pile up
+            signs = np.where(hashes >> 31, -1.0, 1.0).astype(np.float32)
+            np.add.at(matrix[row], hashes % self.dimensions, signs * weights)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix /= np.maximum(norms, 1e-12)
+        return matrix.tolist()
+
+
+EMBEDDING_BACKENDS = ("auto", GeminiEmbeddingBackend.name, HashingEmbeddingBackend.name)
+
+
+def get_embedding_backend(api_key: Optional[str] = None, name: Optional[str] = None) -> EmbeddingBackend:
+    """Backend named by ``name`` or EMBEDDING_BACKEND: gemini, local, or auto
+    (Gemini when an API key is available, local otherwise)."""
+    name = (name or os.getenv("EMBEDDING_BACKEND", "auto")).lower()
+    if name not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embedding backend {name!r}; expected one of {list(EMBEDDING_BACKENDS)}")
+    if name == "auto":
+        name = GeminiEmbeddingBackend.name if api_key else HashingEmbeddingBackend.name
+    if name == GeminiEmbeddingBackend.name:
+        if not api_key:
+            raise ValueError("EMBEDDING_BACKEND=gemini requires GEMINI_API_KEY")
+        return GeminiEmbeddingBackend(api_key)
+    logger.info("🧮 Using the local hashing embedding backend")
+    return HashingEmbeddingBackend()
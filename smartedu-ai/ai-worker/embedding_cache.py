@@ -0,0 +1,145 @@
+"""
+SmartEdu AI – Persistent Embedding Cache
+On-disk SQLite cache of (model, task_type, sha256(text)) -> float32 vector.
+"""
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# SQLite caps bound parameters per statement; stay well below it
+_SQL_BATCH = 500
+
+
+class EmbeddingCache:
+    """Content-addressed embedding store shared by every document upload.
+
+    Vectors are stored as raw float32 blobs. When the total size grows past
+    ``max_bytes`` the least recently used entries are evicted. Safe to use from
+    the worker's executor threads.
+    """
+
+    def __init__(self, path: str, max_bytes: Optional[int] = None):
+        self.path = path
+        self.max_bytes = max_bytes or int(os.getenv("EMBEDDING_CACHE_MAX_MB", "512")) * 1024 * 1024
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY,"
+            " vector BLOB NOT NULL,"
+            " nbytes INTEGER NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings(last_used)")
+        self._conn.commit()
+        self.total_bytes = self._conn.execute("SELECT COALESCE(SUM(nbytes), 0) FROM embeddings").fetchone()[0]
+
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+
+    @staticmethod
+    def key(model: str, task_type: str, text: str) -> str:
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return f"{model}:{task_type}:{digest}"
+
+    def get_many(self, model: str, task_type: str, texts: Sequence[str]) -> List[Optional[List[float]]]:
+        """Return cached vectors aligned with ``texts`` (None for misses)."""
+        keys = [self.key(model, task_type, t) for t in texts]
+        found = {}
+        with self._lock:
+            for i in range(0, len(keys), _SQL_BATCH):
+                batch = keys[i:i + _SQL_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                found.update(rows)
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?", [(now, k) for k in found]
+                )
+                self._conn.commit()
+
+        results = []
+        for k in keys:
+            blob = found.get(k)
+            results.append(np.frombuffer(blob, dtype=np.float32).tolist() if blob is not None else None)
+        hits = sum(1 for r in results if r is not None)
+        self.hits += hits
+        self.misses += len(results) - hits
+        return results
+
+    def put_many(self, model: str, task_type: str, texts: Sequence[str], vectors: Sequence[Sequence[float]]):
+        by_key = {}
+        now = time.time()
+        for text, vec in zip(texts, vectors):
+            blob = np.asarray(vec, dtype=np.float32).tobytes()
+            by_key[self.key(model, task_type, text)] = (blob, len(blob), now)
+        rows = [(k, *v) for k, v in by_key.items()]
+        if not rows:
+            return
+        with self._lock:
+            keys = [r[0] for r in rows]
+            replaced = 0
+            for i in range(0, len(keys), _SQL_BATCH):
+                batch = keys[i:i + _SQL_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                replaced += self._conn.execute(
+                    f"SELECT COALESCE(SUM(nbytes), 0) FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchone()[0]
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, nbytes, last_used) VALUES (?, ?, ?, ?)", rows
+            )
+            self.total_bytes += sum(r[2] for r in rows) - replaced
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        """Drop least recently used vectors until we are back under 90% of the budget."""
+        target = int(self.max_bytes * 0.9)
+        while self.total_bytes > target:
+            rows = self._conn.execute(
+                "SELECT key, nbytes FROM embeddings ORDER BY last_used ASC LIMIT ?", (_SQL_BATCH,)
+            ).fetchall()
+            if not rows:
+                self.total_bytes = 0
+                break
+            drop = []
+            for key, nbytes in rows:
+                drop.append((key,))
+                self.total_bytes -= nbytes
+                if self.total_bytes <= target:
+                    break
+            self._conn.executemany("DELETE FROM embeddings WHERE key = ?", drop)
+            self.evicted += len(drop)
+        logger.info(f"🧹 Embedding cache evicted down to {self.total_bytes / 1024 / 1024:.1f} MB")
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "path": self.path,
+            "size_mb": round(self.total_bytes / 1024 / 1024, 2),
+            "max_mb": round(self.max_bytes / 1024 / 1024, 2),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evicted": self.evicted,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
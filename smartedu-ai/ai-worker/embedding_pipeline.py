@@ -0,0 +1,135 @@
+"""
+SmartEdu AI – Embedding Pipeline
+Splits chunks into count- and byte-bounded batches, embeds them concurrently
+with per-batch retries, and hands each finished batch to the index right away.
+"""
+
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# (chunk id, chunk text, chroma metadata)
+ChunkItem = Tuple[str, str, dict]
+
+
+class EmbeddingPipeline:
+    """Bounded, parallel embed -> index stage.
+
+    ``embed`` takes a list of texts and returns ``(vectors, report)`` where the
+    report holds counters to be summed (e.g. cache savings). ``sink`` receives
+    ``(ids, vectors, metadatas, texts)`` for each completed batch.
+    """
+
+    def __init__(
+        self,
+        embed: Callable[[List[str]], Tuple[List[List[float]], dict]],
+        sink: Callable[[List[str], List[List[float]], List[dict], List[str]], None],
+        max_items: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        concurrency: Optional[int] = None,
+        max_retries: Optional[int] = None,
+        backoff_seconds: Optional[float] = None,
+    ):
+        self.embed = embed
+        self.sink = sink
+        # Gemini batchEmbedContents accepts at most 100 items per request
+        self.max_items = max_items or int(os.getenv("EMBED_BATCH_MAX_ITEMS", "100"))
+        self.max_bytes = max_bytes or int(os.getenv("EMBED_BATCH_MAX_BYTES", "200000"))
+        self.concurrency = concurrency or int(os.getenv("EMBED_CONCURRENCY", "4"))
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv("EMBED_MAX_RETRIES", "3"))
+        self.backoff_seconds = backoff_seconds or float(os.getenv("EMBED_BACKOFF_SECONDS", "1.0"))
+
+    def batches(self, items: Iterable[ChunkItem]) -> Iterator[List[ChunkItem]]:
+        """Group items so no batch exceeds ``max_items`` or ``max_bytes`` of text."""
+        batch: List[ChunkItem] = []
+        size = 0
+        for item in items:
+            item_bytes = len(item[1].encode("utf-8"))
+            if batch and (len(batch) >= self.max_items or size + item_bytes > self.max_bytes):
+                yield batch
+                batch, size = [], 0
+            batch.append(item)
+            size += item_bytes
+        if batch:
+            yield batch
+
+    def _run_batch(self, batch: List[ChunkItem], on_indexed: Callable[[int], None]) -> dict:
+        ids = [i for i, _, _ in batch]
+        texts = [t for _, t, _ in batch]
+        metadatas = [m for _, _, m in batch]
+        attempt = 0
+        while True:
+            try:
+                vectors, report = self.embed(texts)
+                break
+            except Exception as e:
+                attempt += 1
+                if attempt > self.max_retries:
+                    raise
+                delay = self.backoff_seconds * (2 ** (attempt - 1)) * (1 + random.random() * 0.25)
+                logger.warning(f"⚠️ Embedding batch of {len(batch)} failed ({e}); retry {attempt} in {delay:.1f}s")
+                time.sleep(delay)
+        self.sink(ids, vectors, metadatas, texts)
+        on_indexed(len(batch))
+        return {**report, "retries": attempt}
+
+    def run(self, items: Iterable[ChunkItem], on_progress: Optional[Callable[[int], None]] = None) -> dict:
+        """Embed and index everything in ``items``; returns throughput and counters.
+
+        At most ``2 * concurrency`` batches are held in memory at once, so
+        ``items`` may be a lazy stream. ``on_progress`` receives the running
+        count of indexed chunks. Raises after draining if any batch still fails
+        once its retries are exhausted.
+        """
+        started = time.perf_counter()
+        totals: Dict[str, float] = {}
+        chunks = 0
+        batches = 0
+        failures: List[Exception] = []
+        pending: Set[Future] = set()
+        indexed = [0]
+        indexed_lock = threading.Lock()
+
+        def on_indexed(count: int):
+            with indexed_lock:
+                indexed[0] += count
+                total = indexed[0]
+            if on_progress:
+                on_progress(total)
+
+        def collect(done: Set[Future]):
+            for future in done:
+                try:
+                    for key, value in future.result().items():
+                        totals[key] = totals.get(key, 0) + value
+                except Exception as e:
+                    failures.append(e)
+
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="embed") as pool:
+            for batch in self.batches(items):
+                if len(pending) >= self.concurrency * 2:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(done)
+                pending.add(pool.submit(self._run_batch, batch, on_indexed))
+                chunks += len(batch)
+                batches += 1
+            done, _ = wait(pending)
+            collect(done)
+
+        elapsed = time.perf_counter() - started
+        if failures:
+            raise RuntimeError(f"{len(failures)}/{batches} embedding batches failed: {failures[0]}")
+
+        return {
+            **{k: int(v) for k, v in totals.items()},
+            "chunks": chunks,
+            "batches": batches,
+            "seconds": round(elapsed, 3),
+            "chunks_per_second": round(chunks / elapsed, 1) if elapsed > 0 else 0.0,
+        }
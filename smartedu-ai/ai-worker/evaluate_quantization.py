@@ -0,0 +1,96 @@
+"""
+Measure recall@k and memory of quantized exact search against float32 search.
+
+Usage:
+    python evaluate_quantization.py [--course COURSE_ID] [--persist-dir ./chroma_db]
+                                    [--chunks 20000] [--dims 768] [--queries 200] [--k 4] [--rescore 0,4]
+
+With --course, the course's embeddings are read from the vector store
+(honouring EMBEDDING_BACKEND and VECTOR_SHARDING) and --queries of its chunks
+are held out as queries, so the numbers reflect that tenant's real data.
+Without it, clustered synthetic vectors are used. Every quantization mode is
+run through ExactIndex for each --rescore factor and compared with the
+float32 top k.
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from exact_index import QUANTIZATION_MODES, ExactIndex
+
+
+def load_course(persist_dir: str, course_id: str):
+    import chromadb
+
+    from collection_router import CollectionRouter
+    from embedding_backends import get_embedding_backend
+
+    backend = get_embedding_backend(os.getenv("GEMINI_API_KEY"))
+    router = CollectionRouter(chromadb.PersistentClient(path=persist_dir), backend.collection_name)
+    collection = router.for_course(course_id, create=False)
+    if collection is None:
+        raise SystemExit(f"No vectors for course {course_id} in {persist_dir}")
+    where = None if router.sharded else {"course_id": str(course_id)}
+    found = collection.get(where=where, include=["embeddings"])
+    return np.asarray(found["embeddings"], dtype=np.float32)
+
+
+def synthetic(chunks: int, dims: int) -> np.ndarray:
+    # Topic centroids plus noise, closer to real embeddings than isotropic noise
+    rng = np.random.default_rng(0)
+    centroids = rng.standard_normal((max(chunks // 200, 1), dims), dtype=np.float32)
+    return centroids[rng.integers(0, len(centroids), chunks)] + rng.standard_normal((chunks, dims), dtype=np.float32)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--course")
+    parser.add_argument("--persist-dir", default="./chroma_db")
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--dims", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--rescore", default="0,4")
+    args = parser.parse_args()
+
+    matrix = load_course(args.persist_dir, args.course) if args.course else synthetic(args.chunks, args.dims)
+    rng = np.random.default_rng(1)
+    held_out = rng.choice(len(matrix), size=min(args.queries, len(matrix) // 2), replace=False)
+    queries = matrix[held_out]
+    corpus = np.delete(matrix, held_out, axis=0)
+    ids = [str(i) for i in range(len(corpus))]
+    print(f"📐 {len(corpus)} vectors x {corpus.shape[1]} dims, {len(queries)} queries, k={args.k}")
+
+    directory = tempfile.mkdtemp(prefix="eval_quantization_")
+    try:
+        truth = None
+        print(f"{'storage':>8}  {'rescore':>7}  {'MB':>8}  {'bytes/vec':>9}  {'recall@k':>8}  {'ms/query':>8}")
+        for mode in QUANTIZATION_MODES:
+            for rescore in ([0] if mode == "none" else [int(r) for r in args.rescore.split(",")]):
+                index = ExactIndex(
+                    os.path.join(directory, f"{mode}_{rescore}"), loader=lambda _c, _l: (ids, corpus),
+                    max_chunks=len(corpus), quantization=mode, rescore=rescore,
+                )
+                index.warm(["course"])
+                started = time.perf_counter()
+                results = index.search("course", queries, args.k)
+                elapsed_ms = (time.perf_counter() - started) * 1000 / len(queries)
+                found = [{chunk_id for chunk_id, _ in row} for row in results]
+                if truth is None:
+                    truth = found
+                recall = sum(len(f & t) for f, t in zip(found, truth)) / sum(len(t) for t in truth)
+                vector_bytes = index.stats()["vector_bytes"]
+                print(f"{mode:>8}  {rescore:>7}  {vector_bytes / 2**20:>8.1f}  {vector_bytes / len(corpus):>9.0f}  "
+                      f"{recall:>8.3f}  {elapsed_ms:>8.3f}")
+                index.close()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,323 @@
+"""
+SmartEdu AI – Exact Vector Search
+Brute-force top-k over a per-course, memory-mapped embedding matrix for
+courses small enough that a dot product beats an ANN index, optionally
+stored as float16 or int8.
+"""
+
+import logging
+import os
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# (course_id, limit) -> (chunk ids, embeddings), or None when the course holds more than ``limit`` chunks
+CourseLoader = Callable[[str, int], Optional[Tuple[List[str], List[List[float]]]]]
+
+_LATENCY_WINDOW = 2000
+# Rows upcast to float32 at a time when scoring a quantized matrix
+_DEQUANT_BLOCK = 4096
+
+QUANTIZATION_MODES = ("none", "float16", "int8")
+
+
+class CourseMatrix(NamedTuple):
+    ids: np.ndarray
+    vectors: np.ndarray               # float32, float16 or int8 rows
+    scales: Optional[np.ndarray]      # per-row float32 scale for int8
+    full: Optional[np.ndarray]        # float32 rows for rescoring, when kept
+
+
+def quantize(matrix: np.ndarray, mode: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """Stored form of L2-normalized float32 rows: ``(vectors, per-row scales or None)``.
+
+    int8 uses a symmetric per-vector scale, ``row ≈ q * scale`` with
+    ``scale = max|row| / 127``, so each row keeps its own dynamic range.
+    """
+    if mode == "float16":
+        return matrix.astype(np.float16), None
+    if mode == "int8":
+        scales = np.maximum(np.abs(matrix).max(axis=1), 1e-12) / 127
+        return np.round(matrix / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+    return matrix, None
+
+
+def _scores(queries: np.ndarray, course: CourseMatrix) -> np.ndarray:
+    vectors = course.vectors
+    if vectors.dtype == np.float32:
+        return queries @ vectors.T
+    # NumPy has no BLAS path for float16/int8, so upcast a block at a time
+    scores = np.empty((len(queries), len(vectors)), dtype=np.float32)
+    for start in range(0, len(vectors), _DEQUANT_BLOCK):
+        block = np.asarray(vectors[start:start + _DEQUANT_BLOCK], dtype=np.float32)
+        scores[:, start:start + len(block)] = queries @ block.T
+    if course.scales is not None:
+        scores *= course.scales
+    return scores
+
+
+def _top_k(scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Column indices and scores of each row's ``k`` best entries, best first."""
+    if k < scores.shape[1]:
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        top = np.broadcast_to(np.arange(scores.shape[1]), scores.shape)
+    top_scores = np.take_along_axis(scores, top, axis=1)
+    order = np.argsort(-top_scores, axis=1)
+    return np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+
+
+def _percentile(samples, q: float) -> Optional[float]:
+    return round(float(np.percentile(samples, q)), 3) if samples else None
+
+
+class ExactIndex:
+    """Per-course ``.npy`` matrices searched with one matrix product.
+
+    Each course is stored as ``<course>.ids.npy`` (the chunk id of every row)
+    plus its vectors, written atomically and opened with ``mmap_mode="r"`` so
+    the OS page cache, not the worker heap, holds them. Vectors are kept as
+    float32 (``<course>.npy``), float16 (``.f16.npy``) or int8 with per-row
+    scales (``.i8.npy`` + ``.scales.npy``) per ``quantization``
+    (EXACT_SEARCH_QUANTIZATION). With ``rescore`` (EXACT_SEARCH_RESCORE) > 0
+    the float32 file is kept as well and the best ``k * rescore`` quantized
+    candidates are rescored from it; only those rows are ever paged in.
+
+    The files are a derived cache of the vector store: writes call
+    ``invalidate`` and the matrix is rebuilt in the background on the next
+    query, which meanwhile returns None so the caller uses the ANN store.
+    Courses with more than ``max_chunks`` chunks are never built and keep
+    using the ANN store.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        loader: CourseLoader,
+        max_chunks: Optional[int] = None,
+        quantization: Optional[str] = None,
+        rescore: Optional[int] = None,
+    ):
+        self.directory = directory
+        self.loader = loader
+        self.max_chunks = max_chunks if max_chunks is not None else int(os.getenv("EXACT_SEARCH_MAX_CHUNKS", "20000"))
+        self.quantization = (quantization or os.getenv("EXACT_SEARCH_QUANTIZATION", "none")).lower()
+        if self.quantization not in QUANTIZATION_MODES:
+            raise ValueError(
+                f"Unknown EXACT_SEARCH_QUANTIZATION {self.quantization!r}; expected one of {list(QUANTIZATION_MODES)}"
+            )
+        self.rescore = rescore if rescore is not None else int(os.getenv("EXACT_SEARCH_RESCORE", "0"))
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._matrices: Dict[str, CourseMatrix] = {}
+        self._on_ann: Dict[str, int] = {}
+        self._generation: Dict[str, int] = {}
+        self._building: Dict[str, object] = {}
+        self._builder = ThreadPoolExecutor(max_workers=1, thread_name_prefix="exact-index")
+        self._latencies_ms: deque = deque(maxlen=_LATENCY_WINDOW)
+
+        self.queries = 0
+        self.ann_queries = 0
+        self.builds = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_chunks > 0
+
+    @property
+    def keeps_full_precision(self) -> bool:
+        return self.quantization == "none" or self.rescore > 0
+
+    def _paths(self, course_id: str) -> Dict[str, str]:
+        key = re.sub(r"[^a-zA-Z0-9_-]", "_", str(course_id)) or "_"
+        base = os.path.join(self.directory, key)
+        return {
+            "ids": f"{base}.ids.npy",
+            "none": f"{base}.npy",
+            "float16": f"{base}.f16.npy",
+            "int8": f"{base}.i8.npy",
+            "scales": f"{base}.scales.npy",
+        }
+
+    def invalidate(self, course_ids):
+        """Drop the matrices of courses whose chunks changed."""
+        for course_id in {str(c) for c in course_ids}:
+            with self._lock:
+                self._generation[course_id] = self._generation.get(course_id, 0) + 1
+                self._matrices.pop(course_id, None)
+                self._on_ann.pop(course_id, None)
+                for path in self._paths(course_id).values():
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+
+    def _open(self, course_id: str) -> Optional[CourseMatrix]:
+        paths = self._paths(course_id)
+        try:
+            ids = np.load(paths["ids"])
+            vectors = np.load(paths[self.quantization], mmap_mode="r")
+            scales = np.load(paths["scales"]) if self.quantization == "int8" else None
+            full = None
+            if self.quantization == "none":
+                full = vectors
+            elif self.rescore > 0:
+                full = np.load(paths["none"], mmap_mode="r")
+        except (FileNotFoundError, ValueError):
+            return None
+        if vectors.ndim != 2 or len(vectors) != len(ids):
+            return None
+        if full is not None and full.shape != vectors.shape:
+            return None
+        return CourseMatrix(ids, vectors, scales, full)
+
+    def _build(self, course_id: str, generation: int):
+        try:
+            loaded = self.loader(course_id, self.max_chunks)
+            if loaded is None or not loaded[0]:
+                # Too large (or empty): leave it to the ANN store until its chunks change
+                with self._lock:
+                    if self._generation.get(course_id, 0) == generation:
+                        self._on_ann[course_id] = generation
+                if loaded is None:
+                    logger.info(f"📈 Course {course_id} exceeds {self.max_chunks} chunks; using the ANN index")
+                return
+            ids, embeddings = loaded
+            matrix = np.asarray(embeddings, dtype=np.float32).reshape(len(ids), -1)
+            matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+
+            paths = self._paths(course_id)
+            arrays = {"ids": np.asarray(ids, dtype=str)}
+            vectors, scales = quantize(matrix, self.quantization)
+            arrays[self.quantization] = vectors
+            if scales is not None:
+                arrays["scales"] = scales
+            if self.keeps_full_precision:
+                arrays["none"] = matrix
+
+            # np.save appends ".npy" to names without it, so keep the suffix on the temp files
+            staged = []
+            for role, array in arrays.items():
+                tmp_path = f"{paths[role][:-4]}.{generation}.tmp.npy"
+                np.save(tmp_path, array)
+                staged.append((tmp_path, paths[role]))
+            with self._lock:
+                if self._generation.get(course_id, 0) != generation:
+                    # Chunks changed while loading; the next query rebuilds
+                    for tmp_path, _ in staged:
+                        os.remove(tmp_path)
+                    return
+                for tmp_path, path in staged:
+                    os.replace(tmp_path, path)
+                opened = self._open(course_id)
+                if opened is not None:
+                    self._matrices[course_id] = opened
+                    self.builds += 1
+            logger.info(f"🧮 Built exact index for course {course_id}: {len(ids)} chunks ({self.quantization})")
+        except Exception as e:
+            logger.warning(f"⚠️ Exact index build failed for course {course_id}: {e}")
+        finally:
+            with self._lock:
+                self._building.pop(course_id, None)
+
+    def _matrix(self, course_id: str) -> Optional[CourseMatrix]:
+        with self._lock:
+            opened = self._matrices.get(course_id)
+            if opened is not None:
+                return opened
+            generation = self._generation.get(course_id, 0)
+            if self._on_ann.get(course_id) == generation:
+                return None
+            opened = self._open(course_id)
+            if opened is not None:
+                self._matrices[course_id] = opened
+                return opened
+            if course_id not in self._building:
+                self._building[course_id] = self._builder.submit(self._build, course_id, generation)
+        return None
+
+    def warm(self, course_ids):
+        """Open or build the given courses' matrices, blocking until done."""
+        pending = []
+        for course_id in {str(c) for c in course_ids}:
+            self._matrix(course_id)
+            with self._lock:
+                future = self._building.get(course_id)
+            if future is not None:
+                pending.append(future)
+        wait(pending)
+
+    def search(self, course_id: str, query_vectors: Sequence[Sequence[float]], k: int) -> Optional[List[List[Tuple[str, float]]]]:
+        """Top ``k`` ``(chunk_id, cosine)`` per query vector, best first.
+
+        Returns None when the course is not (yet) served from this index.
+        """
+        if not self.enabled:
+            return None
+        course = self._matrix(str(course_id))
+        if course is None:
+            self.ann_queries += 1
+            return None
+        ids = course.ids
+        started = time.perf_counter()
+        queries = np.asarray(query_vectors, dtype=np.float32).reshape(-1, course.vectors.shape[1])
+        queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+        k = min(k, len(ids))
+        if k <= 0:
+            return [[] for _ in range(len(queries))]
+
+        scores = _scores(queries, course)
+        rescoring = course.vectors.dtype != np.float32 and course.full is not None
+        top, top_scores = _top_k(scores, min(k * self.rescore, len(ids)) if rescoring else k)
+        if rescoring:
+            rescored_top, rescored_scores = [], []
+            for query, candidates in zip(queries, top):
+                rows = np.sort(candidates)
+                exact = np.asarray(course.full[rows]) @ query
+                best = np.argsort(-exact)[:k]
+                rescored_top.append(rows[best])
+                rescored_scores.append(exact[best])
+            top, top_scores = rescored_top, rescored_scores
+
+        results = [
+            [(str(ids[i]), float(s)) for i, s in zip(row, row_scores)]
+            for row, row_scores in zip(top, top_scores)
+        ]
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self.queries += len(queries)
+            self._latencies_ms.append(elapsed_ms)
+        return results
+
+    def stats(self) -> dict:
+        with self._lock:
+            latencies = list(self._latencies_ms)
+            resident = sum(
+                c.vectors.nbytes + (c.scales.nbytes if c.scales is not None else 0) for c in self._matrices.values()
+            )
+            return {
+                "enabled": self.enabled,
+                "max_chunks": self.max_chunks,
+                "quantization": self.quantization,
+                "rescore": self.rescore,
+                "courses_loaded": len(self._matrices),
+                "chunks_loaded": sum(len(c.ids) for c in self._matrices.values()),
+                "vector_bytes": resident,
+                "courses_on_ann": len(self._on_ann),
+                "building": len(self._building),
+                "builds": self.builds,
+                "queries": self.queries,
+                "ann_queries": self.ann_queries,
+                "p50_ms": _percentile(latencies, 50),
+                "p99_ms": _percentile(latencies, 99),
+            }
+
+    def close(self):
+        self._builder.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,188 @@
+"""
+SmartEdu AI – Hedged Requests
+Fires a backup request when the primary model is slower than its recent
+latency percentile, and keeps whichever answer arrives first.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+HEDGE_TARGETS = ("next", "same")
+
+Attempt = Callable[[str], Awaitable[Optional[dict]]]
+
+
+class RequestHedger:
+    """Hedge one generation call against an alternate model or a replica.
+
+    The primary request gets a head start of the ``percentile`` latency
+    (HEDGE_PERCENTILE) of that model's recent completed primaries, at least
+    ``min_delay_ms``; until ``min_samples`` latencies are known,
+    ``default_delay_ms`` is used. If it has not answered by then, a second
+    request goes to the next model in the cascade (HEDGE_TARGET=next) or to
+    the same model again (``same``, so the load balancer can pick another
+    replica). The first usable answer wins and the other request is
+    cancelled. At most ``max_rate`` (HEDGE_MAX_RATE) of the last ``window``
+    requests may hedge, which caps the extra spend.
+    """
+
+    def __init__(
+        self,
+        enabled: Optional[bool] = None,
+        percentile: Optional[float] = None,
+        min_delay_ms: Optional[float] = None,
+        default_delay_ms: Optional[float] = None,
+        min_samples: Optional[int] = None,
+        max_rate: Optional[float] = None,
+        target: Optional[str] = None,
+        window: int = 1000,
+    ):
+        self.enabled = enabled if enabled is not None else os.getenv("CHAT_HEDGING", "false").lower() == "true"
+        self.percentile = percentile or float(os.getenv("HEDGE_PERCENTILE", "95"))
+        self.min_delay_ms = min_delay_ms or float(os.getenv("HEDGE_MIN_DELAY_MS", "250"))
+        self.default_delay_ms = default_delay_ms or float(os.getenv("HEDGE_DEFAULT_DELAY_MS", "3000"))
+        self.min_samples = min_samples or int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+        self.max_rate = max_rate if max_rate is not None else float(os.getenv("HEDGE_MAX_RATE", "0.1"))
+        self.target = (target or os.getenv("HEDGE_TARGET", "next")).lower()
+        if self.target not in HEDGE_TARGETS:
+            raise ValueError(f"Unknown HEDGE_TARGET {self.target!r}; expected one of {list(HEDGE_TARGETS)}")
+        self._latencies: Dict[str, Deque[float]] = {}
+        self._recent: Deque[bool] = deque(maxlen=window)
+        self._recent_hedged = 0
+
+        self.requests = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.primary_wins = 0
+        self.capped = 0
+        self.no_alternate = 0
+        self.both_failed = 0
+
+    def delay_for(self, model: str) -> float:
+        """Seconds the primary request on ``model`` runs before a hedge is considered."""
+        samples = self._latencies.get(model)
+        if not samples or len(samples) < self.min_samples:
+            return self.default_delay_ms / 1000
+        return max(float(np.percentile(samples, self.percentile)), self.min_delay_ms) / 1000
+
+    def _observe(self, model: str, latency_ms: float):
+        samples = self._latencies.get(model)
+        if samples is None:
+            samples = self._latencies[model] = deque(maxlen=self._recent.maxlen)
+        samples.append(latency_ms)
+
+    def _count_request(self, hedged: bool):
+        if len(self._recent) == self._recent.maxlen and self._recent[0]:
+            self._recent_hedged -= 1
+        self._recent.append(hedged)
+        self._recent_hedged += hedged
+
+    def _within_budget(self) -> bool:
+        # Counting the hedge about to be fired keeps the rate at or below the cap
+        return (self._recent_hedged + 1) / (len(self._recent) + 1) <= self.max_rate
+
+    def _start(self, model: str, attempt: Attempt, primary: bool) -> "asyncio.Task":
+        started = time.perf_counter()
+
+        async def timed():
+            result = await attempt(model)
+            # Only completed primaries: a cancelled request's elapsed time is a
+            # lower bound, and counting it would drag the percentile down
+            if primary and result is not None:
+                self._observe(model, (time.perf_counter() - started) * 1000)
+            return result
+
+        return asyncio.ensure_future(timed())
+
+    async def run(
+        self,
+        primary: str,
+        attempt: Attempt,
+        pick_alternate: Callable[[], Optional[str]],
+        max_wait: Optional[float] = None,
+    ) -> Tuple[Optional[str], Optional[dict]]:
+        """``(model, result)`` from the first of ``attempt(primary)`` and a hedge to answer.
+
+        ``attempt`` returns None on failure. ``pick_alternate`` is only
+        called once a hedge is due and returns the model to hedge to, or
+        None when there is none. No hedge is fired when the head start would
+        reach ``max_wait`` (the time left before the caller's deadline).
+        Returns ``(None, None)`` when every attempt failed.
+        """
+        if not self.enabled:
+            return primary, await attempt(primary)
+
+        self.requests += 1
+        first = self._start(primary, attempt, primary=True)
+        pending = {first}
+        try:
+            delay = self.delay_for(primary)
+            if max_wait is not None and delay >= max_wait:
+                # The deadline comes first: a hedge fired then could only time out
+                self._count_request(False)
+                return primary, await first
+            done, _ = await asyncio.wait(pending, timeout=delay)
+            if done:
+                self._count_request(False)
+                return primary, first.result()
+
+            if not self._within_budget():
+                self.capped += 1
+                self._count_request(False)
+                return primary, await first
+            alternate = primary if self.target == "same" else pick_alternate()
+            if alternate is None:
+                self.no_alternate += 1
+                self._count_request(False)
+                return primary, await first
+
+            self.hedges += 1
+            self._count_request(True)
+            logger.info(f"🪝 {primary} slower than {delay * 1000:.0f}ms, hedging to {alternate}")
+            second = self._start(alternate, attempt, primary=False)
+            models = {first: primary, second: alternate}
+            pending.add(second)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    result = task.result()
+                    if result is None:
+                        continue
+                    if task is second:
+                        self.hedge_wins += 1
+                    else:
+                        self.primary_wins += 1
+                    return models[task], result
+            self.both_failed += 1
+            return None, None
+        finally:
+            # The losing request (or both, if the caller was cancelled)
+            for task in pending:
+                task.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "target": self.target,
+            "percentile": self.percentile,
+            "max_rate": self.max_rate,
+            "delay_ms": {model: round(self.delay_for(model) * 1000, 1) for model in self._latencies},
+            "requests": self.requests,
+            "hedges": self.hedges,
+            "hedge_rate": round(self.hedges / self.requests, 3) if self.requests else 0.0,
+            "recent_hedge_rate": round(self._recent_hedged / len(self._recent), 3) if self._recent else 0.0,
+            "hedge_wins": self.hedge_wins,
+            "primary_wins_after_hedge": self.primary_wins,
+            "hedge_win_rate": round(self.hedge_wins / self.hedges, 3) if self.hedges else 0.0,
+            "capped": self.capped,
+            "no_alternate": self.no_alternate,
+            "both_failed": self.both_failed,
+        }
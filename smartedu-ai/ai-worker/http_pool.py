@@ -0,0 +1,176 @@
+"""
+SmartEdu AI – Gemini REST Connection Pool
+One long-lived httpx client per worker, so chat requests reuse warm TLS connections.
+"""
+
+import json
+import logging
+import os
+import time
+from typing import Any, AsyncIterator, Dict, Optional, Union
+
+import httpx
+
+from concurrency import parse_model_overrides
+
+logger = logging.getLogger(__name__)
+
+GEMINI_BASE_URL = "https://generativelanguage.googleapis.com/v1beta"
+
+
+class GeminiHTTPPool:
+    """Application-scoped httpx.AsyncClient for the Gemini REST API.
+
+    Created at worker startup and closed at shutdown. Every request is traced
+    through httpcore so we can tell whether it opened a new connection (and
+    paid the TCP/TLS handshake) or reused a pooled one.
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        http2: Optional[bool] = None,
+        max_connections: Optional[int] = None,
+        max_keepalive: Optional[int] = None,
+        keepalive_expiry: Optional[float] = None,
+        default_timeout: Optional[float] = None,
+        model_timeouts: Optional[Dict[str, float]] = None,
+    ):
+        self.api_key = api_key
+        self.http2 = http2 if http2 is not None else os.getenv("GEMINI_HTTP2", "false").lower() == "true"
+        self.max_connections = max_connections or int(os.getenv("GEMINI_POOL_MAX_CONNECTIONS", "20"))
+        self.max_keepalive = max_keepalive or int(os.getenv("GEMINI_POOL_MAX_KEEPALIVE", "10"))
+        self.keepalive_expiry = keepalive_expiry or float(os.getenv("GEMINI_POOL_KEEPALIVE_EXPIRY", "60"))
+        self.default_timeout = default_timeout or float(os.getenv("GEMINI_TIMEOUT", "30"))
+        self.model_timeouts = model_timeouts if model_timeouts is not None else parse_model_overrides(
+            os.getenv("GEMINI_MODEL_TIMEOUTS", ""), float
+        )
+        self.client: Optional[httpx.AsyncClient] = None
+
+        self.requests = 0
+        self.new_connections = 0
+        self.reused_connections = 0
+        self.handshake_ms_total = 0.0
+
+    async def start(self):
+        if self.client is not None:
+            return
+        if self.http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                logger.warning("⚠️ GEMINI_HTTP2 requested but 'h2' is not installed; using HTTP/1.1")
+                self.http2 = False
+        self.client = httpx.AsyncClient(
+            base_url=GEMINI_BASE_URL,
+            http2=self.http2,
+            headers={"x-goog-api-key": self.api_key},
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_keepalive,
+                keepalive_expiry=self.keepalive_expiry,
+            ),
+            timeout=self.default_timeout,
+        )
+        logger.info(
+            f"🔌 Gemini HTTP pool started (http2={self.http2}, "
+            f"max_connections={self.max_connections}, keepalive={self.max_keepalive})"
+        )
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    def timeout_for(self, model: str) -> float:
+        return self.model_timeouts.get(model, self.default_timeout)
+
+    def _tracer(self):
+        """Build a per-request httpcore trace hook that records handshake cost."""
+        state: Dict[str, Any] = {"new": False, "started": {}, "handshake_ms": 0.0}
+
+        async def trace(event: str, info: dict):
+            if not event.startswith("connection."):
+                return
+            step, _, phase = event[len("connection."):].rpartition(".")
+            if step not in ("connect_tcp", "start_tls"):
+                return
+            if phase == "started":
+                state["new"] = True
+                state["started"][step] = time.perf_counter()
+            elif phase == "complete" and step in state["started"]:
+                state["handshake_ms"] += (time.perf_counter() - state["started"][step]) * 1000
+
+        return trace, state
+
+    def _record(self, state: Dict[str, Any]):
+        self.requests += 1
+        if state["new"]:
+            self.new_connections += 1
+            self.handshake_ms_total += state["handshake_ms"]
+        else:
+            self.reused_connections += 1
+
+    async def post(
+        self, model: str, method: str, payload: dict, timeout: Optional[float] = None
+    ) -> httpx.Response:
+        """POST to ``models/{model}:{method}`` on the shared client."""
+        if self.client is None:
+            await self.start()
+        trace, state = self._tracer()
+        try:
+            return await self.client.post(
+                f"/models/{model}:{method}",
+                json=payload,
+                timeout=timeout if timeout is not None else self.timeout_for(model),
+                extensions={"trace": trace},
+            )
+        finally:
+            self._record(state)
+
+    async def stream(
+        self, model: str, payload: dict, timeout: Union[float, httpx.Timeout, None] = None
+    ) -> AsyncIterator[dict]:
+        """Yield parsed chunks from ``models/{model}:streamGenerateContent`` (SSE).
+
+        A float ``timeout`` also bounds every gap between chunks; pass an
+        ``httpx.Timeout`` to limit connecting and reading separately.
+
+        Raises ``httpx.HTTPStatusError`` before the first chunk if the model
+        rejects the request, so callers can still fall through to another model.
+        """
+        if self.client is None:
+            await self.start()
+        trace, state = self._tracer()
+        try:
+            async with self.client.stream(
+                "POST",
+                f"/models/{model}:streamGenerateContent",
+                params={"alt": "sse"},
+                json=payload,
+                timeout=timeout if timeout is not None else self.timeout_for(model),
+                extensions={"trace": trace},
+            ) as resp:
+                if resp.status_code != 200:
+                    await resp.aread()
+                    resp.raise_for_status()
+                async for line in resp.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if data:
+                        yield json.loads(data)
+        finally:
+            self._record(state)
+
+    def stats(self) -> dict:
+        return {
+            "http2": self.http2,
+            "max_connections": self.max_connections,
+            "max_keepalive": self.max_keepalive,
+            "requests": self.requests,
+            "new_connections": self.new_connections,
+            "reused_connections": self.reused_connections,
+            "reuse_ratio": round(self.reused_connections / self.requests, 3) if self.requests else 0.0,
+            "avg_handshake_ms": round(self.handshake_ms_total / self.new_connections, 1) if self.new_connections else 0.0,
+        }
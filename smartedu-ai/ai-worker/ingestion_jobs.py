@@ -0,0 +1,201 @@
+"""
+SmartEdu AI – Document Ingestion Jobs
+Queue of extract -> chunk -> embed -> index jobs, journaled to SQLite so they
+survive a worker restart.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ("queued", "running")
+
+# run_job(job, progress) -> result dict; progress(**fields) may be called from any thread
+JobRunner = Callable[[dict, Callable[..., None]], Awaitable[dict]]
+
+
+class IngestionJobManager:
+    """Bounded pool of ingestion workers backed by a SQLite journal.
+
+    Submitting returns immediately with a job id. Jobs that were queued or
+    running when the worker stopped are re-queued on the next start.
+    """
+
+    def __init__(
+        self,
+        run_job: JobRunner,
+        journal_path: Optional[str] = None,
+        workers: Optional[int] = None,
+        on_complete: Optional[Callable[[dict], None]] = None,
+    ):
+        self.run_job = run_job
+        self.on_complete = on_complete
+        self.journal_path = journal_path or os.getenv("INGESTION_JOURNAL_PATH", "./chroma_db/ingestion_jobs.sqlite3")
+        self.workers = workers or int(os.getenv("INGESTION_WORKERS", "2"))
+        os.makedirs(os.path.dirname(os.path.abspath(self.journal_path)), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.journal_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY,"
+            " doc_id TEXT NOT NULL,"
+            " course_id TEXT NOT NULL,"
+            " file_path TEXT NOT NULL,"
+            " status TEXT NOT NULL,"
+            " stage TEXT,"
+            " pages_done INTEGER DEFAULT 0,"
+            " pages_total INTEGER,"
+            " chunks_indexed INTEGER DEFAULT 0,"
+            " result TEXT,"
+            " error TEXT,"
+            " attempts INTEGER DEFAULT 0,"
+            " created_at REAL NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status)")
+        self._conn.commit()
+
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._tasks = []
+        # Versions of one document are indexed one at a time, in queue order
+        self._doc_locks: Dict[str, asyncio.Lock] = {}
+        self._doc_users: Dict[str, int] = {}
+
+    # ── Journal ──
+
+    def _row(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["job_id"] = job.pop("id")
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def _update(self, job_id: str, **fields):
+        fields["updated_at"] = time.time()
+        if "result" in fields and fields["result"] is not None:
+            fields["result"] = json.dumps(fields["result"])
+        assignments = ", ".join(f"{k} = ?" for k in fields)
+        with self._lock:
+            self._conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+            self._conn.commit()
+
+    # ── Lifecycle ──
+
+    async def start(self):
+        """Re-queue unfinished jobs from the journal and start the worker tasks."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id FROM jobs WHERE status IN (?, ?) ORDER BY created_at", ACTIVE_STATUSES
+            ).fetchall()
+        for row in rows:
+            self._update(row["id"], status="queued", stage="queued")
+            self._queue.put_nowait(row["id"])
+        if rows:
+            logger.info(f"♻️ Recovered {len(rows)} unfinished ingestion jobs from journal")
+        self._tasks = [asyncio.create_task(self._worker_loop(i)) for i in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        with self._lock:
+            self._conn.close()
+
+    def submit(self, doc_id: str, course_id: str, file_path: str) -> dict:
+        """Journal a new job and queue it; an active job for the same document is reused."""
+        with self._lock:
+            existing = self._conn.execute(
+                "SELECT id FROM jobs WHERE doc_id = ? AND file_path = ? AND status IN (?, ?)",
+                (str(doc_id), file_path, *ACTIVE_STATUSES),
+            ).fetchone()
+        if existing:
+            return self._row(existing["id"])
+
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, doc_id, course_id, file_path, status, stage, created_at, updated_at)"
+                " VALUES (?, ?, ?, ?, 'queued', 'queued', ?, ?)",
+                (job_id, str(doc_id), str(course_id), file_path, now, now),
+            )
+            self._conn.commit()
+        self._queue.put_nowait(job_id)
+        return self._row(job_id)
+
+    def get(self, job_id: str) -> Optional[dict]:
+        return self._row(job_id)
+
+    # ── Workers ──
+
+    async def _worker_loop(self, index: int):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Ingestion worker {index} crashed on job {job_id}: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job_id: str):
+        # Claim atomically; a job can sit in the queue twice after recovery
+        with self._lock:
+            claimed = self._conn.execute(
+                "UPDATE jobs SET status = 'running', stage = 'starting', attempts = attempts + 1, updated_at = ?"
+                " WHERE id = ? AND status = 'queued'",
+                (time.time(), job_id),
+            ).rowcount
+            self._conn.commit()
+        if not claimed:
+            return
+        job = self._row(job_id)
+
+        def progress(**fields):
+            self._update(job_id, **fields)
+
+        doc_id = job["doc_id"]
+        lock = self._doc_locks.setdefault(doc_id, asyncio.Lock())
+        self._doc_users[doc_id] = self._doc_users.get(doc_id, 0) + 1
+        try:
+            async with lock:
+                result = await self.run_job(job, progress)
+        except Exception as e:
+            logger.error(f"❌ Ingestion job {job_id} for document {job['doc_id']} failed: {e}")
+            self._update(job_id, status="failed", stage="failed", error=str(e))
+            return
+        finally:
+            self._doc_users[doc_id] -= 1
+            if not self._doc_users[doc_id]:
+                del self._doc_users[doc_id], self._doc_locks[doc_id]
+
+        self._update(job_id, status="completed", stage="done", result=result,
+                     chunks_indexed=result.get("chunks", 0))
+        logger.info(f"✅ Ingestion job {job_id} completed for document {job['doc_id']}")
+        if self.on_complete:
+            self.on_complete(self._row(job_id))
+
+    def stats(self) -> dict:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {
+            "workers": self.workers,
+            "queue_depth": self._queue.qsize(),
+            "jobs": {status: count for status, count in rows},
+        }
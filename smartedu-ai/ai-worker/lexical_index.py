@@ -0,0 +1,164 @@
+"""
+SmartEdu AI – Lexical (BM25) Index
+Per-course inverted index over the same chunks stored in Chroma, persisted to
+SQLite next to the vector store and updated as chunks are indexed or deleted.
+"""
+
+import logging
+import math
+import re
+import sqlite3
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Keep "CS101", "H2O" and "pH" whole; split on everything else
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were "
+    "will with what which who how why when where do does did can".split()
+)
+_SQL_BATCH = 500
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN_RE.findall(text.lower()) if t not in _STOPWORDS]
+
+
+class LexicalIndex:
+    """BM25 over course chunks.
+
+    Postings live in SQLite, so adding a chunk touches only its own rows and
+    the index survives restarts. Per-course corpus statistics (chunk count and
+    average length) are cached in memory and refreshed after writes. Safe to
+    use from the worker's executor threads.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            " chunk_id TEXT PRIMARY KEY,"
+            " course_id TEXT NOT NULL,"
+            " length INTEGER NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS postings ("
+            " course_id TEXT NOT NULL,"
+            " term TEXT NOT NULL,"
+            " chunk_id TEXT NOT NULL,"
+            " tf INTEGER NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_postings_term ON postings(course_id, term)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_postings_chunk ON postings(chunk_id)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_chunks_course ON chunks(course_id)")
+        self._conn.commit()
+        self._course_stats: Dict[str, Tuple[int, float]] = {}
+
+        self.queries = 0
+
+    def _delete_locked(self, chunk_ids: Sequence[str]):
+        for i in range(0, len(chunk_ids), _SQL_BATCH):
+            batch = list(chunk_ids[i:i + _SQL_BATCH])
+            placeholders = ",".join("?" * len(batch))
+            self._conn.execute(f"DELETE FROM postings WHERE chunk_id IN ({placeholders})", batch)
+            self._conn.execute(f"DELETE FROM chunks WHERE chunk_id IN ({placeholders})", batch)
+
+    def add(self, chunks: Iterable[Tuple[str, str, str]]):
+        """Index ``(chunk_id, course_id, text)`` triples, replacing existing ids."""
+        chunk_rows, posting_rows = [], []
+        for chunk_id, course_id, text in chunks:
+            terms = Counter(tokenize(text))
+            chunk_rows.append((chunk_id, str(course_id), sum(terms.values())))
+            posting_rows.extend((str(course_id), term, chunk_id, tf) for term, tf in terms.items())
+        if not chunk_rows:
+            return
+        with self._lock:
+            self._delete_locked([r[0] for r in chunk_rows])
+            self._conn.executemany("INSERT INTO chunks (chunk_id, course_id, length) VALUES (?, ?, ?)", chunk_rows)
+            self._conn.executemany(
+                "INSERT INTO postings (course_id, term, chunk_id, tf) VALUES (?, ?, ?, ?)", posting_rows
+            )
+            self._conn.commit()
+            for course_id in {r[1] for r in chunk_rows}:
+                self._course_stats.pop(course_id, None)
+
+    def delete(self, chunk_ids: Sequence[str]):
+        if not chunk_ids:
+            return
+        with self._lock:
+            self._delete_locked(chunk_ids)
+            self._conn.commit()
+            self._course_stats.clear()
+
+    def missing(self, chunk_ids: Sequence[str]) -> List[str]:
+        """The subset of ``chunk_ids`` that is not indexed yet."""
+        found = set()
+        with self._lock:
+            for i in range(0, len(chunk_ids), _SQL_BATCH):
+                batch = list(chunk_ids[i:i + _SQL_BATCH])
+                placeholders = ",".join("?" * len(batch))
+                found.update(r[0] for r in self._conn.execute(
+                    f"SELECT chunk_id FROM chunks WHERE chunk_id IN ({placeholders})", batch
+                ))
+        return [c for c in chunk_ids if c not in found]
+
+    def _stats_locked(self, course_id: str) -> Tuple[int, float]:
+        stats = self._course_stats.get(course_id)
+        if stats is None:
+            count, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(length), 0) FROM chunks WHERE course_id = ?", (course_id,)
+            ).fetchone()
+            stats = (count, total / count if count else 0.0)
+            self._course_stats[course_id] = stats
+        return stats
+
+    def course_size(self, course_id: str) -> int:
+        """Number of chunks indexed for a course."""
+        with self._lock:
+            return self._stats_locked(course_id)[0]
+
+    def search(self, course_id: str, query: str, k: int = 10) -> List[Tuple[str, float]]:
+        """Top ``k`` ``(chunk_id, bm25_score)`` for the query within a course."""
+        terms = sorted(set(tokenize(query)))
+        if not terms:
+            return []
+        course_id = str(course_id)
+        placeholders = ",".join("?" * len(terms))
+        with self._lock:
+            self.queries += 1
+            n_chunks, avg_length = self._stats_locked(course_id)
+            if not n_chunks:
+                return []
+            rows = self._conn.execute(
+                "SELECT p.term, p.chunk_id, p.tf, c.length FROM postings p"
+                " JOIN chunks c ON c.chunk_id = p.chunk_id"
+                f" WHERE p.course_id = ? AND p.term IN ({placeholders})",
+                (course_id, *terms),
+            ).fetchall()
+
+        doc_freq = Counter(term for term, _, _, _ in rows)
+        scores: Dict[str, float] = {}
+        for term, chunk_id, tf, length in rows:
+            df = doc_freq[term]
+            idf = math.log(1 + (n_chunks - df + 0.5) / (df + 0.5))
+            norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * length / avg_length)
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (BM25_K1 + 1) / norm
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+    def stats(self) -> dict:
+        with self._lock:
+            chunks, courses = self._conn.execute("SELECT COUNT(*), COUNT(DISTINCT course_id) FROM chunks").fetchone()
+        return {"path": self.path, "chunks": chunks, "courses": courses, "queries": self.queries}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
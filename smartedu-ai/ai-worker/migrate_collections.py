@@ -0,0 +1,85 @@
+"""
+Split the shared course_materials collection into one collection per course.
+
+Usage:
+    python migrate_collections.py [--persist-dir ./chroma_db] [--batch 1000] [--delete-source] [--dry-run]
+
+Copies ids, embeddings, documents and metadata unchanged (nothing is
+re-embedded), so it is safe to re-run: chunks are upserted by id. The source
+collection is kept unless --delete-source is given, and even then only after
+every course's shard holds at least as many chunks as were copied into it.
+Set VECTOR_SHARDING=course on the worker once the migration has finished.
+"""
+
+import argparse
+import os
+from collections import defaultdict
+
+import chromadb
+
+from collection_router import CollectionRouter
+from embedding_backends import get_embedding_backend
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--persist-dir", default="./chroma_db")
+    parser.add_argument("--batch", type=int, default=1000)
+    parser.add_argument("--delete-source", action="store_true")
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    backend = get_embedding_backend(os.getenv("GEMINI_API_KEY"))
+    client = chromadb.PersistentClient(path=args.persist_dir)
+    try:
+        source = client.get_collection(name=backend.collection_name)
+    except ValueError:
+        raise SystemExit(f"No collection {backend.collection_name!r} in {args.persist_dir}")
+    router = CollectionRouter(client, backend.collection_name, mode="course")
+
+    total = source.count()
+    print(f"📦 {backend.collection_name}: {total} chunks -> per-course collections"
+          f"{' (dry run)' if args.dry_run else ''}")
+
+    copied = defaultdict(int)
+    offset = 0
+    while True:
+        page = source.get(
+            include=["embeddings", "documents", "metadatas"], limit=args.batch, offset=offset
+        )
+        if not page["ids"]:
+            break
+        offset += len(page["ids"])
+        groups = defaultdict(list)
+        for position, metadata in enumerate(page["metadatas"]):
+            groups[str((metadata or {}).get("course_id", ""))].append(position)
+        for course_id, positions in groups.items():
+            copied[course_id] += len(positions)
+            if args.dry_run:
+                continue
+            router.for_course(course_id).upsert(
+                ids=[page["ids"][p] for p in positions],
+                embeddings=[page["embeddings"][p] for p in positions],
+                documents=[page["documents"][p] for p in positions],
+                metadatas=[page["metadatas"][p] for p in positions],
+            )
+        print(f"  … {offset}/{total}")
+
+    short = []
+    for course_id, count in sorted(copied.items()):
+        name = router.collection_name(course_id)
+        stored = 0 if args.dry_run else router.for_course(course_id).count()
+        print(f"  course {course_id or '<none>'}: {count} chunks -> {name}")
+        if not args.dry_run and stored < count:
+            short.append(course_id)
+
+    if short:
+        raise SystemExit(f"❌ Shards for courses {short} hold fewer chunks than were copied; source kept")
+    if args.delete_source and not args.dry_run:
+        client.delete_collection(name=backend.collection_name)
+        print(f"🗑️ Deleted source collection {backend.collection_name}")
+    print(f"✅ {sum(copied.values())} chunks across {len(copied)} courses")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""
+SmartEdu AI – Model Router
+Orders a model cascade by observed health (latency and success EWMAs) and
+short-circuits models whose circuit breaker is open.
+"""
+
+import logging
+import os
+import time
+from typing import Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class _ModelHealth:
+    """Rolling health and breaker state for one model."""
+
+    def __init__(self, latency_prior_ms: float):
+        self.latency_ms = latency_prior_ms
+        self.success_rate = 1.0
+        self.observed = False
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self.cooldown = 0.0
+        self.probe_started: Optional[float] = None
+
+        self.successes = 0
+        self.failures = 0
+        self.rate_limited = 0
+        self.short_circuited = 0
+        self.trips = 0
+
+
+class ModelRouter:
+    """Health-aware ordering and circuit breaking for a list of models.
+
+    Every attempt reports its outcome through ``record``. Latency (of
+    successful attempts) and success are tracked as exponentially weighted moving averages (``alpha``,
+    ROUTER_EWMA_ALPHA), and ``order`` ranks the usable models by expected
+    latency divided by success rate, keeping the configured order among
+    equals. A breaker opens after ``failure_threshold`` consecutive failures
+    (ROUTER_FAILURE_THRESHOLD) or at once on a 429, for ``open_seconds``
+    (ROUTER_OPEN_SECONDS, or the Retry-After the server sent), doubling up to
+    ``max_open_seconds`` while the model keeps failing. Once the cooldown has
+    passed a single probe request is let through (half-open); its outcome
+    closes or re-opens the breaker. Callers check ``acquire`` right before
+    each attempt, since a breaker may open while a cascade is running.
+    ``deadline_seconds`` (CHAT_DEADLINE_SECONDS) bounds a whole cascade
+    rather than each attempt.
+    """
+
+    def __init__(
+        self,
+        alpha: Optional[float] = None,
+        failure_threshold: Optional[int] = None,
+        open_seconds: Optional[float] = None,
+        max_open_seconds: Optional[float] = None,
+        latency_prior_ms: Optional[float] = None,
+        deadline_seconds: Optional[float] = None,
+    ):
+        self.alpha = alpha or float(os.getenv("ROUTER_EWMA_ALPHA", "0.3"))
+        self.failure_threshold = failure_threshold or int(os.getenv("ROUTER_FAILURE_THRESHOLD", "3"))
+        self.open_seconds = open_seconds or float(os.getenv("ROUTER_OPEN_SECONDS", "30"))
+        self.max_open_seconds = max_open_seconds or float(os.getenv("ROUTER_MAX_OPEN_SECONDS", "300"))
+        self.latency_prior_ms = latency_prior_ms or float(os.getenv("ROUTER_LATENCY_PRIOR_MS", "2000"))
+        self.deadline_seconds = deadline_seconds or float(os.getenv("CHAT_DEADLINE_SECONDS", "30"))
+        self._models: Dict[str, _ModelHealth] = {}
+
+        self.deadline_exceeded = 0
+
+    def _health(self, model: str) -> _ModelHealth:
+        health = self._models.get(model)
+        if health is None:
+            health = _ModelHealth(self.latency_prior_ms)
+            self._models[model] = health
+        return health
+
+    def _available(self, health: _ModelHealth, now: float) -> bool:
+        if health.state == CLOSED:
+            return True
+        if health.state == OPEN and now >= health.open_until:
+            health.state = HALF_OPEN
+            health.probe_started = None
+        # A probe that never reported back (e.g. its request was cancelled) expires with the deadline
+        return health.state == HALF_OPEN and (
+            health.probe_started is None or now - health.probe_started > self.deadline_seconds
+        )
+
+    def order(self, models: Sequence[str]) -> List[str]:
+        """Models whose breaker lets requests through, healthiest first."""
+        now = time.monotonic()
+        usable = []
+        for position, model in enumerate(models):
+            health = self._health(model)
+            if not self._available(health, now):
+                health.short_circuited += 1
+                continue
+            score = health.latency_ms / max(health.success_rate, 0.05)
+            usable.append((score, position, model))
+        usable.sort()
+        return [model for _, _, model in usable]
+
+    def acquire(self, model: str) -> bool:
+        """Whether an attempt on ``model`` may start now; takes the probe slot when half-open."""
+        health = self._health(model)
+        now = time.monotonic()
+        if not self._available(health, now):
+            health.short_circuited += 1
+            return False
+        if health.state == HALF_OPEN:
+            health.probe_started = now
+        return True
+
+    def release(self, model: str):
+        """End an attempt without a verdict, e.g. one cut short by the caller's
+        deadline rather than failed by the model; frees the half-open probe slot."""
+        health = self._health(model)
+        if health.state == HALF_OPEN:
+            health.probe_started = None
+
+    def _trip(self, model: str, health: _ModelHealth, seconds: float, reason: str):
+        # A failed probe doubles the previous cooldown
+        escalated = health.cooldown * 2 if health.state == HALF_OPEN else 0.0
+        health.cooldown = min(max(seconds, escalated), self.max_open_seconds)
+        health.state = OPEN
+        health.open_until = time.monotonic() + health.cooldown
+        health.probe_started = None
+        health.trips += 1
+        logger.warning(f"⛔ Circuit open for {model} for {health.cooldown:.1f}s ({reason})")
+
+    def record(
+        self,
+        model: str,
+        ok: bool,
+        latency_ms: float,
+        status_code: Optional[int] = None,
+        retry_after: Optional[float] = None,
+    ):
+        """Report one attempt's outcome."""
+        health = self._health(model)
+        # Fast failures (a 429 comes back at once) would make a failing model look quick
+        if ok and health.observed:
+            health.latency_ms += self.alpha * (latency_ms - health.latency_ms)
+        elif ok:
+            health.latency_ms = latency_ms
+            health.observed = True
+        health.success_rate += self.alpha * ((1.0 if ok else 0.0) - health.success_rate)
+
+        if ok:
+            health.successes += 1
+            health.consecutive_failures = 0
+            if health.state != CLOSED:
+                logger.info(f"✅ Circuit closed for {model}")
+            health.state = CLOSED
+            health.cooldown = 0.0
+            health.probe_started = None
+            return
+
+        health.failures += 1
+        health.consecutive_failures += 1
+        if status_code == 429:
+            health.rate_limited += 1
+            self._trip(model, health, retry_after or self.open_seconds, "rate limited")
+        elif health.state == HALF_OPEN:
+            self._trip(model, health, self.open_seconds, "probe failed")
+        elif health.consecutive_failures >= self.failure_threshold:
+            self._trip(model, health, self.open_seconds, f"{health.consecutive_failures} consecutive failures")
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        return {
+            "deadline_seconds": self.deadline_seconds,
+            "deadline_exceeded": self.deadline_exceeded,
+            "models": {
+                model: {
+                    "state": h.state,
+                    "latency_ewma_ms": round(h.latency_ms, 1),
+                    "success_rate": round(h.success_rate, 3),
+                    "consecutive_failures": h.consecutive_failures,
+                    "open_for_seconds": round(max(h.open_until - now, 0.0), 1) if h.state == OPEN else 0.0,
+                    "successes": h.successes,
+                    "failures": h.failures,
+                    "rate_limited": h.rate_limited,
+                    "short_circuited": h.short_circuited,
+                    "trips": h.trips,
+                }
+                for model, h in self._models.items()
+            },
+        }
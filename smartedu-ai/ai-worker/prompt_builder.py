@@ -0,0 +1,171 @@
+"""
+SmartEdu AI – Prompt Builder
+Assembles prompts from prioritized sections and fits them into a per-model
+token budget, trimming the least important sections first.
+"""
+
+import logging
+import os
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+from chunking import TokenCounter, default_counter
+from concurrency import parse_model_overrides
+
+logger = logging.getLogger(__name__)
+
+_TRUNCATION_MARK = " …[truncated]"
+
+
+class PromptSection(NamedTuple):
+    """One part of a prompt.
+
+    Sections with ``items`` (retrieved chunks, chat turns) shrink by dropping
+    whole items from the end given by ``drop_from`` and noting how many were
+    left out; plain text sections are cut to a token prefix. ``required``
+    sections are never trimmed. Lower ``priority`` is trimmed first.
+    """
+
+    name: str
+    text: str = ""
+    priority: int = 0
+    required: bool = False
+    header: str = ""
+    suffix: str = ""
+    items: Optional[Sequence[str]] = None
+    separator: str = "\n"
+    drop_from: str = "start"  # "start" drops the oldest items, "end" the lowest ranked
+    omitted_note: str = "[{count} earlier entries omitted]"
+    min_tokens: int = 0
+
+
+class BuiltPrompt(NamedTuple):
+    text: str
+    tokens: int
+    budget: int
+    section_tokens: Dict[str, int]
+    section_texts: Dict[str, str]
+    kept_items: Dict[str, List[str]]  # item sections -> the items that made it in
+    trimmed: List[str]
+
+
+class PromptBuilder:
+    """Fit prompt sections into the token budget of the model(s) they go to.
+
+    Budgets are input tokens per model from PROMPT_MODEL_BUDGETS
+    (``model=tokens,...``), falling back to PROMPT_TOKEN_BUDGET. When one
+    prompt may be sent to several models, the smallest budget applies. Every
+    build logs each section's token count.
+    """
+
+    def __init__(
+        self,
+        default_budget: Optional[int] = None,
+        model_budgets: Optional[Dict[str, int]] = None,
+        counter: Optional[TokenCounter] = None,
+    ):
+        self.default_budget = default_budget or int(os.getenv("PROMPT_TOKEN_BUDGET", "8000"))
+        self.model_budgets = model_budgets if model_budgets is not None else parse_model_overrides(
+            os.getenv("PROMPT_MODEL_BUDGETS", "")
+        )
+        self.counter = counter or default_counter()
+
+        self.builds = 0
+        self.over_budget = 0
+        self.tokens_built = 0
+        self.trimmed_sections: Dict[str, int] = {}
+
+    def budget_for(self, *models: str) -> int:
+        return min((self.model_budgets.get(m, self.default_budget) for m in models), default=self.default_budget)
+
+    def _render_items(self, section: PromptSection, items: Sequence[str], omitted: int) -> str:
+        kept = list(items)
+        if omitted:
+            note = section.omitted_note.format(count=omitted)
+            if section.drop_from == "start":
+                kept.insert(0, note)
+            else:
+                kept.append(note)
+        return section.header + section.separator.join(kept) + section.suffix if kept else ""
+
+    def _shrink(self, section: PromptSection, target: int):
+        """``(text, kept items)`` cut down to about ``target`` tokens."""
+        if section.items is not None:
+            items = list(section.items)
+            if section.drop_from == "start":
+                items.reverse()
+            # Per-item counts (plus the separator) avoid re-tokenizing the section for every drop
+            frame = self.counter.count(section.header + section.suffix + section.omitted_note)
+            costs = [self.counter.count(item + section.separator) for item in items]
+            kept = 0
+            used = frame
+            while kept < len(items) and used + costs[kept] <= target:
+                used += costs[kept]
+                kept += 1
+            items = items[:kept]
+            if section.drop_from == "start":
+                items.reverse()
+            if not items:
+                return "", []
+            return self._render_items(section, items, len(section.items) - len(items)), items
+        frame = self.counter.count(section.header + _TRUNCATION_MARK + section.suffix)
+        if target <= frame:
+            return "", None
+        body = self.counter.truncate(section.text, target - frame)
+        return section.header + body + _TRUNCATION_MARK + section.suffix, None
+
+    def build(self, sections: Sequence[PromptSection], models: Sequence[str], label: str) -> BuiltPrompt:
+        """Render ``sections`` in order, trimming by priority until they fit."""
+        budget = self.budget_for(*models)
+        texts: Dict[str, str] = {}
+        kept_items: Dict[str, List[str]] = {}
+        for section in sections:
+            if section.items is not None:
+                texts[section.name] = self._render_items(section, section.items, 0)
+                kept_items[section.name] = list(section.items)
+            else:
+                texts[section.name] = section.header + section.text + section.suffix if section.text else ""
+        tokens = {name: self.counter.count(text) for name, text in texts.items()}
+
+        trimmed: List[str] = []
+        overflow = sum(tokens.values()) - budget
+        for section in sorted((s for s in sections if not s.required), key=lambda s: s.priority):
+            if overflow <= 0:
+                break
+            if not tokens[section.name]:
+                continue
+            target = max(tokens[section.name] - overflow, section.min_tokens)
+            if target >= tokens[section.name]:
+                continue
+            text, items = self._shrink(section, target)
+            texts[section.name] = text
+            if items is not None:
+                kept_items[section.name] = items
+            overflow -= tokens[section.name] - self.counter.count(text)
+            tokens[section.name] = self.counter.count(text)
+            trimmed.append(section.name)
+
+        prompt = "".join(texts[s.name] for s in sections)
+        total = self.counter.count(prompt)
+        self.builds += 1
+        self.tokens_built += total
+        if total > budget:
+            self.over_budget += 1
+        for name in trimmed:
+            self.trimmed_sections[name] = self.trimmed_sections.get(name, 0) + 1
+        logger.info(
+            f"🧾 {label} prompt: {total}/{budget} tokens "
+            f"({', '.join(f'{name}={count}' for name, count in tokens.items())})"
+            + (f", trimmed {trimmed}" if trimmed else "")
+        )
+        return BuiltPrompt(prompt, total, budget, tokens, texts, kept_items, trimmed)
+
+    def stats(self) -> dict:
+        return {
+            "default_budget": self.default_budget,
+            "model_budgets": self.model_budgets,
+            "tokenizer": "tiktoken" if self.counter.exact else "estimated",
+            "builds": self.builds,
+            "avg_tokens": round(self.tokens_built / self.builds, 1) if self.builds else 0.0,
+            "over_budget": self.over_budget,
+            "trimmed_sections": self.trimmed_sections,
+        }
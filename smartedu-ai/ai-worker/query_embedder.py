@@ -0,0 +1,161 @@
+"""
+SmartEdu AI – Query Embedder
+LRU/TTL cache and micro-batching scheduler for chat query embeddings.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict, deque
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_WAIT_WINDOW = 2000
+
+
+def normalize_query(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+class QueryEmbedder:
+    """Embed chat queries with caching and request batching.
+
+    Queries are cached on their normalized text (case and whitespace folded)
+    in an LRU with a TTL. A miss is queued; the first miss in an empty queue
+    opens a ``window_ms`` window, and when it closes (or ``max_batch``
+    queries are waiting) the whole queue goes out as one ``embed_batch``
+    call whose vectors are handed back to each waiter. Concurrent misses for
+    the same normalized text share one slot in the batch.
+    """
+
+    def __init__(
+        self,
+        embed_batch: Callable[[List[str]], Awaitable[List[List[float]]]],
+        max_entries: Optional[int] = None,
+        ttl_seconds: Optional[float] = None,
+        window_ms: Optional[float] = None,
+        max_batch: Optional[int] = None,
+    ):
+        self.embed_batch = embed_batch
+        self.max_entries = max_entries or int(os.getenv("QUERY_EMBED_CACHE_SIZE", "2048"))
+        self.ttl_seconds = ttl_seconds or float(os.getenv("QUERY_EMBED_CACHE_TTL", "3600"))
+        self.window_ms = window_ms if window_ms is not None else float(os.getenv("QUERY_EMBED_BATCH_WINDOW_MS", "5"))
+        self.max_batch = max_batch or int(os.getenv("QUERY_EMBED_MAX_BATCH", "32"))
+        self._cache: "OrderedDict[str, Tuple[float, List[float]]]" = OrderedDict()
+        self._pending: Dict[str, Tuple[str, asyncio.Future, float]] = {}
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._waits_ms: deque = deque(maxlen=_WAIT_WINDOW)
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.batches = 0
+        self.batched_queries = 0
+        self.max_batch_seen = 0
+        self.batch_sizes: Dict[int, int] = {}
+        self.errors = 0
+
+    def _get_cached(self, key: str) -> Optional[List[float]]:
+        item = self._cache.get(key)
+        if item is None:
+            return None
+        stored_at, vector = item
+        if time.monotonic() - stored_at > self.ttl_seconds:
+            del self._cache[key]
+            return None
+        self._cache.move_to_end(key)
+        return vector
+
+    def _set_cached(self, key: str, vector: List[float]):
+        self._cache[key] = (time.monotonic(), vector)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+
+    async def embed(self, text: str) -> List[float]:
+        key = normalize_query(text)
+        vector = self._get_cached(key)
+        if vector is not None:
+            self.hits += 1
+            return vector
+
+        pending = self._pending.get(key)
+        if pending is not None:
+            self.coalesced += 1
+            return await asyncio.shield(pending[1])
+
+        self.misses += 1
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending[key] = (text, future, time.perf_counter())
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.window_ms / 1000, self._flush)
+        return await asyncio.shield(future)
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, {}
+        task = asyncio.ensure_future(self._run_batch(batch))
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+    async def _run_batch(self, batch: Dict[str, Tuple[str, asyncio.Future, float]]):
+        flushed_at = time.perf_counter()
+        size = len(batch)
+        self.batches += 1
+        self.batched_queries += size
+        self.max_batch_seen = max(self.max_batch_seen, size)
+        self.batch_sizes[size] = self.batch_sizes.get(size, 0) + 1
+        for _, _, queued_at in batch.values():
+            self._waits_ms.append((flushed_at - queued_at) * 1000)
+
+        keys = list(batch)
+        error: Optional[BaseException] = None
+        try:
+            vectors = await self.embed_batch([batch[k][0] for k in keys])
+            if len(vectors) != len(keys):
+                raise ValueError(f"embedding backend returned {len(vectors)} vectors for {len(keys)} queries")
+            for key, vector in zip(keys, vectors):
+                vector = list(vector)
+                self._set_cached(key, vector)
+                future = batch[key][1]
+                if not future.done():
+                    future.set_result(vector)
+        except Exception as e:
+            error = e
+            self.errors += 1
+            logger.warning(f"⚠️ Query embedding batch of {size} failed: {e}")
+        finally:
+            # No waiter may be left hanging, whatever went wrong (including cancellation)
+            for _, future, _ in batch.values():
+                if not future.done():
+                    future.set_exception(error or RuntimeError(f"Query embedding batch of {size} was cancelled"))
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses + self.coalesced
+        waits = list(self._waits_ms)
+        return {
+            "entries": len(self._cache),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "batches": self.batches,
+            "avg_batch_size": round(self.batched_queries / self.batches, 2) if self.batches else 0.0,
+            "max_batch_size": self.max_batch_seen,
+            "batch_sizes": dict(sorted(self.batch_sizes.items())),
+            "wait_ms_p50": round(float(np.percentile(waits, 50)), 2) if waits else None,
+            "wait_ms_p95": round(float(np.percentile(waits, 95)), 2) if waits else None,
+            "pending": len(self._pending),
+            "errors": self.errors,
+            "window_ms": self.window_ms,
+        }
@@ -0,0 +1,292 @@
+"""
+SmartEdu AI – Quiz Generation Cache
+Content-addressed cache for generated quizzes with singleflight request coalescing.
+"""
+
+import asyncio
+import copy
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from contextlib import aclosing
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def _norm(text: Optional[str]) -> str:
+    return " ".join((text or "").lower().split())
+
+
+def quiz_cache_key(req: Any) -> str:
+    """sha256 of the normalized request: same tenant, topic, difficulty, type and count."""
+    normalized = {
+        "tenant_id": str(getattr(req, "tenant_id", None) or ""),
+        "topic": _norm(req.topic),
+        "num_questions": int(req.num_questions),
+        "difficulty": _norm(req.difficulty),
+        "question_type": _norm(req.question_type),
+        "context": _norm(req.context),
+    }
+    digest = hashlib.sha256(json.dumps(normalized, sort_keys=True).encode("utf-8")).hexdigest()
+    return f"quiz:{digest}"
+
+
+class _StreamProgress:
+    """Items a streaming generation has produced so far, for followers to replay."""
+
+    def __init__(self):
+        self.items: List[Any] = []
+        self.changed = asyncio.Event()
+
+    def add(self, item: Any):
+        self.items.append(item)
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+
+class QuizResultCache:
+    """Two-tier cache (in-memory LRU, optional Redis) in front of quiz generation.
+
+    Identical requests that arrive while one is already generating wait on the
+    same future instead of spending tokens on their own upstream call. With
+    ``stream_or_generate`` they also receive each item as the in-flight
+    generation produces it.
+    """
+
+    def __init__(
+        self,
+        max_entries: Optional[int] = None,
+        ttl_seconds: Optional[int] = None,
+        redis_url: Optional[str] = None,
+    ):
+        self.max_entries = max_entries or int(os.getenv("QUIZ_CACHE_MAX_ENTRIES", "512"))
+        self.ttl_seconds = ttl_seconds or int(os.getenv("QUIZ_CACHE_TTL", "86400"))
+        self.redis_url = redis_url if redis_url is not None else (
+            os.getenv("REDIS_URL") if os.getenv("QUIZ_CACHE_REDIS", "false").lower() == "true" else None
+        )
+        self._local: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._progress: Dict[str, _StreamProgress] = {}
+        self._redis = None
+
+        self.hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.refreshes = 0
+        self.incomplete = 0
+        self.redis_errors = 0
+
+    async def start(self):
+        if not self.redis_url:
+            return
+        try:
+            import redis.asyncio as aioredis
+            self._redis = aioredis.from_url(self.redis_url)
+            await self._redis.ping()
+            logger.info("🗄️ Quiz cache Redis tier enabled")
+        except Exception as e:
+            logger.warning(f"⚠️ Quiz cache Redis tier unavailable, using memory only: {e}")
+            self._redis = None
+
+    async def close(self):
+        if self._redis is not None:
+            await self._redis.close()
+            self._redis = None
+
+    def _get_local(self, key: str) -> Optional[Any]:
+        item = self._local.get(key)
+        if item is None:
+            return None
+        stored_at, value = item
+        if time.monotonic() - stored_at > self.ttl_seconds:
+            del self._local[key]
+            return None
+        self._local.move_to_end(key)
+        return value
+
+    def _set_local(self, key: str, value: Any):
+        self._local[key] = (time.monotonic(), value)
+        self._local.move_to_end(key)
+        while len(self._local) > self.max_entries:
+            self._local.popitem(last=False)
+
+    async def _get_redis(self, key: str) -> Optional[Any]:
+        if self._redis is None:
+            return None
+        try:
+            raw = await self._redis.get(key)
+            return json.loads(raw) if raw else None
+        except Exception as e:
+            self.redis_errors += 1
+            logger.warning(f"⚠️ Quiz cache Redis read failed: {e}")
+            return None
+
+    async def _set_redis(self, key: str, value: Any):
+        if self._redis is None:
+            return
+        try:
+            await self._redis.set(key, json.dumps(value), ex=self.ttl_seconds)
+        except Exception as e:
+            self.redis_errors += 1
+            logger.warning(f"⚠️ Quiz cache Redis write failed: {e}")
+
+    async def _lookup(self, key: str) -> Optional[Any]:
+        """A copy of the cached result from either tier, or None."""
+        value = self._get_local(key)
+        if value is not None:
+            self.hits += 1
+            return copy.deepcopy(value)
+        value = await self._get_redis(key)
+        if value is not None:
+            self.redis_hits += 1
+            self._set_local(key, value)
+            return copy.deepcopy(value)
+        return None
+
+    async def get_or_generate(
+        self,
+        key: str,
+        generate: Callable[[], Awaitable[Optional[Any]]],
+        force_refresh: bool = False,
+        expected_size: Optional[int] = None,
+    ) -> Tuple[Optional[Any], str]:
+        """Return ``(result, status)`` where status is hit, miss, coalesced or refresh.
+
+        An empty result from ``generate`` (None or []) means generation failed
+        and is not cached; nor is one shorter than ``expected_size``, such as
+        a quiz whose stream was cut off or some of whose shards failed.
+        ``force_refresh`` skips cache reads but still joins an in-flight call.
+        """
+        value = None if force_refresh else await self._lookup(key)
+        if value is not None:
+            return value, "hit"
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            return copy.deepcopy(await asyncio.shield(task)), "coalesced"
+
+        if force_refresh:
+            self.refreshes += 1
+        else:
+            self.misses += 1
+        # Run generation as its own task so a disconnecting leader does not
+        # cancel the upstream call that coalesced followers are waiting on.
+        task = asyncio.ensure_future(self._generate_and_store(key, generate, expected_size))
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        self._inflight[key] = task
+        return copy.deepcopy(await asyncio.shield(task)), "refresh" if force_refresh else "miss"
+
+    async def stream_or_generate(
+        self,
+        key: str,
+        generate: Callable[[], AsyncIterator[Any]],
+        force_refresh: bool = False,
+        expected_size: Optional[int] = None,
+    ) -> Tuple[AsyncIterator[Any], str]:
+        """Streaming get_or_generate: ``(items, status)`` for a list-valued result.
+
+        ``items`` yields the cached list on a hit. Otherwise it follows the
+        in-flight generation for ``key`` (a streamed one item by item as they
+        arrive, a blocking one once it finishes) or starts ``generate``, whose
+        items are collected and cached as one list (if at least
+        ``expected_size`` long). Generation runs as its own
+        task, so closing ``items`` early does not stop it for anyone else.
+        """
+        value = None if force_refresh else await self._lookup(key)
+        if value is not None:
+            return self._replay(value), "hit"
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            return self._follow(task, self._progress.get(key)), "coalesced"
+
+        if force_refresh:
+            self.refreshes += 1
+        else:
+            self.misses += 1
+        progress = _StreamProgress()
+        task = asyncio.ensure_future(self._stream_and_store(key, generate, progress, expected_size))
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        self._inflight[key] = task
+        self._progress[key] = progress
+        return self._follow(task, progress), "refresh" if force_refresh else "miss"
+
+    @staticmethod
+    async def _replay(value: List[Any]) -> AsyncIterator[Any]:
+        for item in value:
+            yield item
+
+    @staticmethod
+    async def _follow(task: asyncio.Future, progress: Optional[_StreamProgress]) -> AsyncIterator[Any]:
+        if progress is None:
+            # Joined a blocking generation: nothing to show until it finishes
+            for item in copy.deepcopy(await asyncio.shield(task)) or []:
+                yield item
+            return
+        sent = 0
+        while True:
+            if sent < len(progress.items):
+                yield copy.deepcopy(progress.items[sent])
+                sent += 1
+            elif task.done():
+                task.result()  # re-raise a generation failure
+                return
+            else:
+                await progress.changed.wait()
+
+    async def _store(self, key: str, value: Optional[Any], expected_size: Optional[int]):
+        if not value:
+            return
+        if expected_size is not None and len(value) < expected_size:
+            # A short result is still returned, but a retry should get the chance to do better
+            self.incomplete += 1
+            logger.info(f"🗄️ Not caching incomplete quiz: {len(value)} of {expected_size} questions")
+            return
+        self._set_local(key, value)
+        await self._set_redis(key, value)
+
+    async def _stream_and_store(self, key: str, generate: Callable[[], AsyncIterator[Any]],
+                                progress: _StreamProgress, expected_size: Optional[int]) -> List[Any]:
+        try:
+            async with aclosing(generate()) as items:
+                async for item in items:
+                    progress.add(item)
+            value = list(progress.items)
+            await self._store(key, value, expected_size)
+            return value
+        finally:
+            self._inflight.pop(key, None)
+            self._progress.pop(key, None)
+            progress.changed.set()
+
+    async def _generate_and_store(self, key: str, generate: Callable[[], Awaitable[Optional[Any]]],
+                                  expected_size: Optional[int]) -> Optional[Any]:
+        try:
+            value = await generate()
+            await self._store(key, value, expected_size)
+            return value
+        finally:
+            self._inflight.pop(key, None)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.redis_hits + self.misses
+        return {
+            "entries": len(self._local),
+            "redis": self._redis is not None,
+            "hits": self.hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "refreshes": self.refreshes,
+            "incomplete_not_cached": self.incomplete,
+            "hit_rate": round((self.hits + self.redis_hits) / lookups, 3) if lookups else 0.0,
+            "in_flight": len(self._inflight),
+            "redis_errors": self.redis_errors,
+        }
@@ -0,0 +1,227 @@
+"""
+SmartEdu AI – Sharded Quiz Generation
+Splits large quiz requests into concurrent smaller generations, merges them and
+drops near-duplicate questions.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from contextlib import aclosing
+from typing import AsyncIterator, Awaitable, Callable, List, NamedTuple, Optional, Tuple
+
+from lexical_index import tokenize
+
+logger = logging.getLogger(__name__)
+
+# Each shard is steered to a different angle on the topic so shards overlap less
+SHARD_FOCUSES = (
+    "core definitions and key concepts",
+    "applications and worked examples",
+    "common misconceptions and pitfalls",
+    "comparisons and relationships between ideas",
+    "analysis, reasoning and problem solving",
+    "history, context and terminology",
+)
+
+GenerateShard = Callable[[int, Optional[str]], Awaitable[Optional[List[dict]]]]
+StreamShard = Callable[[int, Optional[str]], AsyncIterator[dict]]
+
+
+def plan_shards(num_questions: int, shard_size: int) -> List[int]:
+    """Question counts per shard, as even as possible and none above ``shard_size``."""
+    shards = max(-(-num_questions // shard_size), 1)
+    base, extra = divmod(num_questions, shards)
+    return [base + (1 if i < extra else 0) for i in range(shards)]
+
+
+def question_terms(question: dict) -> frozenset:
+    return frozenset(tokenize(str(question.get("question_text", ""))))
+
+
+class QuestionDeduper:
+    """Accepts questions one at a time, rejecting any whose text has Jaccard
+    term overlap >= ``threshold`` with one already accepted."""
+
+    def __init__(self, threshold: float):
+        self.threshold = threshold
+        self._seen: List[frozenset] = []
+        self.dropped = 0
+
+    def add(self, question: dict) -> bool:
+        terms = question_terms(question)
+        for other in self._seen:
+            if terms == other or (terms and other and len(terms & other) / len(terms | other) >= self.threshold):
+                self.dropped += 1
+                return False
+        self._seen.append(terms)
+        return True
+
+
+def dedupe_questions(questions: List[dict], threshold: float) -> Tuple[List[dict], int]:
+    """``questions`` without near-duplicates of earlier ones, and how many were dropped."""
+    deduper = QuestionDeduper(threshold)
+    kept = [q for q in questions if deduper.add(q)]
+    return kept, deduper.dropped
+
+
+class ShardReport(NamedTuple):
+    shards: int
+    failed: int
+    questions: int
+    duplicates: int
+    wall_seconds: float
+    shard_seconds: float  # sum over shards: what running them one after another would take
+
+    @property
+    def speedup(self) -> float:
+        return self.shard_seconds / self.wall_seconds if self.wall_seconds else 1.0
+
+
+class QuizSharder:
+    """Generate large quizzes as concurrent shards.
+
+    Requests for at least ``threshold`` questions (QUIZ_SHARD_THRESHOLD) are
+    split into shards of at most ``shard_size`` (QUIZ_SHARD_SIZE), each with
+    its own focus and part number. Shards run concurrently; the model call
+    inside each one still goes through the worker's ModelLimiter, so shards
+    queue behind the per-model concurrency cap rather than exceeding it. A
+    failed shard only loses its own questions. Merged questions are
+    deduplicated at ``dedupe_threshold`` (QUIZ_DEDUPE_THRESHOLD) term
+    overlap. Speedup is the summed shard time over the wall-clock time.
+    ``stream`` does the same for shards that yield questions as they are
+    parsed, passing each one on as soon as it arrives.
+    """
+
+    def __init__(
+        self,
+        shard_size: Optional[int] = None,
+        threshold: Optional[int] = None,
+        dedupe_threshold: Optional[float] = None,
+    ):
+        self.shard_size = shard_size or int(os.getenv("QUIZ_SHARD_SIZE", "10"))
+        self.threshold = threshold or int(os.getenv("QUIZ_SHARD_THRESHOLD", "20"))
+        self.dedupe_threshold = dedupe_threshold or float(os.getenv("QUIZ_DEDUPE_THRESHOLD", "0.8"))
+
+        self.runs = 0
+        self.shards = 0
+        self.failed_shards = 0
+        self.duplicates = 0
+        self.wall_seconds = 0.0
+        self.shard_seconds = 0.0
+        self.last_report: Optional[ShardReport] = None
+
+    def should_shard(self, num_questions: int) -> bool:
+        return num_questions >= self.threshold and num_questions > self.shard_size
+
+    async def generate(self, num_questions: int, generate_shard: GenerateShard) -> Tuple[Optional[List[dict]], ShardReport]:
+        """Run ``generate_shard(count, focus)`` for every shard and merge the results.
+
+        Returns None as the question list only if every shard failed.
+        """
+        counts = plan_shards(num_questions, self.shard_size)
+        total = len(counts)
+
+        async def run(index: int, count: int) -> Tuple[Optional[List[dict]], float]:
+            started = time.perf_counter()
+            try:
+                questions = await generate_shard(count, self._focus(index, total))
+            except Exception as e:
+                logger.warning(f"⚠️ Quiz shard {index + 1}/{total} failed: {e}")
+                questions = None
+            # Shards occasionally overshoot their count
+            return (questions[:count] if questions else None), time.perf_counter() - started
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(run(i, count) for i, count in enumerate(counts)))
+        wall = time.perf_counter() - started
+
+        merged: List[dict] = []
+        failed = 0
+        for questions, _ in results:
+            if questions is None:
+                failed += 1
+            else:
+                merged.extend(questions)
+        merged, duplicates = dedupe_questions(merged, self.dedupe_threshold)
+        report = ShardReport(total, failed, len(merged), duplicates, wall, sum(seconds for _, seconds in results))
+        self._record(num_questions, report)
+        return (merged or None), report
+
+    async def stream(self, num_questions: int, stream_shard: StreamShard) -> AsyncIterator[dict]:
+        """Run ``stream_shard(count, focus)`` for every shard concurrently,
+        yielding deduplicated questions in the order they complete."""
+        counts = plan_shards(num_questions, self.shard_size)
+        total = len(counts)
+        queue: asyncio.Queue = asyncio.Queue()
+        shard_done = object()
+        seconds = [0.0] * total
+        produced = [0] * total
+
+        async def run(index: int, count: int):
+            started = time.perf_counter()
+            try:
+                async with aclosing(stream_shard(count, self._focus(index, total))) as questions:
+                    async for question in questions:
+                        produced[index] += 1
+                        queue.put_nowait(question)
+                        # Shards occasionally overshoot their count
+                        if produced[index] >= count:
+                            break
+            except Exception as e:
+                logger.warning(f"⚠️ Quiz shard {index + 1}/{total} failed after {produced[index]} questions: {e}")
+            finally:
+                seconds[index] = time.perf_counter() - started
+                queue.put_nowait(shard_done)
+
+        deduper = QuestionDeduper(self.dedupe_threshold)
+        started = time.perf_counter()
+        tasks = [asyncio.ensure_future(run(i, count)) for i, count in enumerate(counts)]
+        kept = 0
+        try:
+            finished = 0
+            while finished < total:
+                item = await queue.get()
+                if item is shard_done:
+                    finished += 1
+                elif deduper.add(item):
+                    kept += 1
+                    yield item
+        finally:
+            for task in tasks:
+                task.cancel()
+        failed = sum(1 for count in produced if not count)
+        report = ShardReport(total, failed, kept, deduper.dropped, time.perf_counter() - started, sum(seconds))
+        self._record(num_questions, report)
+
+    @staticmethod
+    def _focus(index: int, total: int) -> str:
+        return f"part {index + 1} of {total}, focusing on {SHARD_FOCUSES[index % len(SHARD_FOCUSES)]}"
+
+    def _record(self, num_questions: int, report: ShardReport):
+        self.runs += 1
+        self.shards += report.shards
+        self.failed_shards += report.failed
+        self.duplicates += report.duplicates
+        self.wall_seconds += report.wall_seconds
+        self.shard_seconds += report.shard_seconds
+        self.last_report = report
+        logger.info(
+            f"🧩 Quiz of {num_questions} in {report.shards} shards: {report.questions} questions, "
+            f"{report.failed} shards failed, {report.duplicates} duplicates dropped, "
+            f"{report.wall_seconds:.1f}s wall ({report.speedup:.2f}x vs sequential)"
+        )
+
+    def stats(self) -> dict:
+        return {
+            "shard_size": self.shard_size,
+            "threshold": self.threshold,
+            "dedupe_threshold": self.dedupe_threshold,
+            "runs": self.runs,
+            "shards": self.shards,
+            "failed_shards": self.failed_shards,
+            "duplicates_dropped": self.duplicates,
+            "avg_speedup": round(self.shard_seconds / self.wall_seconds, 2) if self.wall_seconds else None,
+            "last_run": self.last_report._asdict() if self.last_report else None,
+        }
@@ -0,0 +1,123 @@
+"""
+SmartEdu AI – Streaming Quiz Parser
+Incremental JSON parsing of model output: each question object is returned as
+soon as its closing brace arrives, tolerating code fences, surrounding prose and
+a truncated tail.
+"""
+
+import json
+import logging
+import re
+from typing import AsyncIterable, AsyncIterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_STRUCTURAL_RE = re.compile(r'[{}\[\]"\\]')
+_STRING_RE = re.compile(r'["\\]')
+
+
+class QuizStreamParser:
+    """Pull question objects out of a JSON array as it is being generated.
+
+    Call ``feed`` with each piece of text; it returns the objects completed
+    by that piece. Only objects that are elements of an array are considered
+    (the top-level array, or one nested in a wrapper such as
+    ``{"questions": [...]}``), and only those carrying ``required_key`` are
+    returned. Text outside any JSON container (code fences, "Here is your
+    quiz:") is skipped. An object that fails to parse is dropped on its own
+    without affecting the rest; ``close`` reports an unfinished object at the
+    end as truncated.
+    """
+
+    def __init__(self, required_key: str = "question_text"):
+        self.required_key = required_key
+        self._buffer = ""
+        self._offset = 0  # absolute position of _buffer[0]
+        self._scanned = 0  # absolute position scanning resumes from
+        self._stack: List[Tuple[str, Optional[int]]] = []  # (opening char, start of an array element object)
+        self._in_string = False
+        self._skip: Optional[int] = None  # position of a character escaped by a backslash
+
+        self.emitted = 0
+        self.invalid = 0
+        self.skipped = 0
+        self.truncated = False
+
+    def feed(self, text: str) -> List[dict]:
+        self._buffer += text
+        found: List[dict] = []
+        end = self._offset + len(self._buffer)
+        pos = self._scanned
+        while pos < end:
+            pattern = _STRING_RE if self._in_string else _STRUCTURAL_RE
+            m = pattern.search(self._buffer, pos - self._offset)
+            if m is None:
+                break
+            at = self._offset + m.start()
+            pos = at + 1
+            char = m.group()
+            if at == self._skip:
+                continue
+            if self._in_string:
+                if char == "\\":
+                    self._skip = at + 1
+                else:
+                    self._in_string = False
+            elif char == '"':
+                # Quotes in prose outside any container are not JSON strings
+                self._in_string = bool(self._stack)
+            elif char in "{[":
+                start = at if char == "{" and self._stack and self._stack[-1][0] == "[" else None
+                self._stack.append((char, start))
+            elif char in "}]" and self._stack:
+                opening, start = self._stack.pop()
+                if char == "}" and start is not None and opening == "{":
+                    question = self._decode(self._buffer[start - self._offset:at + 1 - self._offset])
+                    if question is not None:
+                        found.append(question)
+        self._scanned = end
+
+        # Keep only text an unfinished element object still needs
+        starts = [start for _, start in self._stack if start is not None]
+        keep_from = min(starts) if starts else end
+        self._buffer = self._buffer[keep_from - self._offset:]
+        self._offset = keep_from
+        return found
+
+    def _decode(self, raw: str) -> Optional[dict]:
+        try:
+            value = json.loads(raw)
+        except ValueError:
+            self.invalid += 1
+            logger.warning(f"⚠️ Skipping malformed quiz object: {raw[:120]!r}")
+            return None
+        if not isinstance(value, dict) or self.required_key not in value:
+            self.skipped += 1
+            return None
+        self.emitted += 1
+        return value
+
+    def close(self):
+        """Finish the stream; an object left open is counted as truncated."""
+        self.truncated = any(start is not None for _, start in self._stack)
+        if self.truncated:
+            logger.warning(f"⚠️ Quiz output truncated after {self.emitted} complete questions")
+        self._buffer = ""
+        self._stack = []
+
+
+def parse_questions(text: str, required_key: str = "question_text") -> List[dict]:
+    """Every complete question object in a finished completion."""
+    parser = QuizStreamParser(required_key)
+    questions = parser.feed(text)
+    parser.close()
+    return questions
+
+
+async def iter_questions(chunks: AsyncIterable[str], required_key: str = "question_text") -> AsyncIterator[dict]:
+    """Yield question objects from a stream of text chunks as each one completes."""
+    parser = QuizStreamParser(required_key)
+    async for chunk in chunks:
+        for question in parser.feed(chunk):
+            yield question
+    parser.close()
@@ -0,0 +1,140 @@
+"""
+SmartEdu AI – Semantic Answer Cache
+Per-course cache of chat answers, matched on query-embedding cosine similarity.
+"""
+
+import hashlib
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class _CachedAnswer:
+    __slots__ = ("vector", "context", "question", "response", "sources", "created_at")
+
+    def __init__(self, vector: np.ndarray, context: str, question: str, response: str, sources: list):
+        self.vector = vector
+        self.context = context
+        self.question = question
+        self.response = response
+        self.sources = sources
+        self.created_at = time.monotonic()
+
+
+class SemanticAnswerCache:
+    """Reuse answers for paraphrased questions within the same course.
+
+    Entries are keyed by course and looked up by cosine similarity of the
+    (L2-normalized) query embedding. Each course keeps its own LRU with a TTL,
+    and a course is invalidated wholesale when its documents change. An
+    answer is only reused for the same extra prompt context (see
+    ``context_key``); callers skip the cache for follow-ups in a
+    conversation, whose meaning depends on the chat history.
+    """
+
+    def __init__(
+        self,
+        threshold: Optional[float] = None,
+        ttl_seconds: Optional[float] = None,
+        max_entries_per_course: Optional[int] = None,
+    ):
+        self.enabled = os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+        self.threshold = threshold or float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+        self.ttl_seconds = ttl_seconds or float(os.getenv("SEMANTIC_CACHE_TTL", "3600"))
+        self.max_entries = max_entries_per_course or int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "256"))
+        self._courses: Dict[str, "OrderedDict[str, _CachedAnswer]"] = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        # Best similarity seen on misses, bucketed by 0.05, to help tune the threshold
+        self.miss_similarity: Dict[str, int] = {}
+
+    @staticmethod
+    def context_key(context: Optional[str]) -> str:
+        """Fingerprint of prompt context other than the question and the course's documents."""
+        return hashlib.sha256(" ".join((context or "").split()).encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> Optional[np.ndarray]:
+        vec = np.asarray(embedding, dtype=np.float32)
+        norm = float(np.linalg.norm(vec))
+        return vec / norm if norm > 0 else None
+
+    def _prune(self, entries: "OrderedDict[str, _CachedAnswer]"):
+        cutoff = time.monotonic() - self.ttl_seconds
+        for key in [k for k, e in entries.items() if e.created_at < cutoff]:
+            del entries[key]
+            self.evictions += 1
+
+    def lookup(self, course_id: str, embedding: List[float], context: str = "") -> Optional[dict]:
+        """Return ``{"response", "sources", "similarity"}`` for a close enough
+        hit stored with the same ``context`` key."""
+        if not self.enabled:
+            return None
+        vec = self._normalize(embedding)
+        entries = self._courses.get(str(course_id))
+        if entries:
+            self._prune(entries)
+        keys = [k for k, e in entries.items() if e.context == context] if entries else []
+        if vec is None or not keys:
+            self.misses += 1
+            return None
+
+        matrix = np.stack([entries[k].vector for k in keys])
+        scores = matrix @ vec
+        best = int(np.argmax(scores))
+        similarity = float(scores[best])
+
+        if similarity < self.threshold:
+            self.misses += 1
+            bucket = f"{np.floor(similarity * 20) / 20:.2f}"
+            self.miss_similarity[bucket] = self.miss_similarity.get(bucket, 0) + 1
+            return None
+
+        entries.move_to_end(keys[best])
+        self.hits += 1
+        entry = entries[keys[best]]
+        return {"response": entry.response, "sources": entry.sources, "similarity": round(similarity, 4)}
+
+    def store(self, course_id: str, embedding: List[float], question: str, response: str, sources: list,
+              context: str = ""):
+        if not self.enabled:
+            return
+        vec = self._normalize(embedding)
+        if vec is None:
+            return
+        entries = self._courses.setdefault(str(course_id), OrderedDict())
+        entries[uuid.uuid4().hex] = _CachedAnswer(vec, context, question, response, sources)
+        while len(entries) > self.max_entries:
+            entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, course_id: str):
+        """Drop every cached answer for a course (its documents changed)."""
+        if self._courses.pop(str(course_id), None) is not None:
+            self.invalidations += 1
+            logger.info(f"🧹 Semantic cache invalidated for course {course_id}")
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "threshold": self.threshold,
+            "courses": len(self._courses),
+            "entries": sum(len(e) for e in self._courses.values()),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "miss_best_similarity": dict(sorted(self.miss_similarity.items())),
+        }
@@ -7,11 +7,26 @@ import asyncio
 import json
 import os
 import logging
+import time
+from contextlib import aclosing
+from typing import Optional, List, Dict, Any, AsyncIterator, Tuple
 import httpx
-from typing import Optional, List, Dict, Any
 from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from document_processor import DocumentProcessor
+from embedding_backends import HashingEmbeddingBackend
+from concurrency import ModelLimiter
+from http_pool import GeminiHTTPPool
+from model_router import ModelRouter
+from hedging import RequestHedger
+from semantic_cache import SemanticAnswerCache
+from query_embedder import QueryEmbedder
+from prompt_builder import PromptBuilder, PromptSection
+from quiz_cache import QuizResultCache, quiz_cache_key
+from quiz_sharding import QuizSharder
+from quiz_stream import iter_questions, parse_questions
+from ingestion_jobs import IngestionJobManager
 
 # Configure logging
 logging.basicConfig(
@@ -30,6 +45,9 @@ class QuizGenerationRequest(BaseModel):
     difficulty: str = "medium"
     question_type: str = "mcq"
     context: str = ""
+    tenant_id: Optional[str] = None
+    force_refresh: bool = False  # Skip cached results and generate fresh questions
+    stream: bool = False  # Server-sent events, one per question as it is parsed
 
 class CourseInitRequest(BaseModel):
     title: str
@@ -44,17 +62,75 @@ class ChatRequest(BaseModel):
     course_id: Optional[str] = None
     course_context: str = ""
     chat_history: Optional[List[Dict[str, str]]] = None
+    stream: bool = False
 
 class ProcessDocumentRequest(BaseModel):
     doc_id: str
     course_id: str
     file_path: str
 
+class SearchRequest(BaseModel):
+    course_id: str
+    query: str
+    n_results: int = 4
+    budget_ms: Optional[float] = None
+    token_budget: Optional[int] = None  # Defaults to CONTEXT_TOKEN_BUDGET
+
+class ReconcileRequest(BaseModel):
+    live_doc_ids: List[str]
+    snapshot_at: float  # epoch seconds when live_doc_ids was read
+    compact: bool = False
+
 class EmbeddingRequest(BaseModel):
     texts: List[str]
 
 # ── Worker Logic ──
 
+CHAT_SYSTEM_INSTRUCTION = (
+    "You are SmartEdu AI, an intelligent learning assistant. "
+    "Help students understand course material by explaining concepts clearly. "
+    "Use the provided course context when available. "
+    "Be encouraging and educational."
+)
+
+CHAT_MODELS = ["gemini-2.0-flash", "gemini-2.5-flash", "gemini-2.5-pro"]
+QUIZ_MODELS = ["gemini-2.0-flash", "gpt-4-turbo-preview"]
+COURSE_INIT_MODELS = ["gemini-1.5-flash"]
+CHAT_FALLBACK_MODELS = ["gpt-4-turbo-preview"]
+
+
+def _candidate_text(data: dict) -> str:
+    """Concatenate the text parts of the first candidate in a Gemini response."""
+    candidates = data.get("candidates") or []
+    if not candidates:
+        return ""
+    parts = candidates[0].get("content", {}).get("parts", [])
+    return "".join(p.get("text", "") for p in parts)
+
+
+def _usage_tokens(usage: Optional[dict]) -> dict:
+    """Map Gemini usageMetadata onto our tokens_used/input/output fields."""
+    usage = usage or {}
+    return {
+        "tokens_used": usage.get("totalTokenCount", 0),
+        "input_tokens": usage.get("promptTokenCount", 0),
+        "output_tokens": usage.get("candidatesTokenCount", 0),
+    }
+
+
+def _retry_after(resp) -> Optional[float]:
+    """Seconds from a Retry-After header, when the server sent one in that form."""
+    try:
+        return float(resp.headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def _is_model_failure(status: int) -> bool:
+    """Statuses that say the model, rather than the request, is unhealthy."""
+    return status in (404, 429) or status >= 500
+
+
 class AIWorker:
     """AI Worker for asynchronous AI processing tasks."""
 
@@ -65,22 +141,36 @@ class AIWorker:
         self.gemini_client = None
         self.openai_client = None
         self.doc_processor = None
+        self.query_embedder: Optional[QueryEmbedder] = None
+        self.ingestion: Optional[IngestionJobManager] = None
+        self.limiter = ModelLimiter()
+        self.http_pool: Optional[GeminiHTTPPool] = None
+        self.answer_cache = SemanticAnswerCache()
+        self.quiz_cache = QuizResultCache()
+        self.quiz_sharder = QuizSharder()
+        self.local_embeddings = HashingEmbeddingBackend()
+        self.prompts = PromptBuilder()
+        self.router = ModelRouter()
+        self.hedger = RequestHedger()
 
     async def initialize(self):
         """Initialize the AI clients."""
         import sys
-        print(f"DEBUG: Initializing AI Worker with verified gemini_key (len: {len(self.gemini_key)})...", flush=True)
+        print(f"DEBUG: Initializing AI Worker with verified gemini_key (len: {len(self.gemini_key or '')})...", flush=True)
         if self.gemini_key:
             try:
                 from google import genai
                 # genai.Client() automatically picks up GEMINI_API_KEY if not provided,
                 # but we'll be explicit using self.gemini_key.
                 self.gemini_client = genai.Client(api_key=self.gemini_key)
-                self.doc_processor = DocumentProcessor(api_key=self.gemini_key)
-                print("✅ Gemini client and DocumentProcessor initialized successfully", flush=True)
+                print("✅ Gemini client initialized successfully", flush=True)
             except Exception as e:
                 print(f"❌ Failed to initialize Gemini: {e}", flush=True)
 
+            # Shared keep-alive client for the REST path used by chat
+            self.http_pool = GeminiHTTPPool(api_key=self.gemini_key)
+            await self.http_pool.start()
+
         if self.openai_key:
             try:
                 from openai import AsyncOpenAI
@@ -92,35 +182,192 @@ class AIWorker:
         if not self.gemini_client and not self.openai_client:
             print("🔧 AI Worker running in mock mode (no API key)", flush=True)
 
-    async def generate_quiz_questions(self, req: QuizGenerationRequest) -> list[dict]:
-        """Generate quiz questions using AI."""
-        prompt = (
-            "You are an expert educator creating quiz questions. "
-            f"Generate exactly {req.num_questions} {req.difficulty} difficulty {req.question_type} questions about: {req.topic}. "
-            "Return valid JSON array of objects. Each object MUST have: "
-            "'question_text' (string), 'options' (array of 4 strings for MCQ), "
-            "'correct_answer' (string, must be one of the options), 'explanation' (string), 'difficulty' (string). "
-            f"Context: {req.context}\n\n"
-            "Return ONLY the JSON array."
+        # Retrieval works without an API key too, using the local embedding backend
+        try:
+            self.doc_processor = DocumentProcessor(api_key=self.gemini_key)
+            print(f"✅ DocumentProcessor initialized ({self.doc_processor.backend.name} embeddings)", flush=True)
+            # Concurrent chat queries share one batched embedding call
+            backend = self.doc_processor.backend
+            self.query_embedder = QueryEmbedder(
+                embed_batch=lambda texts: self.limiter.run(backend.model, backend.embed, texts, "RETRIEVAL_QUERY")
+            )
+        except Exception as e:
+            print(f"❌ Failed to initialize DocumentProcessor: {e}", flush=True)
+
+        await self.quiz_cache.start()
+
+        if self.doc_processor:
+            self.ingestion = IngestionJobManager(
+                run_job=self._run_ingestion_job,
+                on_complete=self._on_ingestion_complete,
+            )
+            await self.ingestion.start()
+
+    async def _run_ingestion_job(self, job: dict, progress) -> dict:
+        """Extraction and indexing are blocking; keep them off the event loop."""
+        return await self.limiter.run(
+            "document-processing",
+            self.doc_processor.process_document,
+            doc_id=job["doc_id"],
+            course_id=job["course_id"],
+            file_path=job["file_path"],
+            progress=progress,
+        )
+
+    async def delete_document(self, doc_id: str) -> dict:
+        report = await self.limiter.run("chroma", self.doc_processor.delete_document, doc_id)
+        for course_id in report["course_ids"]:
+            self.answer_cache.invalidate(course_id)
+        return report
+
+    async def reconcile_index(self, req: ReconcileRequest) -> dict:
+        """Purge chunks of documents the backend no longer has, optionally compacting after."""
+        report = await self.limiter.run(
+            "chroma",
+            self.doc_processor.reconcile,
+            req.live_doc_ids,
+            req.snapshot_at,
+            float(os.getenv("VECTOR_GC_GRACE_SECONDS", "300")),
+        )
+        for course_id in report["course_ids"]:
+            self.answer_cache.invalidate(course_id)
+        if req.compact:
+            report["compaction"] = await self.limiter.run("chroma", self.doc_processor.compact)
+        return report
+
+    def _on_ingestion_complete(self, job: dict):
+        # Cached answers may cite stale or missing material now
+        self.answer_cache.invalidate(job["course_id"])
+
+    async def generate_quiz_questions(self, req: QuizGenerationRequest) -> Tuple[list[dict], str]:
+        """Generate quiz questions, served from the quiz cache when possible.
+
+        Returns the questions and the cache status (hit, miss, coalesced, refresh).
+        """
+        questions, status = await self.quiz_cache.get_or_generate(
+            quiz_cache_key(req),
+            lambda: self._generate_quiz_live(req),
+            force_refresh=req.force_refresh,
+            expected_size=req.num_questions,
         )
+        if not questions:
+            return self._mock_questions(req.topic, req.num_questions, req.difficulty, req.question_type), status
+        return questions, status
+
+    async def stream_quiz_questions(self, req: QuizGenerationRequest) -> AsyncIterator[dict]:
+        """Streaming variant of generate_quiz_questions.
+
+        Yields ``{"type": "question", "index": i, "question": {...}}`` as each
+        question object completes in the model output, then one
+        ``{"type": "done", "count": n, "cache": status}`` event. Complete
+        questions are cached like generate_quiz_questions results, and an
+        identical request arriving meanwhile follows this generation instead
+        of starting its own.
+        """
+        def generate() -> AsyncIterator[dict]:
+            if self.quiz_sharder.should_shard(req.num_questions):
+                return self.quiz_sharder.stream(
+                    req.num_questions, lambda count, focus: self._stream_quiz_batch(req, count, focus)
+                )
+            return self._stream_quiz_batch(req, req.num_questions)
+
+        source, status = await self.quiz_cache.stream_or_generate(
+            quiz_cache_key(req), generate, req.force_refresh, expected_size=req.num_questions
+        )
+        questions = []
+        async with aclosing(source) as items:
+            async for question in items:
+                yield {"type": "question", "index": len(questions), "question": question}
+                questions.append(question)
+        if not questions:
+            status = "mock"
+            questions = self._mock_questions(req.topic, req.num_questions, req.difficulty, req.question_type)
+            for index, question in enumerate(questions):
+                yield {"type": "question", "index": index, "question": question}
+        yield {"type": "done", "count": len(questions), "cache": status}
+
+    async def _stream_quiz_batch(self, req: QuizGenerationRequest, count: int,
+                                 focus: Optional[str] = None) -> AsyncIterator[dict]:
+        """Questions from one streamed generation, each as soon as it parses.
+
+        Falls back to the blocking providers if streaming fails before the
+        first question; a failure after that keeps what already arrived.
+        """
+        emitted = 0
+        if self.http_pool:
+            model = QUIZ_MODELS[0]
+            payload = {"contents": [{"parts": [{"text": self._quiz_prompt(req, count, focus)}]}]}
+
+            async def text_chunks():
+                async with self.limiter.slot(model):
+                    async for chunk in self.http_pool.stream(model, payload):
+                        text = _candidate_text(chunk)
+                        if text:
+                            yield text
+
+            try:
+                # Closing the chunk generator releases the model slot and the HTTP stream on early exit
+                async with aclosing(text_chunks()) as chunks:
+                    async for question in iter_questions(chunks):
+                        emitted += 1
+                        yield question
+                        if emitted >= count:
+                            return
+            except Exception as e:
+                print(f"⚠️ Quiz stream {model} error after {emitted} questions: {e}", flush=True)
+            if emitted:
+                return
+        for question in await self._generate_quiz_batch(req, count, focus) or []:
+            yield question
+
+    async def _generate_quiz_live(self, req: QuizGenerationRequest) -> Optional[list[dict]]:
+        """Generate quiz questions using AI (None if every provider failed).
+
+        Large quizzes are generated as concurrent shards (see QuizSharder).
+        """
+        if self.quiz_sharder.should_shard(req.num_questions):
+            questions, _ = await self.quiz_sharder.generate(
+                req.num_questions, lambda count, focus: self._generate_quiz_batch(req, count, focus)
+            )
+            return questions
+        return await self._generate_quiz_batch(req, req.num_questions)
+
+    def _quiz_prompt(self, req: QuizGenerationRequest, count: int, focus: Optional[str] = None) -> str:
+        return self.prompts.build([
+            PromptSection("instructions", (
+                "You are an expert educator creating quiz questions. "
+                f"Generate exactly {count} {req.difficulty} difficulty {req.question_type} questions about: {req.topic}. "
+                "Return valid JSON array of objects. Each object MUST have: "
+                "'question_text' (string), 'options' (array of 4 strings for MCQ), "
+                "'correct_answer' (string, must be one of the options), 'explanation' (string), 'difficulty' (string). "
+            ), required=True),
+            PromptSection("focus", focus or "", header="This is ", suffix=" of a larger quiz; avoid generic questions other parts would also ask. ", required=True),
+            PromptSection("context", req.context, header="Context: ", suffix="\n\n", priority=10),
+            PromptSection("format", "Return ONLY the JSON array.", required=True),
+        ], QUIZ_MODELS, "quiz").text
+
+    async def _generate_quiz_batch(self, req: QuizGenerationRequest, count: int,
+                                   focus: Optional[str] = None) -> Optional[list[dict]]:
+        """One generation call for ``count`` questions, optionally steered to a ``focus``."""
+        prompt = self._quiz_prompt(req, count, focus)
 
         if self.gemini_client:
             try:
                 # Using gemini-2.0-flash as requested by user
-                response = self.gemini_client.models.generate_content(
+                response = await self.limiter.run(
+                    "gemini-2.0-flash",
+                    self.gemini_client.models.generate_content,
                     model="gemini-2.0-flash",
                     contents=prompt
                 )
                 text = response.text
                 print(f"DEBUG: Gemini Response text length: {len(text)}", flush=True)
-                
-                if "```json" in text:
-                    text = text.split("```json")[1].split("```")[0].strip()
-                elif "```" in text:
-                    text = text.split("```")[1].split("```")[0].strip()
-                
-                data = json.loads(text)
-                return data if isinstance(data, list) else data.get("questions", [])
+
+                # Parsed object by object, so one malformed question does not discard the rest
+                questions = parse_questions(text)
+                if questions:
+                    return questions
+                print("⚠️ Gemini Quiz response contained no complete questions", flush=True)
             except Exception as e:
                 import traceback
                 print(f"❌ Gemini Quiz generation failed: {e}", flush=True)
@@ -138,27 +385,32 @@ class AIWorker:
                     response_format={"type": "json_object"},
                     max_tokens=4096,
                 )
-                content = response.choices[0].message.content
-                data = json.loads(content)
-                return data.get("questions", data if isinstance(data, list) else [])
+                questions = parse_questions(response.choices[0].message.content)
+                if questions:
+                    return questions
             except Exception as e:
                 logger.error(f"OpenAI Quiz generation failed: {e}")
 
-        return self._mock_questions(req.topic, req.num_questions, req.difficulty, req.question_type)
+        return None
 
     async def initialize_course_content(self, req: CourseInitRequest) -> dict:
         """Generate course description and modules using AI."""
-        prompt = (
-            "You are a premium curriculum designer for an elite university. "
-            f"For the course titled '{req.title}', generate a compelling and professional description (3-4 sentences) "
-            "and a list of 5 key learning modules with short summaries for each. "
-            "Return valid JSON with keys: 'description' (string) and 'modules' (list of strings). "
-            "Return ONLY the JSON object."
-        )
+        prompt = self.prompts.build([
+            PromptSection("role", "You are a premium curriculum designer for an elite university. ", required=True),
+            PromptSection("title", req.title, header="For the course titled '", suffix="', ", priority=10),
+            PromptSection("instructions", (
+                "generate a compelling and professional description (3-4 sentences) "
+                "and a list of 5 key learning modules with short summaries for each. "
+                "Return valid JSON with keys: 'description' (string) and 'modules' (list of strings). "
+                "Return ONLY the JSON object."
+            ), required=True),
+        ], COURSE_INIT_MODELS, "course-init").text
 
         if self.gemini_client:
             try:
-                response = self.gemini_client.models.generate_content(
+                response = await self.limiter.run(
+                    "gemini-1.5-flash",
+                    self.gemini_client.models.generate_content,
                     model="gemini-1.5-flash",
                     contents=prompt
                 )
@@ -190,7 +442,9 @@ class AIWorker:
 
         if self.gemini_client:
             try:
-                response = self.gemini_client.models.generate_content(
+                response = await self.limiter.run(
+                    "gemini-1.5-flash",
+                    self.gemini_client.models.generate_content,
                     model="gemini-1.5-flash",
                     contents=prompt
                 )
@@ -211,102 +465,310 @@ class AIWorker:
             ]
         }
 
-    async def chat_with_context(self, req: ChatRequest) -> dict:
-        """AI chat with RAG context from course materials."""
-        system_instr = (
-            "You are SmartEdu AI, an intelligent learning assistant. "
-            "Help students understand course material by explaining concepts clearly. "
-            "Use the provided course context when available. "
-            "Be encouraging and educational."
-        )
-
-        full_prompt = f"{system_instr}\n\n"
-        
+    async def _embed_query(self, text: str) -> Optional[List[float]]:
+        """Embed a chat question for retrieval (None if embeddings are unavailable)."""
+        if not self.query_embedder:
+            return None
+        try:
+            return await self.query_embedder.embed(text)
+        except Exception as e:
+            print(f"⚠️ Query embedding failed: {e}", flush=True)
+            return None
+
+    async def _build_chat_prompt(self, req: ChatRequest, query_vec: Optional[List[float]]) -> Tuple[str, list]:
+        """Assemble the chat prompt (with RAG context) within the chat models' token budget,
+        and the sources it cites."""
         # RAG Context Retrieval
-        sources = []
-        if req.course_id and self.doc_processor:
+        chunks = []
+        if req.course_id and self.doc_processor and query_vec is not None:
             try:
-                # Retrieve top chunks with metadata
-                results = self.doc_processor.collection.query(
-                    query_embeddings=[self.client.models.embed_content(
-                        model="text-embedding-004",
-                        contents=[req.message],
-                        config=types.EmbedContentConfig(task_type="RETRIEVAL_QUERY")
-                    ).embeddings[0].values],
-                    where={"course_id": str(req.course_id)},
-                    n_results=4
+                # Hybrid vector + BM25 retrieval, diversified and packed into the
+                # context token budget (Chroma and SQLite are blocking too)
+                retrieval = await self.limiter.run(
+                    "chroma",
+                    self.doc_processor.retrieve,
+                    req.course_id,
+                    req.message,
+                    n_results=4,
+                    query_embedding=query_vec,
                 )
-                
-                if results["documents"][0]:
-                    rag_context = "\n---\n".join(results["documents"][0])
-                    full_prompt += f"Retrieved Knowledge from Course Materials:\n{rag_context}\n\n"
-                    
-                    # Extract sources
-                    for meta in results["metadatas"][0]:
-                        sources.append({
-                            "doc_id": meta.get("doc_id"),
-                            "index": meta.get("chunk_index")
-                        })
-                    
-                    print(f"DEBUG: RAG context added ({len(results['documents'][0])} chunks) for course {req.course_id}", flush=True)
+                chunks = retrieval["chunks"]
+                if chunks:
+                    print(
+                        f"DEBUG: RAG context retrieved ({len(chunks)} chunks) for course {req.course_id} "
+                        f"timings={retrieval['timings']} degraded={retrieval['degraded']} "
+                        f"selection={retrieval['selection']}",
+                        flush=True,
+                    )
             except Exception as e:
                 print(f"⚠️ RAG search failed: {e}", flush=True)
 
-        if req.course_context:
-            full_prompt += f"General Course Context:\n{req.course_context}\n\n"
-        
-        if req.chat_history:
-            full_prompt += "Recent Chat History:\n"
-            for m in req.chat_history[-5:]:
-                full_prompt += f"{m['role'].capitalize()}: {m['content']}\n"
-        
-        full_prompt += f"\nUser Question: {req.message}\n\nPlease provide a clear, helpful response based on the context above."
-
-        # Try direct REST API (v1beta) as it proved more reliable
-        if self.gemini_key:
-            try:
-                print(f"DEBUG: Using Gemini Key: {self.gemini_key[:10]}...", flush=True)
-                async with httpx.AsyncClient() as client:
-                    # Try gemini-pro and gemini-1.5-flash
-                    for model in ["gemini-2.0-flash", "gemini-2.5-flash", "gemini-2.5-pro"]:
-                        url = f"https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent?key={self.gemini_key}"
-                        payload = {
-                            "contents": [{"parts": [{"text": full_prompt}]}]
-                        }
-                        try:
-                            print(f"DEBUG: Trying REST API for {model}...", flush=True)
-                            resp = await client.post(url, json=payload, timeout=30.0)
-                            
-                            if resp.status_code == 200:
-                                data = resp.json()
-                                # Check for valid candidates
-                                if "candidates" in data and data["candidates"]:
-                                    content = data["candidates"][0]["content"]["parts"][0]["text"]
-                                    print(f"✅ REST API SUCCESS with {model}", flush=True)
-                                    return {
-                                        "response": content,
-                                        "tokens_used": 0,  # Could parse usageMetadata if needed
-                                        "sources": sources
-                                    }
-                                else:
-                                    print(f"⚠️ REST API {model} empty/blocked: {data}", flush=True)
-                            else:
-                                print(f"⚠️ REST API {model} failed: {resp.status_code} {resp.text}", flush=True)
-                        except Exception as e:
-                            print(f"⚠️ REST API {model} error: {e}", flush=True)
+        history = [f"{m['role'].capitalize()}: {m['content']}" for m in (req.chat_history or [])[-5:]]
+        prompt = self.prompts.build([
+            PromptSection("system", CHAT_SYSTEM_INSTRUCTION, required=True, suffix="\n\n"),
+            PromptSection(
+                "rag_context", header="Retrieved Knowledge from Course Materials:\n", suffix="\n\n",
+                items=[chunk["text"] for chunk in chunks], separator="\n---\n", drop_from="end",
+                omitted_note="[{count} lower-ranked passages omitted]", priority=30,
+            ),
+            PromptSection("course_context", req.course_context, header="General Course Context:\n", suffix="\n\n", priority=10),
+            PromptSection(
+                "chat_history", header="Recent Chat History:\n", suffix="\n", items=history,
+                omitted_note="[{count} earlier messages omitted]", priority=20,
+            ),
+            PromptSection(
+                "question",
+                f"\nUser Question: {req.message}\n\nPlease provide a clear, helpful response based on the context above.",
+                required=True,
+            ),
+        ], CHAT_MODELS, "chat")
+
+        # Cite only the passages that made it into the prompt
+        sources = []
+        for chunk in chunks[:len(prompt.kept_items["rag_context"])]:
+            meta = chunk["metadata"]
+            sources.append({
+                "doc_id": meta.get("doc_id"),
+                "index": meta.get("chunk_index"),
+                "page_start": meta.get("page_start"),
+                "page_end": meta.get("page_end"),
+            })
+        return prompt.text, sources
+
+    async def _cached_answer(self, req: ChatRequest) -> Tuple[Optional[List[float]], Optional[dict]]:
+        """Embed the question once and consult the course's semantic cache.
+
+        Follow-ups ("explain that again") depend on the chat history, so only
+        the first message of a conversation is looked up.
+        """
+        if not req.course_id:
+            return None, None
+        query_vec = await self._embed_query(req.message)
+        if query_vec is None or req.chat_history:
+            return query_vec, None
+        cached = self.answer_cache.lookup(req.course_id, query_vec, self.answer_cache.context_key(req.course_context))
+        if cached:
+            print(f"✅ Semantic cache hit for course {req.course_id} (sim={cached['similarity']})", flush=True)
+        return query_vec, cached
+
+    def _remember_answer(self, req: ChatRequest, query_vec: Optional[List[float]], response: str, sources: list):
+        if req.course_id and query_vec is not None and response and not req.chat_history:
+            self.answer_cache.store(req.course_id, query_vec, req.message, response, sources,
+                                    self.answer_cache.context_key(req.course_context))
+
+    async def _generate_once(self, model: str, payload: dict, deadline: float) -> Optional[dict]:
+        """One generateContent attempt bounded by the cascade ``deadline``.
+
+        Reports the outcome to the router and returns the response body on
+        HTTP 200, None on any failure.
+        """
+        remaining = deadline - time.monotonic()
+        model_timeout = self.http_pool.timeout_for(model)
+        started = time.perf_counter()
+        status = None
+        retry_after = None
+        try:
+            print(f"DEBUG: Trying REST API for {model}...", flush=True)
+            timeout = min(model_timeout, remaining)
+            resp = await asyncio.wait_for(
+                self.limiter.call(model, lambda: self.http_pool.post(model, "generateContent", payload, timeout=timeout)),
+                remaining,
+            )
+            status = resp.status_code
+            if status == 200:
+                data = resp.json()
+            else:
+                retry_after = _retry_after(resp)
+                print(f"⚠️ REST API {model} failed: {status} {resp.text}", flush=True)
+                data = None
+        except (asyncio.TimeoutError, httpx.TimeoutException) as e:
+            if isinstance(e, asyncio.TimeoutError) or remaining < model_timeout:
+                # Cut short by the cascade deadline, not the model's own timeout: says nothing about its health
+                print(f"⏱️ REST API {model} ran into the chat deadline after {remaining:.1f}s", flush=True)
+                self.router.release(model)
+                return None
+            print(f"⚠️ REST API {model} timed out after {model_timeout:.1f}s", flush=True)
+            data = None
+        except Exception as e:
+            print(f"⚠️ REST API {model} error: {e}", flush=True)
+            data = None
+        ok = status is not None and not _is_model_failure(status)
+        self.router.record(model, ok, (time.perf_counter() - started) * 1000, status, retry_after)
+        return data
 
-            except Exception as e:
-                print(f"❌ REST API Main Block failed: {e}", flush=True)
+    async def chat_with_context(self, req: ChatRequest) -> dict:
+        """AI chat with RAG context from course materials."""
+        query_vec, cached = await self._cached_answer(req)
+        if cached:
+            return {
+                "response": cached["response"],
+                "tokens_used": 0,
+                "model": "semantic-cache",
+                "sources": cached["sources"],
+                "cached": True,
+            }
+
+        full_prompt, sources = await self._build_chat_prompt(req, query_vec)
 
-        # Fallback to OpenAI if configured
+        # Try direct REST API (v1beta) as it proved more reliable
+        if self.http_pool:
+            payload = {
+                "contents": [{"parts": [{"text": full_prompt}]}]
+            }
+            deadline = time.monotonic() + self.router.deadline_seconds
+            order = self.router.order(CHAT_MODELS)
+            tried = set()
+
+            def pick_alternate() -> Optional[str]:
+                # A hedge goes to the next healthy model not yet tried
+                for candidate in order:
+                    if candidate not in tried and self.router.acquire(candidate):
+                        tried.add(candidate)
+                        return candidate
+                return None
+
+            for model in order:
+                if model in tried:
+                    continue
+                if time.monotonic() >= deadline:
+                    self.router.deadline_exceeded += 1
+                    print(f"⏱️ Chat deadline of {self.router.deadline_seconds}s exceeded, falling back", flush=True)
+                    break
+                if not self.router.acquire(model):
+                    continue
+                tried.add(model)
+                model, data = await self.hedger.run(
+                    model,
+                    lambda m: self._generate_once(m, payload, deadline),
+                    pick_alternate,
+                    deadline - time.monotonic(),
+                )
+                if data is None:
+                    continue
+                # Check for valid candidates
+                if "candidates" in data and data["candidates"]:
+                    content = data["candidates"][0]["content"]["parts"][0]["text"]
+                    print(f"✅ REST API SUCCESS with {model}", flush=True)
+                    self._remember_answer(req, query_vec, content, sources)
+                    return {
+                        "response": content,
+                        **_usage_tokens(data.get("usageMetadata")),
+                        "model": model,
+                        "sources": sources
+                    }
+                print(f"⚠️ REST API {model} empty/blocked: {data}", flush=True)
+
+        return await self._chat_fallback(req)
+
+    async def stream_chat(self, req: ChatRequest) -> AsyncIterator[dict]:
+        """Streaming variant of chat_with_context.
+
+        Yields ``{"type": "token", "text": ...}`` events as the model produces
+        them, then a single ``{"type": "done", ...}`` event carrying sources and
+        usage. A model is only skipped if it fails before its first token.
+        """
+        query_vec, cached = await self._cached_answer(req)
+        if cached:
+            yield {"type": "token", "text": cached["response"]}
+            yield {"type": "done", "model": "semantic-cache", "sources": cached["sources"], "cached": True,
+                   **_usage_tokens(None)}
+            return
+
+        full_prompt, sources = await self._build_chat_prompt(req, query_vec)
+
+        if self.http_pool:
+            payload = {
+                "contents": [{"parts": [{"text": full_prompt}]}]
+            }
+            deadline = time.monotonic() + self.router.deadline_seconds
+            for model in self.router.order(CHAT_MODELS):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.router.deadline_exceeded += 1
+                    print(f"⏱️ Chat deadline of {self.router.deadline_seconds}s exceeded, falling back", flush=True)
+                    break
+                if not self.router.acquire(model):
+                    continue
+                emitted = False
+                usage = None
+                parts = []
+                started = time.perf_counter()
+                model_timeout = self.http_pool.timeout_for(model)
+                # Only getting a connection is held to the deadline; gaps between chunks get the model's full timeout
+                stream_timeout = httpx.Timeout(
+                    model_timeout, connect=min(model_timeout, remaining), pool=min(model_timeout, remaining)
+                )
+                try:
+                    print(f"DEBUG: Streaming REST API for {model}...", flush=True)
+                    # The deadline bounds time to first token; once text flows the stream runs to completion
+                    async with asyncio.timeout(remaining) as first_token:
+                        async with self.limiter.slot(model):
+                            async for chunk in self.http_pool.stream(model, payload, timeout=stream_timeout):
+                                usage = chunk.get("usageMetadata", usage)
+                                text = _candidate_text(chunk)
+                                if text:
+                                    if not emitted:
+                                        first_token.reschedule(None)
+                                        self.router.record(model, True, (time.perf_counter() - started) * 1000)
+                                    emitted = True
+                                    parts.append(text)
+                                    yield {"type": "token", "text": text}
+                    if emitted:
+                        print(f"✅ REST stream SUCCESS with {model}", flush=True)
+                        self._remember_answer(req, query_vec, "".join(parts), sources)
+                        yield {"type": "done", "model": model, "sources": sources, **_usage_tokens(usage)}
+                        return
+                    self.router.record(model, True, (time.perf_counter() - started) * 1000)
+                    print(f"⚠️ REST stream {model} returned no text", flush=True)
+                except Exception as e:
+                    if emitted:
+                        print(f"⚠️ REST stream {model} error: {e}", flush=True)
+                        yield {"type": "error", "detail": "Generation interrupted"}
+                        return
+                    if isinstance(e, TimeoutError) or (
+                        isinstance(e, (httpx.ConnectTimeout, httpx.PoolTimeout)) and remaining < model_timeout
+                    ):
+                        # The chat deadline ran out before the first token; no verdict on the model
+                        self.router.release(model)
+                        print(f"⏱️ REST stream {model} ran into the chat deadline before its first token", flush=True)
+                        continue
+                    status = None
+                    retry_after = None
+                    if isinstance(e, httpx.HTTPStatusError):
+                        status = e.response.status_code
+                        retry_after = _retry_after(e.response)
+                    ok = status is not None and not _is_model_failure(status)
+                    self.router.record(model, ok, (time.perf_counter() - started) * 1000, status, retry_after)
+                    print(f"⚠️ REST stream {model} error: {e}", flush=True)
+
+        result = await self._chat_fallback(req)
+        yield {"type": "token", "text": result["response"]}
+        yield {
+            "type": "done",
+            "model": result.get("model", "mock"),
+            "sources": result.get("sources", sources),
+            "tokens_used": result.get("tokens_used", 0),
+            "input_tokens": result.get("input_tokens", 0),
+            "output_tokens": result.get("output_tokens", 0),
+        }
 
+    async def _chat_fallback(self, req: ChatRequest) -> dict:
+        """OpenAI (if configured) or the canned mock reply."""
         if self.openai_client:
             try:
-                messages = [{"role": "system", "content": system_instr}]
-                if req.course_context:
-                    messages.append({"role": "system", "content": f"Context: {req.course_context}"})
-                if req.chat_history:
-                    messages.extend(req.chat_history[-10:])
+                history = (req.chat_history or [])[-10:]
+                prompt = self.prompts.build([
+                    PromptSection("system", CHAT_SYSTEM_INSTRUCTION, required=True),
+                    PromptSection("course_context", req.course_context, header="Context: ", priority=10),
+                    PromptSection("chat_history", items=[m["content"] for m in history], priority=20, omitted_note=""),
+                    PromptSection("question", req.message, required=True),
+                ], CHAT_FALLBACK_MODELS, "chat-fallback")
+                messages = [{"role": "system", "content": CHAT_SYSTEM_INSTRUCTION}]
+                if prompt.section_texts["course_context"]:
+                    messages.append({"role": "system", "content": prompt.section_texts["course_context"]})
+                kept = len(prompt.kept_items["chat_history"])
+                if kept:
+                    messages.extend(history[-kept:])
                 messages.append({"role": "user", "content": req.message})
 
                 response = await self.openai_client.chat.completions.create(
@@ -320,6 +782,7 @@ class AIWorker:
                     "tokens_used": usage.total_tokens if usage else 0,
                     "input_tokens": usage.prompt_tokens if usage else 0,
                     "output_tokens": usage.completion_tokens if usage else 0,
+                    "model": "gpt-4-turbo-preview",
                 }
             except Exception as e:
                 print(f"OpenAI Chat failed: {e}", flush=True)
@@ -327,20 +790,16 @@ class AIWorker:
         return self._mock_chat_response(req.message)
 
     async def generate_embeddings(self, texts: List[str]) -> List[List[float]]:
-        """Generate text embeddings using Gemini."""
-        if self.gemini_client:
+        """Generate text embeddings with the configured backend (Gemini or local)."""
+        if self.doc_processor:
+            backend = self.doc_processor.backend
             try:
-                result = self.gemini_client.models.embed_content(
-                    model="text-embedding-004",
-                    contents=texts
-                )
-                # google-genai returns result.embeddings list of objects
-                return [e.values for e in result.embeddings]
+                return await self.limiter.run(backend.model, backend.embed, texts, "RETRIEVAL_DOCUMENT")
             except Exception as e:
-                print(f"❌ Gemini Embedding failed: {e}", flush=True)
+                print(f"❌ {backend.name} embedding failed: {e}", flush=True)
 
-        # Fallback to zeros (or OpenAI if available, but keep it simple for now)
-        return [[0.0] * 768 for _ in texts]
+        # Local hashing vectors still carry lexical signal, unlike all-zero vectors
+        return await self.limiter.run("local-embedding", self.local_embeddings.embed, texts, "RETRIEVAL_DOCUMENT")
 
     def _mock_questions(self, topic: str, num: int, difficulty: str, qtype: str) -> list[dict]:
         return [{"question_text": f"MOCK: Concept in {topic}?", "difficulty": difficulty, "explanation": "Mock.", "options": ["A", "B", "C", "D"], "correct_answer": "A"}]
@@ -377,6 +836,19 @@ async def startup_event():
     )
     await _worker.initialize()
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    if _worker:
+        if _worker.http_pool:
+            await _worker.http_pool.close()
+        await _worker.quiz_cache.close()
+        if _worker.ingestion:
+            await _worker.ingestion.stop()
+        if _worker.doc_processor:
+            _worker.doc_processor.extractor.shutdown()
+            _worker.doc_processor.exact.close()
+        _worker.limiter.shutdown()
+
 # ── Routes ──
 
 @app.get("/health")
@@ -390,12 +862,39 @@ async def debug():
         "gemini_key_length": len(_worker.gemini_key) if _worker.gemini_key else 0,
         "gemini_client_status": "initialized" if _worker.gemini_client else "none",
         "openai_client_status": "initialized" if _worker.openai_client else "none",
+        "concurrency": _worker.limiter.stats(),
+        "http_pool": _worker.http_pool.stats() if _worker.http_pool else None,
+        "semantic_cache": _worker.answer_cache.stats(),
+        "quiz_cache": _worker.quiz_cache.stats(),
+        "quiz_sharding": _worker.quiz_sharder.stats(),
+        "embedding_backend": {
+            "name": _worker.doc_processor.backend.name,
+            "model": _worker.doc_processor.backend.model,
+            "collection": _worker.doc_processor.backend.collection_name,
+        } if _worker.doc_processor else None,
+        "embedding_cache": _worker.doc_processor.embedding_cache.stats() if _worker.doc_processor else None,
+        "query_embeddings": _worker.query_embedder.stats() if _worker.query_embedder else None,
+        "ingestion": _worker.ingestion.stats() if _worker.ingestion else None,
+        "pdf_extraction": _worker.doc_processor.extractor.stats() if _worker.doc_processor else None,
+        "retrieval": _worker.doc_processor.retrieval_stats() if _worker.doc_processor else None,
+        "context_selection": _worker.doc_processor.selector.stats() if _worker.doc_processor else None,
+        "prompts": _worker.prompts.stats(),
+        "model_router": _worker.router.stats(),
+        "hedging": _worker.hedger.stats(),
+        "vector_collections": _worker.doc_processor.collections.stats() if _worker.doc_processor else None,
+        "exact_search": _worker.doc_processor.exact.stats() if _worker.doc_processor else None,
     }
 
 @app.post("/generate-quiz")
 async def generate_quiz(req: QuizGenerationRequest):
-    questions = await _worker.generate_quiz_questions(req)
-    return {"questions": questions}
+    if req.stream:
+        return StreamingResponse(
+            _sse(_worker.stream_quiz_questions(req)),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+    questions, cache_status = await _worker.generate_quiz_questions(req)
+    return {"questions": questions, "cache": cache_status}
 
 @app.post("/initialize-course")
 async def initialize_course(req: CourseInitRequest):
@@ -407,26 +906,61 @@ async def suggestions(req: SuggestionRequest):
     data = await _worker.get_personalized_suggestions(req)
     return data
 
+async def _sse(events: AsyncIterator[dict]):
+    async for event in events:
+        yield f"data: {json.dumps(event)}\n\n"
+
 @app.post("/chat")
 async def chat(req: ChatRequest):
+    if req.stream:
+        return StreamingResponse(
+            _sse(_worker.stream_chat(req)),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
     return await _worker.chat_with_context(req)
 
-@app.post("/process-document")
+@app.post("/process-document", status_code=202)
 async def process_document(req: ProcessDocumentRequest):
+    """Queue a document for ingestion; poll /jobs/{job_id} for progress."""
+    if not _worker or not _worker.ingestion:
+        raise HTTPException(status_code=500, detail="Document processor not initialized")
+
+    job = _worker.ingestion.submit(doc_id=req.doc_id, course_id=req.course_id, file_path=req.file_path)
+    return {"status": job["status"], "job_id": job["job_id"]}
+
+@app.post("/search")
+async def search(req: SearchRequest):
+    """Hybrid retrieval over a course's chunks, with per-stage timings."""
     if not _worker or not _worker.doc_processor:
         raise HTTPException(status_code=500, detail="Document processor not initialized")
-    
-    try:
-        # We could run this in background if files are large
-        num_chunks = _worker.doc_processor.process_document(
-            doc_id=req.doc_id,
-            course_id=req.course_id,
-            file_path=req.file_path
-        )
-        return {"status": "success", "chunks": num_chunks}
-    except Exception as e:
-        logger.error(f"Failed to process document: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+    query_vec = await _worker._embed_query(req.query)
+    return await _worker.limiter.run(
+        "chroma", _worker.doc_processor.retrieve, req.course_id, req.query,
+        n_results=req.n_results, query_embedding=query_vec, budget_ms=req.budget_ms,
+        token_budget=req.token_budget,
+    )
+
+@app.delete("/documents/{doc_id}")
+async def delete_document(doc_id: str):
+    """Drop a deleted document's chunks from the vector index."""
+    if not _worker or not _worker.doc_processor:
+        raise HTTPException(status_code=500, detail="Document processor not initialized")
+    return await _worker.delete_document(doc_id)
+
+@app.post("/documents/reconcile")
+async def reconcile_documents(req: ReconcileRequest):
+    """Garbage-collect chunks whose document id is not in the backend's live set."""
+    if not _worker or not _worker.doc_processor:
+        raise HTTPException(status_code=500, detail="Document processor not initialized")
+    return await _worker.reconcile_index(req)
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    job = _worker.ingestion.get(job_id) if _worker and _worker.ingestion else None
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
 
 if __name__ == "__main__":
     import uvicorn
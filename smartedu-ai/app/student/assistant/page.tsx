@@ -11,6 +11,7 @@ export default function AssistantPage() {
     const [messages, setMessages] = useState<Message[]>([]);
     const [input, setInput] = useState('');
     const [loading, setLoading] = useState(false);
+    const [streaming, setStreaming] = useState(false);
     const [initializing, setInitializing] = useState(true);
     const messagesEndRef = useRef<HTMLDivElement>(null);
 
@@ -75,30 +76,76 @@ export default function AssistantPage() {
                 },
                 body: JSON.stringify({
                     message: input,
-                    course_id: null // TODO: Support selecting a course
+                    course_id: null, // TODO: Support selecting a course
+                    stream: true
                 }),
             });
 
-            const data = await res.json();
-
-            if (!res.ok) {
+            if (!res.ok || !res.body) {
+                const data = await res.json().catch(() => ({}));
                 throw new Error(data.detail || 'Failed to get response from AI');
             }
 
-            setMessages((prev: Message[]) => [
-                ...prev,
-                {
-                    role: 'assistant',
-                    content: data.response,
-                    sources: data.sources
+            // Read server-sent events and grow the assistant bubble token by token
+            const reader = res.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+            let started = false;
+
+            const appendToken = (text: string) => {
+                if (!started) {
+                    started = true;
+                    setStreaming(true);
+                    setMessages((prev: Message[]) => [...prev, { role: 'assistant', content: text }]);
+                    return;
+                }
+                setMessages((prev: Message[]) => {
+                    const next = [...prev];
+                    const last = next[next.length - 1];
+                    next[next.length - 1] = { ...last, content: last.content + text };
+                    return next;
+                });
+            };
+
+            while (true) {
+                const { value, done } = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, { stream: true });
+                const events = buffer.split('\n\n');
+                buffer = events.pop() || '';
+                for (const raw of events) {
+                    const line = raw.trim();
+                    if (!line.startsWith('data:')) continue;
+                    let event;
+                    try {
+                        event = JSON.parse(line.slice(5));
+                    } catch {
+                        console.warn('Skipping malformed chat event', line);
+                        continue;
+                    }
+                    if (event.type === 'token') {
+                        appendToken(event.text);
+                    } else if (event.type === 'error') {
+                        const detail = event.detail || 'Generation interrupted';
+                        toast.error(detail);
+                        // Keep any partial answer, but mark where it stopped
+                        appendToken(started ? `\n\n(${detail})` : detail);
+                    } else if (event.type === 'done' && event.sources) {
+                        setMessages((prev: Message[]) => {
+                            const next = [...prev];
+                            next[next.length - 1] = { ...next[next.length - 1], sources: event.sources } as Message;
+                            return next;
+                        });
+                    }
                 }
-            ]);
+            }
         } catch (error: any) {
             console.error('Chat failed', error);
             toast.error(error.message || 'Connection error');
             setMessages((prev: Message[]) => [...prev, { role: 'assistant', content: "I'm sorry, I'm having trouble connecting to my brain right now. Please check your connection and try again." }]);
         } finally {
             setLoading(false);
+            setStreaming(false);
         }
     };
 
@@ -156,7 +203,7 @@ export default function AssistantPage() {
                             )}
                         </div>
                     ))}
-                    {loading && (
+                    {loading && !streaming && (
                         <div className="chat-bubble assistant">
                             <div className="bot-ai-tag">
                                 <div className="ai-dot" />
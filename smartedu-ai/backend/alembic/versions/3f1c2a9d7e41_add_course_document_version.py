@@ -0,0 +1,26 @@
+"""Add course_documents.version
+
+Revision ID: 3f1c2a9d7e41
+Revises: 00856cadb0be
+Create Date: 2026-10-17 10:12:04.118532
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f1c2a9d7e41'
+down_revision: Union[str, None] = '00856cadb0be'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('course_documents', sa.Column('version', sa.Integer(), nullable=True, server_default='0'))
+
+
+def downgrade() -> None:
+    op.drop_column('course_documents', 'version')
@@ -0,0 +1,28 @@
+"""Add course_documents.ingestion_job_id and replaced_file_path
+
+Revision ID: 8b6e0d4c2f17
+Revises: 3f1c2a9d7e41
+Create Date: 2026-10-17 19:40:52.307114
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8b6e0d4c2f17'
+down_revision: Union[str, None] = '3f1c2a9d7e41'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('course_documents', sa.Column('ingestion_job_id', sa.String(length=64), nullable=True))
+    op.add_column('course_documents', sa.Column('replaced_file_path', sa.String(length=500), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('course_documents', 'replaced_file_path')
+    op.drop_column('course_documents', 'ingestion_job_id')
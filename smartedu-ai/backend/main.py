@@ -7,6 +7,7 @@ from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 import time
+import asyncio
 import logging
 
 from config import settings
@@ -19,7 +20,7 @@ from routes.courses import router as courses_router
 from routes.quizzes import router as quizzes_router
 from routes.ai import router as ai_router
 from routes.analytics import router as analytics_router
-from routes.documents import router as documents_router
+from routes.documents import router as documents_router, run_vector_index_gc, resume_document_jobs
 from routes.suggestions import router as suggestions_router
 from routes.admin import router as admin_router
 
@@ -37,7 +38,20 @@ async def lifespan(app: FastAPI):
             logger.info("✅ Database tables created successfully (dev mode)")
         except Exception as e:
             logger.error(f"❌ Failed to create database tables: {e}", exc_info=True)
+
+    # Periodically purge vectors of deleted documents from the AI worker's index
+    gc_task = asyncio.create_task(run_vector_index_gc()) if settings.VECTOR_GC_INTERVAL_SECONDS > 0 else None
+    # Ingestion jobs outlive a backend restart in the worker's journal; keep waiting on them
+    try:
+        job_tasks = await resume_document_jobs()
+    except Exception as e:
+        logger.error(f"❌ Failed to resume document ingestion jobs: {e}")
+        job_tasks = []
     yield
+    if gc_task:
+        gc_task.cancel()
+    for task in job_tasks:
+        task.cancel()
     logger.info("👋 Shutting down SmartEdu AI Backend")
 
 
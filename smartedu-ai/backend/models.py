@@ -151,6 +151,9 @@ class CourseDocument(Base):
     file_size = Column(Integer, nullable=False)
     is_processed = Column(Boolean, default=False)
     chunk_count = Column(Integer, default=0)
+    version = Column(Integer, default=0)  # index version reported by the AI worker
+    ingestion_job_id = Column(String(64), nullable=True)  # AI worker job indexing the current file
+    replaced_file_path = Column(String(500), nullable=True)  # previous upload, deleted once that job ends
     uploaded_at = Column(DateTime, default=datetime.utcnow)
 
     course = relationship("Course", back_populates="documents")
@@ -2,13 +2,16 @@
 SmartEdu AI – AI Chat API Routes
 """
 
+import json
 import httpx
 import logging
+import anyio
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 
-from database import get_db
+from database import get_db, async_session
 from models import User, AIUsageLog, Course, CourseDocument, ChatMessage
 from schemas import ChatMessage as ChatMessageSchema, ChatResponse, ChatHistoryResponse
 from auth import get_current_user
@@ -18,6 +21,9 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/ai", tags=["AI Assistant"])
 
+WORKER_ERROR_TEXT = "I'm sorry, I'm having trouble processing that right now. Please try again in a moment."
+WORKER_UNAVAILABLE_TEXT = "An error occurred while communicating with the AI service. Please ensure the AI worker is active."
+
 
 @router.post("/chat", response_model=ChatResponse)
 async def chat(
@@ -88,21 +94,36 @@ async def chat(
     )
     db.add(user_msg)
 
+    # Update quota
+    user.ai_quota_used_today += 1
+
+    worker_payload = {
+        "message": body.message,
+        "course_id": str(body.course_id) if body.course_id else None,
+        "course_context": course_context,
+        "chat_history": formatted_history
+    }
+
+    if body.stream:
+        # Persist the user turn now; the session closes before the stream starts
+        await db.commit()
+        return StreamingResponse(
+            _relay_chat_stream(worker_payload, current_user, body),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
     # Call AI Worker
     response_text = "AI thinking..."
     tokens_used = 0
     sources = []
-    
+    usage = {}
+
     try:
         async with httpx.AsyncClient() as client:
             resp = await client.post(
                 f"{settings.AI_WORKER_URL}/chat",
-                json={
-                    "message": body.message,
-                    "course_id": str(body.course_id) if body.course_id else None,
-                    "course_context": course_context,
-                    "chat_history": formatted_history
-                },
+                json=worker_payload,
                 timeout=45.0
             )
             if resp.status_code == 200:
@@ -110,43 +131,98 @@ async def chat(
                 response_text = data.get("response", "No response from AI.")
                 tokens_used = data.get("tokens_used", 0)
                 sources = data.get("sources", [])
+                usage = data
             else:
                 logger.error(f"AI Worker error: {resp.status_code} - {resp.text}")
-                response_text = "I'm sorry, I'm having trouble processing that right now. Please try again in a moment."
+                response_text = WORKER_ERROR_TEXT
     except Exception as e:
         logger.error(f"Failed to call AI worker: {e}")
-        response_text = "An error occurred while communicating with the AI service. Please ensure the AI worker is active."
+        response_text = WORKER_UNAVAILABLE_TEXT
+
+    _record_assistant_turn(db, current_user, body, response_text, usage)
+    await db.commit()
 
-    # Save assistant message
-    assistant_msg = ChatMessage(
+    return ChatResponse(
+        response=response_text,
+        tokens_used=tokens_used or (len(body.message.split()) + len(response_text.split())),
+        sources=sources,
+    )
+
+
+def _record_assistant_turn(db: AsyncSession, current_user: dict, body: ChatMessageSchema, response_text: str, usage: dict):
+    """Add the assistant ChatMessage and its AIUsageLog row to the session."""
+    db.add(ChatMessage(
         user_id=current_user["user_id"],
         course_id=body.course_id,
         role="assistant",
         content=response_text
-    )
-    db.add(assistant_msg)
-
-    # Update quota
-    user.ai_quota_used_today += 1
-
-    # Log usage
-    log = AIUsageLog(
+    ))
+    db.add(AIUsageLog(
         tenant_id=current_user["tenant_id"],
         user_id=current_user["user_id"],
         request_type="chat",
-        model="gemini-2.0-flash", # Updated to reflect likely model used
-        input_tokens=len(body.message.split()),
-        output_tokens=len(response_text.split()),
+        model=usage.get("model") or "gemini-2.0-flash",
+        input_tokens=usage.get("input_tokens") or len(body.message.split()),
+        output_tokens=usage.get("output_tokens") or len(response_text.split()),
         cost_usd=0.0,
-    )
-    db.add(log)
-    await db.commit()
+    ))
 
-    return ChatResponse(
-        response=response_text,
-        tokens_used=tokens_used or (len(body.message.split()) + len(response_text.split())),
-        sources=sources,
-    )
+
+def _sse_event(event: dict) -> str:
+    return f"data: {json.dumps(event)}\n\n"
+
+
+async def _relay_chat_stream(payload: dict, current_user: dict, body: ChatMessageSchema):
+    """Forward the worker's SSE events unbuffered, then persist the assembled reply."""
+    parts = []
+    done = {}
+    try:
+        async with httpx.AsyncClient() as client:
+            async with client.stream(
+                "POST",
+                f"{settings.AI_WORKER_URL}/chat",
+                json={**payload, "stream": True},
+                timeout=45.0,
+            ) as resp:
+                if resp.status_code != 200:
+                    await resp.aread()
+                    logger.error(f"AI Worker error: {resp.status_code} - {resp.text}")
+                    parts.append(WORKER_ERROR_TEXT)
+                    yield _sse_event({"type": "token", "text": WORKER_ERROR_TEXT})
+                    yield _sse_event({"type": "done", "sources": []})
+                else:
+                    async for line in resp.aiter_lines():
+                        if line.startswith("data:"):
+                            try:
+                                event = json.loads(line[len("data:"):])
+                            except ValueError:
+                                logger.warning(f"Skipping malformed AI Worker event: {line[:200]!r}")
+                                continue
+                            if event.get("type") == "token":
+                                parts.append(event.get("text", ""))
+                            elif event.get("type") == "done":
+                                done = event
+                        yield f"{line}\n"
+    except Exception as e:
+        logger.error(f"Failed to stream from AI worker: {e}")
+        if not parts:
+            parts.append(WORKER_UNAVAILABLE_TEXT)
+            yield _sse_event({"type": "token", "text": WORKER_UNAVAILABLE_TEXT})
+            yield _sse_event({"type": "done", "sources": []})
+        elif not done:
+            # Part of the reply is already on screen; say it was cut off rather than start another one
+            yield _sse_event({"type": "error", "detail": "Generation interrupted"})
+    finally:
+        # Persist even if the client disconnected mid-stream
+        response_text = "".join(parts)
+        if response_text:
+            with anyio.CancelScope(shield=True):
+                try:
+                    async with async_session() as db:
+                        _record_assistant_turn(db, current_user, body, response_text, done)
+                        await db.commit()
+                except Exception as e:
+                    logger.error(f"Failed to persist streamed chat reply: {e}")
 
 
 @router.get("/history", response_model=ChatHistoryResponse)
@@ -4,9 +4,11 @@ Upload and manage course materials for RAG processing.
 """
 
 import os
+import time
 import uuid
 import shutil
-from typing import List
+import asyncio
+from typing import List, Optional
 import httpx
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, status, BackgroundTasks
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -16,7 +18,7 @@ from config import settings
 from database import get_db
 from models import Course, CourseDocument, UserRole
 from schemas import CourseDocumentResponse
-from auth import get_current_user
+from auth import get_current_user, require_role
 
 router = APIRouter(prefix="/documents", tags=["Documents"])
 
@@ -44,19 +46,7 @@ async def upload_document(
     if current_user["role"] != UserRole.admin and course.teacher_id != current_user["user_id"]:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to upload to this course")
 
-    # Ensure upload directory exists
-    os.makedirs(UPLOAD_DIR, exist_ok=True)
-
-    # Save file with unique name to prevent collisions
-    file_ext = os.path.splitext(file.filename)[1]
-    unique_filename = f"{uuid.uuid4()}{file_ext}"
-    file_path = os.path.join(UPLOAD_DIR, unique_filename)
-    
-    try:
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-    except Exception as e:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Could not save file: {str(e)}")
+    file_path = _save_upload(file)
 
     # Create database record
     doc = CourseDocument(
@@ -78,9 +68,74 @@ async def upload_document(
     return doc
 
 
-async def process_document_ai(doc_id: uuid.UUID, course_id: uuid.UUID, file_path: str):
-    """Notify AI worker to process and index the document."""
-    async with httpx.AsyncClient(timeout=60.0) as client:
+@router.put("/{document_id}", response_model=CourseDocumentResponse)
+async def replace_document(
+    document_id: uuid.UUID,
+    background_tasks: BackgroundTasks,
+    file: UploadFile = File(...),
+    current_user: dict = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """Upload a new version of a document; only changed chunks are re-embedded."""
+    stmt = select(CourseDocument).where(CourseDocument.id == document_id)
+    result = await db.execute(stmt)
+    doc = result.scalar_one_or_none()
+
+    if not doc:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Document not found")
+
+    stmt_course = select(Course).where(Course.id == doc.course_id)
+    course_result = await db.execute(stmt_course)
+    course = course_result.scalar_one()
+
+    if current_user["role"] != UserRole.admin and course.teacher_id != current_user["user_id"]:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to update this document")
+
+    old_path = doc.file_path
+    file_path = _save_upload(file)
+
+    doc.filename = file.filename
+    doc.file_path = file_path
+    doc.file_type = file.content_type or "application/octet-stream"
+    doc.file_size = os.path.getsize(file_path)
+    doc.is_processed = False
+    doc.ingestion_job_id = None
+    doc.replaced_file_path = old_path
+    await db.flush()
+
+    # The worker keeps the previous version's vectors until the new one is indexed,
+    # and a job for the previous version may still be queued, so its file stays until then
+    background_tasks.add_task(process_document_ai, doc.id, doc.course_id, doc.file_path, old_path)
+
+    return doc
+
+
+def _save_upload(file: UploadFile) -> str:
+    """Save an uploaded file under a unique name and return its path."""
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+
+    # Unique name prevents collisions
+    file_ext = os.path.splitext(file.filename)[1]
+    unique_filename = f"{uuid.uuid4()}{file_ext}"
+    file_path = os.path.join(UPLOAD_DIR, unique_filename)
+
+    try:
+        with open(file_path, "wb") as buffer:
+            shutil.copyfileobj(file.file, buffer)
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Could not save file: {str(e)}")
+    return file_path
+
+
+async def process_document_ai(
+    doc_id: uuid.UUID, course_id: uuid.UUID, file_path: str, previous_path: Optional[str] = None
+):
+    """Queue the document with the AI worker, then wait for its ingestion job.
+
+    ``previous_path`` is the upload this version replaces; it is deleted once
+    the job has ended.
+    """
+    async with httpx.AsyncClient(timeout=30.0) as client:
         try:
             # We need to map local path to worker container path if running in Docker,
             # but since they share a volume (usually) or the path is accessible, 
@@ -93,21 +148,128 @@ async def process_document_ai(doc_id: uuid.UUID, course_id: uuid.UUID, file_path
                     "file_path": file_path
                 }
             )
-            if response.status_code == 200:
-                data = response.json()
-                from database import async_session
-                async with async_session() as db:
-                    stmt = select(CourseDocument).where(CourseDocument.id == doc_id)
-                    res = await db.execute(stmt)
-                    doc = res.scalar_one_or_none()
-                    if doc:
-                        doc.is_processed = True
-                        doc.chunk_count = data.get("chunks", 0)
-                        await db.commit()
+            if response.status_code not in (200, 202):
+                print(f"❌ AI Worker failed to queue document: {response.text}")
+                job_id = None
             else:
-                print(f"❌ AI Worker failed to process document: {response.text}")
+                job_id = response.json()["job_id"]
         except Exception as e:
             print(f"❌ Error calling AI Worker for document processing: {e}")
+            job_id = None
+
+    if job_id is None:
+        await _finish_document_job(doc_id, file_path)
+        _remove_replaced_upload(previous_path, file_path)
+        return
+    # Journaled alongside the document so a backend restart can pick the wait back up
+    await _record_document_job(doc_id, file_path, job_id)
+    await await_document_job(doc_id, file_path, job_id, previous_path)
+
+
+async def await_document_job(
+    doc_id: uuid.UUID, file_path: str, job_id: str, previous_path: Optional[str] = None
+):
+    """Poll an ingestion job until it finishes, record the outcome and delete ``previous_path``."""
+    async with httpx.AsyncClient(timeout=30.0) as client:
+        deadline = time.monotonic() + settings.DOCUMENT_JOB_TIMEOUT_SECONDS
+        while True:
+            if time.monotonic() >= deadline:
+                print(f"⏱️ Gave up waiting for ingestion job {job_id} (document {doc_id})")
+                await _finish_document_job(doc_id, file_path)
+                break
+            await asyncio.sleep(settings.DOCUMENT_JOB_POLL_SECONDS)
+            try:
+                response = await client.get(f"{settings.AI_WORKER_URL}/jobs/{job_id}")
+            except Exception as e:
+                # The worker may be restarting; its journal keeps the job alive
+                print(f"⚠️ Could not poll ingestion job {job_id}: {e}")
+                continue
+            if response.status_code == 404:
+                print(f"❌ AI Worker no longer knows ingestion job {job_id} (document {doc_id})")
+                await _finish_document_job(doc_id, file_path)
+                break
+            if response.status_code != 200:
+                continue
+
+            job = response.json()
+            if job["status"] == "completed":
+                result = job.get("result") or {}
+                if "version" in result:
+                    print(
+                        f"📚 Document {doc_id} indexed as version {result['version']}: "
+                        f"{result.get('added', 0)} added, {result.get('reused', 0)} reused, "
+                        f"{result.get('removed', 0)} removed"
+                    )
+                await _finish_document_job(doc_id, file_path, job.get("chunks_indexed", 0), result.get("version"))
+                break
+            if job["status"] == "failed":
+                print(f"❌ AI Worker failed to process document {doc_id}: {job.get('error')}")
+                await _finish_document_job(doc_id, file_path)
+                break
+
+    _remove_replaced_upload(previous_path, file_path)
+
+
+def _remove_replaced_upload(previous_path: Optional[str], file_path: str):
+    if previous_path and previous_path != file_path and os.path.exists(previous_path):
+        os.remove(previous_path)
+
+
+async def _record_document_job(doc_id: uuid.UUID, file_path: str, job_id: str):
+    from database import async_session
+    async with async_session() as db:
+        stmt = select(CourseDocument).where(CourseDocument.id == doc_id)
+        res = await db.execute(stmt)
+        doc = res.scalar_one_or_none()
+        if doc and doc.file_path == file_path:
+            doc.ingestion_job_id = job_id
+            await db.commit()
+
+
+async def _finish_document_job(
+    doc_id: uuid.UUID, file_path: str, chunk_count: Optional[int] = None, version: Optional[int] = None
+):
+    """Record the end of an ingestion job, unless a newer upload has replaced the file it indexed.
+
+    The document is marked processed only when ``chunk_count`` is given;
+    otherwise the job failed or was given up on.
+    """
+    from database import async_session
+    async with async_session() as db:
+        stmt = select(CourseDocument).where(CourseDocument.id == doc_id)
+        res = await db.execute(stmt)
+        doc = res.scalar_one_or_none()
+        if doc and doc.file_path != file_path:
+            print(f"⏭️ Ignoring completion of a superseded version of document {doc_id}")
+            return
+        if doc:
+            doc.ingestion_job_id = None
+            doc.replaced_file_path = None
+            if chunk_count is not None:
+                doc.is_processed = True
+                doc.chunk_count = chunk_count
+                if version is not None:
+                    doc.version = version
+            await db.commit()
+
+
+async def resume_document_jobs() -> List[asyncio.Task]:
+    """Called at startup: resume waiting on ingestion jobs a previous backend process was polling."""
+    from database import async_session
+    async with async_session() as db:
+        result = await db.execute(
+            select(CourseDocument).where(
+                CourseDocument.is_processed.is_(False),
+                CourseDocument.ingestion_job_id.is_not(None),
+            )
+        )
+        docs = result.scalars().all()
+    if docs:
+        print(f"🔁 Resuming {len(docs)} pending document ingestion jobs")
+    return [
+        asyncio.create_task(await_document_job(doc.id, doc.file_path, doc.ingestion_job_id, doc.replaced_file_path))
+        for doc in docs
+    ]
 
 
 @router.get("/{course_id}", response_model=List[CourseDocumentResponse])
@@ -127,6 +289,7 @@ async def list_documents(
 @router.delete("/{document_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_document(
     document_id: uuid.UUID,
+    background_tasks: BackgroundTasks,
     current_user: dict = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
@@ -152,4 +315,71 @@ async def delete_document(
         
     # Remove from database
     await db.delete(doc)
+
+    # Drop its chunks from the vector index; reconciliation catches any failure
+    background_tasks.add_task(remove_document_vectors, document_id)
     return None
+
+
+@router.post("/maintenance/reconcile")
+async def reconcile_documents(
+    compact: bool = False,
+    current_user: dict = Depends(require_role(UserRole.super_admin)),
+):
+    """Purge vectors of deleted documents now, optionally compacting the store."""
+    report = await reconcile_vector_index(compact=compact)
+    if report is None:
+        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail="AI Worker reconciliation failed")
+    return report
+
+
+async def remove_document_vectors(doc_id: uuid.UUID):
+    try:
+        async with httpx.AsyncClient(timeout=60.0) as client:
+            response = await client.delete(f"{settings.AI_WORKER_URL}/documents/{doc_id}")
+        if response.status_code != 200:
+            print(f"❌ AI Worker failed to delete vectors of document {doc_id}: {response.text}")
+            return
+        print(f"🗑️ Removed {response.json().get('removed', 0)} chunks of document {doc_id} from the index")
+    except Exception as e:
+        print(f"❌ Error calling AI Worker to delete document {doc_id}: {e}")
+
+
+async def reconcile_vector_index(compact: bool = False) -> Optional[dict]:
+    """Send the live document ids to the worker so it can purge orphaned chunks."""
+    from database import async_session
+    snapshot_at = time.time()
+    async with async_session() as db:
+        result = await db.execute(select(CourseDocument.id))
+        live_ids = [str(doc_id) for doc_id in result.scalars().all()]
+
+    try:
+        async with httpx.AsyncClient(timeout=600.0) as client:
+            response = await client.post(
+                f"{settings.AI_WORKER_URL}/documents/reconcile",
+                json={"live_doc_ids": live_ids, "snapshot_at": snapshot_at, "compact": compact},
+            )
+        if response.status_code != 200:
+            print(f"❌ AI Worker reconciliation failed: {response.text}")
+            return None
+    except Exception as e:
+        print(f"❌ Error calling AI Worker for reconciliation: {e}")
+        return None
+
+    report = response.json()
+    print(
+        f"🧹 Vector index reconciled: {report.get('removed', 0)} orphaned chunks removed "
+        f"from {report.get('orphan_documents', 0)} documents"
+        + (f", {report['compaction'].get('reclaimed_bytes', 0)} bytes reclaimed" if report.get("compaction") else "")
+    )
+    return report
+
+
+async def run_vector_index_gc():
+    """Background loop started at app startup; reconciles every VECTOR_GC_INTERVAL_SECONDS."""
+    while True:
+        await asyncio.sleep(settings.VECTOR_GC_INTERVAL_SECONDS)
+        try:
+            await reconcile_vector_index(compact=settings.VECTOR_GC_COMPACT)
+        except Exception as e:
+            print(f"❌ Vector index reconciliation crashed: {e}")
@@ -3,6 +3,7 @@ SmartEdu AI – Quiz API Routes
 """
 
 import httpx
+import json
 import logging
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -15,6 +16,8 @@ from models import Quiz, Question, QuizAttempt, Course, QuizStatus
 from schemas import QuizGenerateRequest, QuizResponse, QuizAttemptSubmit, QuizAttemptResponse
 from auth import get_current_user, require_role
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(prefix="/quizzes", tags=["Quizzes"])
 
 
@@ -29,7 +32,7 @@ async def list_quizzes(
     if course_id:
         stmt = stmt.where(Quiz.course_id == course_id)
     if current_user["role"] == "student":
-        stmt = stmt.where(Quiz.status == QuizStatus.PUBLISHED)
+        stmt = stmt.where(Quiz.status == QuizStatus.published)
 
     result = await db.execute(stmt)
     quizzes = result.scalars().all()
@@ -53,66 +56,90 @@ async def generate_quiz(
     if not course:
         raise HTTPException(status_code=404, detail="Course not found")
 
-    # Call AI Worker to generate real questions
-    questions_data = []
+    # Create the quiz record first so questions can be saved as they are generated
+    quiz = Quiz(
+        course_id=body.course_id,
+        title=f"AI-Generated: {body.topic}",
+        description=f"Quiz on {body.topic} ({body.difficulty.value} difficulty)",
+        difficulty=body.difficulty.value,
+        is_ai_generated=True,
+        ai_prompt=body.topic,
+        status=QuizStatus.draft,
+    )
+    db.add(quiz)
+    await db.commit()
+    # Kept aside: a rollback below expires the quiz, and reloading it lazily is not possible here
+    quiz_id = quiz.id
+
+    saved = 0
+
+    def add_question(q_data: dict):
+        db.add(Question(
+            quiz_id=quiz_id,
+            question_text=q_data.get("question_text", "Missing question text"),
+            question_type=body.question_type,
+            difficulty=q_data.get("difficulty", body.difficulty.value),
+            options=q_data.get("options"),
+            correct_answer=q_data.get("correct_answer"),
+            explanation=q_data.get("explanation", ""),
+            order=saved,
+        ))
+
+    # Stream questions from the AI Worker, persisting each one as it arrives
     try:
-        import httpx
         from config import settings
         async with httpx.AsyncClient() as client:
-            resp = await client.post(
+            async with client.stream(
+                "POST",
                 f"{settings.AI_WORKER_URL}/generate-quiz",
                 json={
                     "topic": body.topic,
                     "num_questions": body.num_questions,
                     "difficulty": body.difficulty.value,
                     "question_type": body.question_type,
-                    "context": "" # TODO: Pass relevant course context
+                    "context": "", # TODO: Pass relevant course context
+                    "tenant_id": str(current_user["tenant_id"]),
+                    "force_refresh": body.force_refresh,
+                    "stream": True,
                 },
                 timeout=60.0
-            )
-            if resp.status_code == 200:
-                questions_data = resp.json().get("questions", [])
-            else:
-                logger.error(f"AI Worker quiz error: {resp.status_code} - {resp.text}")
+            ) as resp:
+                if resp.status_code != 200:
+                    await resp.aread()
+                    logger.error(f"AI Worker quiz error: {resp.status_code} - {resp.text}")
+                else:
+                    async for line in resp.aiter_lines():
+                        if not line.startswith("data:"):
+                            continue
+                        try:
+                            event = json.loads(line[len("data:"):])
+                        except ValueError:
+                            logger.warning(f"Skipping malformed AI Worker quiz event: {line[:200]!r}")
+                            continue
+                        if event.get("type") != "question":
+                            continue
+                        # Committed one by one, so questions are visible while generation continues;
+                        # one that cannot be saved is skipped without losing the others
+                        try:
+                            add_question(event["question"])
+                            await db.commit()
+                        except Exception as e:
+                            await db.rollback()
+                            logger.error(f"Skipping quiz question that could not be saved: {e}")
+                            continue
+                        saved += 1
     except Exception as e:
         logger.error(f"Failed to call AI worker for quiz: {e}")
 
-    # Create the quiz record
-    quiz = Quiz(
-        course_id=body.course_id,
-        title=f"AI-Generated: {body.topic}",
-        description=f"Quiz on {body.topic} ({body.difficulty.value} difficulty)",
-        difficulty=body.difficulty.value,
-        is_ai_generated=True,
-        ai_prompt=body.topic,
-        status=QuizStatus.DRAFT,
-    )
-    db.add(quiz)
-    await db.flush()
-
-    # Create the generated questions
-    if not questions_data:
+    if not saved:
         # Fallback to a single placeholder if AI failed completely
-        questions_data = [{
+        add_question({
             "question_text": f"Wait, I'm still learning about {body.topic}. Can you ask again later?",
             "options": ["Yes", "No", "Maybe", "I'll try"],
             "correct_answer": "Yes",
             "explanation": "AI generation fallback.",
             "difficulty": body.difficulty.value
-        }]
-
-    for i, q_data in enumerate(questions_data):
-        question = Question(
-            quiz_id=quiz.id,
-            question_text=q_data.get("question_text", "Missing question text"),
-            question_type=body.question_type,
-            difficulty=q_data.get("difficulty", body.difficulty.value),
-            options=q_data.get("options"),
-            correct_answer=q_data.get("correct_answer"),
-            explanation=q_data.get("explanation", ""),
-            order=i,
-        )
-        db.add(question)
+        })
 
     await db.flush()
     await db.refresh(quiz)
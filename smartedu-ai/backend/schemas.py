@@ -140,6 +140,7 @@ class QuizGenerateRequest(BaseModel):
     num_questions: int = Field(default=10, ge=1, le=50)
     difficulty: DifficultyEnum = DifficultyEnum.medium
     question_type: str = "mcq"
+    force_refresh: bool = False  # Bypass the worker's quiz cache
 
 
 class QuestionResponse(BaseModel):
@@ -217,12 +218,13 @@ class TeacherAnalytics(BaseModel):
 class ChatMessage(BaseModel):
     message: str = Field(..., min_length=1, max_length=4000)
     course_id: Optional[UUID] = None
+    stream: bool = False  # Server-sent events: token events, then a final done event
 
 
 class ChatResponse(BaseModel):
     response: str
     tokens_used: int
-    sources: List[str] = []
+    sources: List[dict] = []
 
 
 class ChatMessageResponse(BaseModel):
@@ -245,6 +247,8 @@ class CourseDocumentResponse(BaseModel):
     file_type: str
     file_size: int
     is_processed: bool
+    chunk_count: Optional[int] = 0
+    version: Optional[int] = 0
     uploaded_at: datetime
 
     class Config:
@@ -82,6 +82,7 @@ CREATE TABLE course_documents (
     file_size     INTEGER NOT NULL,
     is_processed  BOOLEAN DEFAULT FALSE,
     chunk_count   INTEGER DEFAULT 0,
+    version       INTEGER DEFAULT 0,
     uploaded_at   TIMESTAMP DEFAULT NOW()
 );
 